@@ -0,0 +1,279 @@
+"""Content-addressed storage of job files for the PlantUML server.
+
+Every stored file is a blob named by the SHA-256 of its content, under
+`<root>/blobs/ab/cd/<digest>` (two levels of two hex digits, so no directory
+grows past a few hundred entries). A job is a manifest `{file name: digest}`
+in the SQLite index `<root>/artifacts.sqlite3`; identical inputs and outputs
+of different jobs share one blob.
+
+The index counts how many manifests reference each blob. `collect()` drops
+manifests older than the TTL, then the oldest manifests while the blobs
+exceed the size quota, and deletes blobs no manifest references any more.
+`start_collector()` runs it periodically in a daemon thread, after moving
+job folders and zips written by earlier versions (`<root>/<job_id>/`,
+`<root>/<job_id>.zip`) into the store with `migrate_legacy()`. All processes
+opening the same root share the index.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+ARTIFACT_TTL = int(os.getenv("PUML_ARTIFACT_TTL", str(7 * 24 * 3600)))  # seconds
+ARTIFACT_QUOTA = int(os.getenv("PUML_ARTIFACT_QUOTA_MB", "1024")) * 1024 * 1024  # bytes, 0 = no quota
+COLLECT_INTERVAL = int(os.getenv("PUML_ARTIFACT_GC_INTERVAL", "600"))  # seconds
+_LEGACY_JOB = re.compile(r"^[0-9a-f]{32}$")
+
+
+def digest_of(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, root: Union[str, Path], ttl: float = ARTIFACT_TTL, quota: int = ARTIFACT_QUOTA):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.ttl = ttl
+        self.quota = quota
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._collector: Optional[threading.Thread] = None
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                refs INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS blobs_refs ON blobs (refs);
+            CREATE TABLE IF NOT EXISTS manifests (
+                job_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                files TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS manifests_created_at ON manifests (created_at);
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(str(self.root / "artifacts.sqlite3"), timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest[2:4] / digest
+
+    def _write_blob(self, digest: str, content: bytes) -> None:
+        path = self.blob_path(digest)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(content)
+        os.replace(tmp, path)
+
+    def _release(self, db: sqlite3.Connection, files_json: str) -> int:
+        """Drop one reference to each blob of a manifest; returns the size of the blobs left unreferenced."""
+        freed = 0
+        for digest in set(json.loads(files_json).values()):
+            db.execute("UPDATE blobs SET refs = refs - 1 WHERE digest = ?", (digest,))
+            row = db.execute("SELECT refs, size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row is not None and row[0] <= 0:
+                freed += row[1]
+        return freed
+
+    def _transaction(self, work):
+        """Run `work(db)` holding the index write lock.
+
+        Blob files are written and deleted under this lock too, so the
+        collector never removes a blob a concurrent `put` is referencing.
+        """
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(db)
+            db.execute("COMMIT")
+            return result
+        except Exception:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+
+    def put(self, job_id: str, files: Dict[str, bytes], created_at: Optional[float] = None) -> Dict[str, str]:
+        """Store the files of a job (replacing its previous manifest); returns the manifest."""
+        manifest = {name: digest_of(content) for name, content in files.items()}
+        contents = {manifest[name]: content for name, content in files.items()}
+
+        def work(db: sqlite3.Connection) -> None:
+            old = db.execute("SELECT files FROM manifests WHERE job_id = ?", (job_id,)).fetchone()
+            for digest, content in contents.items():
+                db.execute("INSERT INTO blobs (digest, size, refs) VALUES (?, ?, 1)"
+                           " ON CONFLICT (digest) DO UPDATE SET refs = refs + 1", (digest, len(content)))
+                self._write_blob(digest, content)
+            if old is not None:
+                self._release(db, old[0])
+            db.execute("INSERT OR REPLACE INTO manifests (job_id, created_at, files) VALUES (?, ?, ?)",
+                       (job_id, time.time() if created_at is None else created_at, json.dumps(manifest)))
+
+        self._transaction(work)
+        return manifest
+
+    def manifest(self, job_id: str) -> Optional[Dict[str, str]]:
+        row = self._connection().execute("SELECT files FROM manifests WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def read(self, job_id: str, names: Optional[Iterable[str]] = None) -> Optional[Dict[str, bytes]]:
+        """Files of a job (or only `names`), or None if the job is not stored."""
+        manifest = self.manifest(job_id)
+        if manifest is None:
+            return None
+        wanted = manifest if names is None else [name for name in names if name in manifest]
+        try:
+            return {name: self.blob_path(manifest[name]).read_bytes() for name in wanted}
+        except FileNotFoundError:
+            # collected between reading the manifest and the blob
+            return None
+
+    def delete(self, job_id: str) -> None:
+        def work(db: sqlite3.Connection) -> None:
+            row = db.execute("SELECT files FROM manifests WHERE job_id = ?", (job_id,)).fetchone()
+            if row is not None:
+                self._release(db, row[0])
+                db.execute("DELETE FROM manifests WHERE job_id = ?", (job_id,))
+
+        self._transaction(work)
+
+    def collect(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Expire and evict manifests, then delete unreferenced blobs."""
+        now = time.time() if now is None else now
+
+        def work(db: sqlite3.Connection) -> Dict[str, int]:
+            jobs = 0
+            for job_id, files in db.execute("SELECT job_id, files FROM manifests WHERE created_at < ?",
+                                            (now - self.ttl,)).fetchall():
+                self._release(db, files)
+                db.execute("DELETE FROM manifests WHERE job_id = ?", (job_id,))
+                jobs += 1
+            used = db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs WHERE refs > 0").fetchone()[0]
+            if self.quota and used > self.quota:
+                # oldest first; each eviction frees the blobs it was the last reference to
+                for job_id, files in db.execute("SELECT job_id, files FROM manifests ORDER BY created_at").fetchall():
+                    if used <= self.quota:
+                        break
+                    used -= self._release(db, files)
+                    db.execute("DELETE FROM manifests WHERE job_id = ?", (job_id,))
+                    jobs += 1
+            blobs, freed = 0, 0
+            for digest, size in db.execute("SELECT digest, size FROM blobs WHERE refs <= 0").fetchall():
+                path = self.blob_path(digest)
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                for directory in (path.parent, path.parent.parent):
+                    try:
+                        directory.rmdir()
+                    except OSError:
+                        break
+                blobs += 1
+                freed += size
+            db.execute("DELETE FROM blobs WHERE refs <= 0")
+            return {"jobs": jobs, "blobs": blobs, "bytes": freed}
+
+        return self._transaction(work)
+
+    @staticmethod
+    def _legacy_files(job_dir: Path) -> Dict[str, bytes]:
+        """Files of a pre-store job folder: the inputs and the latest plugin run"""
+        files = {f.name: f.read_bytes() for f in job_dir.iterdir()
+                 if f.is_file() and not f.name.endswith("_generated.zip")}
+        plugin_root = job_dir / "plugin_outputs"
+        runs = [d for d in plugin_root.iterdir() if d.is_dir()] if plugin_root.is_dir() else []
+        if runs:
+            latest = max(runs, key=lambda d: d.stat().st_mtime)
+            files.update({f.relative_to(latest).as_posix(): f.read_bytes()
+                          for f in latest.rglob("*") if f.is_file()})
+        return files
+
+    def migrate_legacy(self) -> int:
+        """Move job folders and zips of earlier versions into the store; returns the number of jobs.
+
+        A migrated job keeps the folder's modification time as its creation
+        time, so the TTL applies to it as to any other job. Several processes
+        may migrate the same root at once: a folder another process has
+        already imported or removed is skipped.
+        """
+        jobs = 0
+        for path in sorted(self.root.iterdir()):
+            job_id = path.stem if path.suffix == ".zip" else path.name
+            if not _LEGACY_JOB.match(job_id) or not (path.is_dir() or path.suffix == ".zip"):
+                continue
+            if not path.exists():
+                continue  # the zip of a folder migrated just before
+            try:
+                if path.is_dir():
+                    files = self._legacy_files(path)
+                else:
+                    with zipfile.ZipFile(path) as z:
+                        files = {name: z.read(name) for name in z.namelist() if not name.endswith("/")}
+                if self.manifest(job_id) is None:
+                    self.put(job_id, files, created_at=path.stat().st_mtime)
+                    jobs += 1
+            except FileNotFoundError:
+                continue  # migrated by another process meanwhile
+            except (OSError, zipfile.BadZipFile) as e:
+                print(f"Artifact store: cannot migrate {path.name}:", e)
+                continue
+            for leftover in (path, self.root / f"{job_id}.zip"):
+                try:
+                    if leftover.is_dir():
+                        shutil.rmtree(leftover)
+                    else:
+                        leftover.unlink()
+                except FileNotFoundError:
+                    pass
+        return jobs
+
+    def stats(self) -> Dict[str, Any]:
+        db = self._connection()
+        blobs, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        jobs = db.execute("SELECT COUNT(*) FROM manifests").fetchone()[0]
+        return {"jobs": jobs, "blobs": blobs, "bytes": size, "quota": self.quota, "ttl": self.ttl}
+
+    def start_collector(self, interval: float = COLLECT_INTERVAL) -> None:
+        if self._collector is not None:
+            return
+
+        def loop():
+            try:
+                migrated = self.migrate_legacy()
+                if migrated:
+                    print(f"Artifact store: migrated {migrated} job folders of earlier versions")
+            except (OSError, sqlite3.Error) as e:
+                print("Artifact migration failed:", e)
+            # the first run catches up on whatever expired while the server was down
+            while True:
+                try:
+                    removed = self.collect()
+                    if removed["jobs"] or removed["blobs"]:
+                        print(f"Artifact store: removed {removed['jobs']} jobs, {removed['blobs']} blobs, {removed['bytes']} bytes")
+                except sqlite3.Error as e:
+                    print("Artifact collection failed:", e)
+                if self._stop.wait(interval):
+                    return
+
+        self._collector = threading.Thread(target=loop, name="artifact-gc", daemon=True)
+        self._collector.start()
+
+    def close(self) -> None:
+        self._stop.set()
@@ -0,0 +1,7 @@
+"""Parser benchmarks.
+
+`benchmarks.synthetic` builds seeded PlantUML diagrams of a given size,
+`benchmarks.run` times the parsers on them and compares with a baseline:
+
+  python -m benchmarks.run --baseline benchmarks/baseline.json
+"""
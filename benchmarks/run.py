@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Time the PlantUML parsers on synthetic diagrams and compare with a baseline.
+
+Usage:
+  python -m benchmarks.run                                  # print results as JSON
+  python -m benchmarks.run --save-baseline benchmarks/baseline.json
+  python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.25
+
+Each benchmark is timed `--repeat` times and the best run is reported
+(throughput in lines/s); peak memory is measured in a separate run under
+tracemalloc so that tracing does not distort the timings. With --baseline,
+the exit code is 1 if any benchmark is slower than the baseline by more
+than the tolerance.
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from puml2json import (  # noqa: E402
+    PARSER_VERSION,
+    PlantUMLParser,
+    DatabaseDiagramParser,
+    DeploymentDiagramParser,
+    detect_diagram_type,
+)
+from benchmarks import synthetic  # noqa: E402
+
+# size name -> (classes, entities, nodes)
+SIZES = {
+    "small": (100, 50, 20),
+    "medium": (1000, 500, 200),
+    "large": (10000, 5000, 2000),
+}
+QUICK_SIZES = ("small", "medium")
+
+
+def build_inputs(size: str, seed: int) -> Dict[str, str]:
+    classes, entities, nodes = SIZES[size]
+    return {
+        "class": synthetic.class_diagram(classes=classes, relationships=classes, seed=seed),
+        "database": synthetic.database_diagram(entities=entities, relationships=entities, seed=seed),
+        "deployment": synthetic.deployment_diagram(nodes=nodes, connections=nodes * 2, seed=seed),
+    }
+
+
+def benchmarks_for(inputs: Dict[str, str]) -> List[Tuple[str, str, Callable[[], Any]]]:
+    """(name, input kind, callable) for every benchmark on one set of inputs."""
+    return [
+        ("PlantUMLParser", "class", lambda: PlantUMLParser().parse_content(inputs["class"])),
+        ("DatabaseDiagramParser", "database", lambda: DatabaseDiagramParser().parse(inputs["database"])),
+        ("DeploymentDiagramParser", "deployment", lambda: DeploymentDiagramParser().parse(inputs["deployment"])),
+        ("detect_diagram_type[class]", "class", lambda: detect_diagram_type(inputs["class"])),
+        ("detect_diagram_type[database]", "database", lambda: detect_diagram_type(inputs["database"])),
+        ("detect_diagram_type[deployment]", "deployment", lambda: detect_diagram_type(inputs["deployment"])),
+    ]
+
+
+def best_time(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(fn: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes: List[str], repeat: int, seed: int) -> Dict[str, Any]:
+    results = []
+    for size in sizes:
+        inputs = build_inputs(size, seed)
+        for name, kind, fn in benchmarks_for(inputs):
+            lines = inputs[kind].count("\n")
+            seconds = best_time(fn, repeat)
+            results.append({
+                "benchmark": name,
+                "size": size,
+                "lines": lines,
+                "bytes": len(inputs[kind].encode("utf-8")),
+                "seconds": round(seconds, 6),
+                "lines_per_s": round(lines / seconds) if seconds else None,
+                "peak_memory_bytes": peak_memory(fn),
+            })
+            print(f"{name:34} {size:7} {lines:8} lines  {results[-1]['lines_per_s']:>12,} lines/s", file=sys.stderr)
+    return {
+        "meta": {
+            "parser_version": PARSER_VERSION,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """Per-benchmark throughput and memory ratios against the baseline (ratio > 1 is better / smaller)."""
+    base = {(r["benchmark"], r["size"]): r for r in baseline.get("results", [])}
+    rows = []
+    for result in report["results"]:
+        old = base.get((result["benchmark"], result["size"]))
+        if not old or not old.get("lines_per_s") or not result["lines_per_s"]:
+            continue
+        speed = result["lines_per_s"] / old["lines_per_s"]
+        memory = result["peak_memory_bytes"] / old["peak_memory_bytes"] if old.get("peak_memory_bytes") else None
+        rows.append({
+            "benchmark": result["benchmark"],
+            "size": result["size"],
+            "speed_ratio": round(speed, 3),
+            "memory_ratio": round(memory, 3) if memory is not None else None,
+            "regression": speed < 1 - tolerance,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', help='Comma-separated sizes: ' + ','.join(SIZES), default=','.join(SIZES))
+    parser.add_argument('--quick', action='store_true', help='Only run the %s sizes' % '/'.join(QUICK_SIZES))
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (best is reported)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic diagrams')
+    parser.add_argument('--output', '-o', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', '-b', help='Compare against a stored report')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed throughput drop vs baseline (0.2 = 20%%)')
+    parser.add_argument('--save-baseline', help='Store the report as a new baseline')
+    args = parser.parse_args()
+
+    sizes = list(QUICK_SIZES) if args.quick else [s.strip() for s in args.sizes.split(',') if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {unknown}")
+
+    report = run(sizes, args.repeat, args.seed)
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        report["comparison"] = compare(report, baseline, args.tolerance)
+        regressions = [row for row in report["comparison"] if row["regression"]]
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding='utf-8')
+    else:
+        print(text)
+    if args.save_baseline:
+        baseline_report = {key: value for key, value in report.items() if key != "comparison"}
+        Path(args.save_baseline).write_text(json.dumps(baseline_report, ensure_ascii=False, indent=2) + "\n", encoding='utf-8')
+
+    if regressions:
+        for row in regressions:
+            print(f"REGRESSION {row['benchmark']} [{row['size']}]: {row['speed_ratio']:.2f}x baseline throughput", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Seeded synthetic PlantUML diagrams for benchmarking.
+
+The same arguments and seed always produce the same text, so timings from
+different runs and machines are measured on identical inputs.
+"""
+import random
+from typing import List
+
+ATTRIBUTE_TYPES = ["int", "str", "float", "bool", "List[str]", "List[int]", "Dict[str, int]", "Optional[str]"]
+RETURN_TYPES = ["None", "int", "str", "bool", "List[str]"]
+CLASS_ARROWS = ["-->", "<--", "--", "..>", "o--", "*--"]
+MULTIPLICITIES = ["", '"1"', '"*"', '"0..*"', '"1..*"']
+COLUMN_TYPES = ["INT", "BIGINT", "VARCHAR(50)", "VARCHAR(255)", "TEXT", "DATETIME", "BOOLEAN", "DECIMAL(10,2)"]
+TABLE_ARROWS = ["||--||", "||--o{", "}o--||", "}o--o{"]
+NODE_KINDS = ["Frontend", "Backend", "Database", "Cache", "Queue", "Worker", "Gateway", "Storage"]
+
+
+def class_diagram(classes: int = 100, attributes: int = 5, methods: int = 3,
+                  relationships: int = 100, inheritance: float = 0.2, seed: int = 0) -> str:
+    """Class diagram with `classes` class blocks and `relationships` arrows.
+
+    Roughly `inheritance` of the classes extend an earlier class; half of those
+    arrows are declared before the child class, half after it.
+    """
+    rng = random.Random(seed)
+    lines = ["@startuml"]
+    trailing: List[str] = []
+    for i in range(classes):
+        name = f"Class{i}"
+        if i and rng.random() < inheritance:
+            arrow = f"Class{rng.randrange(i)} <|-- {name}"
+            (lines if rng.random() < 0.5 else trailing).append(arrow)
+        lines.append(f"class {name} {{")
+        for a in range(attributes):
+            lines.append(f"  - field{a}: {rng.choice(ATTRIBUTE_TYPES)}")
+        for m in range(methods):
+            params = ", ".join(f"p{p}: {rng.choice(ATTRIBUTE_TYPES)}" for p in range(rng.randrange(4)))
+            lines.append(f"  + method{m}({params}): {rng.choice(RETURN_TYPES)}")
+        lines.append("}")
+        lines.append("")
+    lines.extend(trailing)
+    for _ in range(relationships):
+        left, right = rng.randrange(classes), rng.randrange(classes)
+        left_mult, right_mult = rng.choice(MULTIPLICITIES), rng.choice(MULTIPLICITIES)
+        line = f"Class{left} {left_mult} {rng.choice(CLASS_ARROWS)} {right_mult} Class{right}"
+        if rng.random() < 0.3:
+            line += " : uses"
+        lines.append(" ".join(line.split()))
+    lines.append("@enduml")
+    return "\n".join(lines) + "\n"
+
+
+def database_diagram(entities: int = 50, columns: int = 6, relationships: int = 50,
+                     foreign_keys: float = 0.5, seed: int = 0) -> str:
+    """ER diagram with `entities` entity blocks and `relationships` arrows.
+
+    Each entity has an auto-increment primary key; with probability
+    `foreign_keys` it also references the primary key of an earlier entity.
+    """
+    rng = random.Random(seed)
+    lines = ["@startuml", "hide circle", "skinparam linetype ortho", ""]
+    for i in range(entities):
+        lines.append(f'entity "Table{i}" {{')
+        lines.append(f"  +id{i} : INT <<PK>> <<AI>>")
+        for c in range(columns - 1):
+            annotations = " <<NN>>" if rng.random() < 0.3 else ""
+            lines.append(f"  +col{c} : {rng.choice(COLUMN_TYPES)}{annotations}")
+        if i and rng.random() < foreign_keys:
+            target = rng.randrange(i)
+            lines.append(f"  +ref{target} : INT <<FK=Table{target}.id{target}>> <<NN>>")
+        lines.append("}")
+        lines.append("")
+    for _ in range(relationships):
+        left, right = rng.randrange(entities), rng.randrange(entities)
+        lines.append(f'"Table{left}" {rng.choice(TABLE_ARROWS)} "Table{right}"')
+    lines.append("@enduml")
+    return "\n".join(lines) + "\n"
+
+
+def deployment_diagram(nodes: int = 20, connections: int = 30, seed: int = 0) -> str:
+    """Deployment diagram with `nodes` nodes and `connections` labelled links."""
+    rng = random.Random(seed)
+    names = [f"{rng.choice(NODE_KINDS)} {i}" for i in range(nodes)]
+    lines = ["@startuml"]
+    for name in names:
+        lines.append(f'node "{name}"')
+    lines.append("")
+    for i in range(connections):
+        source, target = rng.choice(names), rng.choice(names)
+        lines.append(f'"{source}" --> "{target}" : link{i}')
+    lines.append("@enduml")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,245 @@
+"""Проверка сгенерированного кода (Python, Java, C++).
+
+`ValidationEngine` проверяет набор файлов за один вызов: Python компилируется
+в процессе, все Java-файлы передаются одному запуску javac, C++-файлы
+проверяются g++ -fsyntax-only параллельно в ограниченном пуле потоков.
+Если доступны резидентные помощники validation_workers (JVM с javax.tools,
+предкомпилированный заголовок C++), используются они. Результаты кешируются
+по хешу содержимого, версии компилятора и (для Java и C++) хешу всего набора
+файлов языка и возвращаются как структурированная диагностика, без печати.
+"""
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from validation_workers import JAVAC_WORKER, CPP_PRELUDE
+
+SUPPORTED_LANGUAGES = ("python", "java", "cpp")
+
+# Команда версии компилятора для ключа кеша
+_VERSION_COMMANDS = {
+    "java": ["javac", "-version"],
+    "cpp": ["g++", "--version"],
+}
+_TOOL_NAMES = {"java": "javac", "cpp": "g++"}
+
+# path:line[:column]: error|warning|note: message (формат javac и g++)
+_DIAGNOSTIC = re.compile(r"^(?P<file>.+?):(?P<line>\d+):(?:(?P<column>\d+):)?\s*"
+                         r"(?P<severity>fatal error|error|warning|note):\s*(?P<message>.*)$")
+
+
+class Diagnostic(NamedTuple):
+    """Сообщение компилятора; line/column — None, если неизвестны"""
+    severity: str
+    message: str
+    line: Optional[int] = None
+    column: Optional[int] = None
+
+
+class ValidationResult(NamedTuple):
+    """Итог проверки файла.
+
+    status: "ok", "error", "unavailable" (компилятор не найден) или
+    "unsupported" (язык не проверяется).
+    """
+    language: str
+    file: str
+    status: str
+    diagnostics: Tuple[Diagnostic, ...] = ()
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
+@lru_cache(maxsize=None)
+def toolchain_version(language: str) -> Optional[str]:
+    """Версия компилятора языка (для Python — интерпретатора); None, если его нет"""
+    if language == "python":
+        return sys.version
+    command = _VERSION_COMMANDS.get(language)
+    if command is None:
+        return None
+    try:
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+    except FileNotFoundError:
+        return None
+    output = completed.stdout.decode(errors="replace").strip()
+    return output.splitlines()[0] if output else ""
+
+
+def parse_diagnostics(output: str) -> Dict[str, List[Diagnostic]]:
+    """Диагностика javac/g++ по файлам; строки без позиции пропускаются"""
+    by_file: Dict[str, List[Diagnostic]] = {}
+    for line in output.splitlines():
+        match = _DIAGNOSTIC.match(line.strip())
+        if not match:
+            continue
+        column = match.group("column")
+        by_file.setdefault(os.path.normcase(os.path.abspath(match.group("file"))), []).append(Diagnostic(
+            "error" if match.group("severity") == "fatal error" else match.group("severity"),
+            match.group("message"),
+            int(match.group("line")),
+            int(column) if column else None,
+        ))
+    return by_file
+
+
+class ValidationEngine:
+    """Параллельная проверка с LRU-кешем результатов.
+
+    Кеш — (язык, sha256 содержимого, sha256 набора, версия компилятора) -> диагностика;
+    один экземпляр можно разделять между потоками. Набор — имена и содержимое
+    всех файлов языка в вызове `validate`: результат Java- и C++-файла зависит
+    от соседних (один запуск javac, #include шардов), поэтому изменение любого
+    из них сбрасывает кеш всего набора. Для Python набор не учитывается.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, cache_size: int = 4096):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str, str, str], Tuple[Diagnostic, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def validate(self, files: Iterable[Tuple[str, Union[str, Path]]]) -> List[ValidationResult]:
+        """Проверяет пары (язык, путь); результаты — в порядке входа"""
+        files = [(language.lower(), str(path)) for language, path in files]
+        results: List[Optional[ValidationResult]] = [None] * len(files)
+        pending: Dict[str, List[Tuple[int, str, Tuple[str, str, str, str]]]] = {}
+        digests = [hashlib.sha256(Path(path).read_bytes()).hexdigest() if language in SUPPORTED_LANGUAGES else None
+                   for language, path in files]
+        batches = self._batch_digests(files, digests)
+
+        for index, (language, path) in enumerate(files):
+            if language not in SUPPORTED_LANGUAGES:
+                results[index] = ValidationResult(language, path, "unsupported")
+                continue
+            version = toolchain_version(language)
+            if version is None:
+                message = f"Компилятор {_TOOL_NAMES[language]} не найден. Убедитесь, что он установлен и добавлен в PATH."
+                results[index] = ValidationResult(language, path, "unavailable", (Diagnostic("error", message),))
+                continue
+            key = (language, digests[index], batches.get(language, ""), version)
+            diagnostics = self._cache_get(key)
+            if diagnostics is not None:
+                results[index] = self._result(language, path, diagnostics, cached=True)
+            else:
+                pending.setdefault(language, []).append((index, path, key))
+
+        for index, path, key in pending.pop("python", []):
+            results[index] = self._store(key, "python", path, self._check_python(path))
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = []
+                java = pending.get("java")
+                if java:
+                    futures.append((java, pool.submit(self._check_java, [path for _, path, _ in java])))
+                for entry in pending.get("cpp", []):
+                    futures.append(([entry], pool.submit(self._check_cpp, entry[1])))
+                for entries, future in futures:
+                    by_file = future.result()
+                    for index, path, key in entries:
+                        results[index] = self._store(key, files[index][0], path, by_file[path])
+        return results
+
+    @staticmethod
+    def _batch_digests(files: List[Tuple[str, str]], digests: List[Optional[str]]) -> Dict[str, str]:
+        """Хеш набора файлов каждого языка, кроме Python: имена и содержимое"""
+        members: Dict[str, List[str]] = {}
+        for (language, path), digest in zip(files, digests):
+            if digest is not None and language != "python":
+                members.setdefault(language, []).append(f"{os.path.normcase(os.path.abspath(path))}\0{digest}")
+        return {language: hashlib.sha256("\n".join(sorted(entries)).encode("utf-8")).hexdigest()
+                for language, entries in members.items()}
+
+    def validate_file(self, language: str, path: Union[str, Path]) -> ValidationResult:
+        return self.validate([(language, path)])[0]
+
+    @staticmethod
+    def _check_python(path: str) -> Tuple[Diagnostic, ...]:
+        source = Path(path).read_text(encoding="utf-8")
+        try:
+            compile(source, path, "exec")
+        except SyntaxError as e:
+            return (Diagnostic("error", e.msg, e.lineno, e.offset),)
+        return ()
+
+    @staticmethod
+    def _check_java(paths: List[str]) -> Dict[str, Tuple[Diagnostic, ...]]:
+        response = JAVAC_WORKER.compile(paths)
+        if response is not None:
+            ok, records = response
+            by_file: Dict[str, List[Diagnostic]] = {}
+            for source, line, column, severity, message in records:
+                key = os.path.normcase(os.path.abspath(source)) if source else ""
+                by_file.setdefault(key, []).append(Diagnostic(severity, message, line, column))
+            general = tuple(by_file.get("", ()))
+            if not ok and not any(d.severity == "error" for diagnostics in by_file.values() for d in diagnostics):
+                general += (Diagnostic("error", "javac завершился с ошибкой"),)
+            return {path: general + tuple(by_file.get(os.path.normcase(os.path.abspath(path)), ())) for path in paths}
+        # запасной путь: отдельный запуск javac, .class-файлы — во временный каталог
+        with tempfile.TemporaryDirectory() as classes_dir:
+            completed = subprocess.run(["javac", "-d", classes_dir, *paths],
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+        return ValidationEngine._split_output(paths, completed)
+
+    @staticmethod
+    def _check_cpp(path: str) -> Dict[str, Tuple[Diagnostic, ...]]:
+        header = CPP_PRELUDE.header(toolchain_version("cpp"))
+        prelude = ["-include", header] if header else []
+        completed = subprocess.run(["g++", "-fsyntax-only", *prelude, path],
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+        return ValidationEngine._split_output([path], completed)
+
+    @staticmethod
+    def _split_output(paths: List[str], completed: subprocess.CompletedProcess) -> Dict[str, Tuple[Diagnostic, ...]]:
+        """Раскладывает вывод компилятора по файлам; ошибка без позиции
+        относится ко всем файлам запуска"""
+        output = completed.stdout.decode(errors="replace")
+        by_file = parse_diagnostics(output)
+        results = {}
+        for path in paths:
+            diagnostics = tuple(by_file.get(os.path.normcase(os.path.abspath(path)), ()))
+            if completed.returncode != 0 and not any(d.severity == "error" for d in diagnostics) and not by_file:
+                diagnostics += (Diagnostic("error", output.strip() or f"код возврата {completed.returncode}"),)
+            results[path] = diagnostics
+        return results
+
+    @staticmethod
+    def _result(language: str, path: str, diagnostics: Tuple[Diagnostic, ...], cached: bool = False) -> ValidationResult:
+        status = "error" if any(d.severity == "error" for d in diagnostics) else "ok"
+        return ValidationResult(language, path, status, diagnostics, cached)
+
+    def _store(self, key, language: str, path: str, diagnostics: Tuple[Diagnostic, ...]) -> ValidationResult:
+        with self._lock:
+            self._cache[key] = diagnostics
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return self._result(language, path, diagnostics)
+
+    def _cache_get(self, key) -> Optional[Tuple[Diagnostic, ...]]:
+        with self._lock:
+            diagnostics = self._cache.get(key)
+            if diagnostics is not None:
+                self._cache.move_to_end(key)
+            return diagnostics
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+# Общий движок процесса: кеш переиспользуется между запросами
+ENGINE = ValidationEngine()
@@ -0,0 +1,337 @@
+"""Проверка и нормализация диаграмм за один проход.
+
+`check_class_diagram`, `check_database_diagram` и `check_deployment_diagram`
+обходят JSON-представление диаграммы один раз: по ходу проверяются
+обязательные поля, приводятся сокращённые записи (внешний ключ
+"Table.column") и сразу строятся записи IR (model_ir), которые генераторы
+принимают без повторного разбора. Ошибки не прерывают обход, а собираются
+с путём JSON Pointer (RFC 6901), например "/classes/3/attributes/1/type",
+и в конце выбрасываются одним DiagramValidationError.
+
+Для уже построенного IR остаются только проверки связей между элементами:
+ссылочная целостность внешних ключей, концы соединений, циклы наследования.
+"""
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from model_ir import (
+    Attribute, Method, ClassModel, Relationship, ClassDiagram,
+    ForeignKey, Column, Table, TableRelationship, DatabaseDiagram,
+    Node, Connection, DeploymentDiagram, intern,
+)
+from schema_index import SchemaIndex
+
+# "Table.column", "Table(column)" или "Table:column"
+_FOREIGN_KEY = re.compile(r"^(?P<table>[A-Za-z0-9_]+)[\.:(]?(?P<col>[A-Za-z0-9_]+)?\)?$")
+
+
+class Issue(NamedTuple):
+    """Ошибка диаграммы: pointer — путь JSON Pointer к месту ошибки"""
+    pointer: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.pointer or '/'}: {self.message}"
+
+
+class DiagramValidationError(ValueError):
+    """Все ошибки диаграммы, найденные за проход; errors — список Issue"""
+
+    def __init__(self, errors: List[Issue]):
+        self.errors = errors
+        if len(errors) == 1:
+            message = str(errors[0])
+        else:
+            message = f"Найдено ошибок в диаграмме: {len(errors)}\n" + "\n".join(str(issue) for issue in errors)
+        super().__init__(message)
+
+
+def pointer(*parts: Any) -> str:
+    """JSON Pointer из ключей и индексов; "~" и "/" экранируются"""
+    return "".join("/" + str(part).replace("~", "~0").replace("/", "~1") for part in parts)
+
+
+class _Collector:
+    """Ошибки одного прохода"""
+
+    def __init__(self):
+        self.errors: List[Issue] = []
+
+    def add(self, path: str, message: str) -> None:
+        self.errors.append(Issue(path, message))
+
+    def items(self, data: Dict[str, Any], key: str, required: bool = True) -> List[Tuple[str, Dict[str, Any]]]:
+        """Пары (путь, элемент) списка data[key]; не-словари и не-список — ошибки"""
+        path = pointer(key)
+        if key not in data:
+            if required:
+                self.add("", f"Диаграмма должна содержать ключ '{key}'.")
+            return []
+        return self.list_items(data[key], path, f"'{key}'")
+
+    def list_items(self, value: Any, path: str, label: str) -> List[Tuple[str, Dict[str, Any]]]:
+        if not isinstance(value, list):
+            self.add(path, f"{label} должно быть списком.")
+            return []
+        result = []
+        for index, item in enumerate(value):
+            item_path = f"{path}/{index}"
+            if isinstance(item, dict):
+                result.append((item_path, item))
+            else:
+                self.add(item_path, "Элемент должен быть объектом.")
+        return result
+
+    def missing(self, item: Dict[str, Any], path: str, keys: Tuple[str, ...], message: str) -> bool:
+        """Отмечает отсутствующие ключи (путь — к первому из них); True, если чего-то нет"""
+        absent = [key for key in keys if key not in item]
+        if absent:
+            self.add(f"{path}/{absent[0]}", message)
+        return bool(absent)
+
+    def raise_if_any(self) -> None:
+        if self.errors:
+            raise DiagramValidationError(self.errors)
+
+
+def _require_mapping(data: Any) -> None:
+    if not isinstance(data, dict):
+        raise DiagramValidationError([Issue("", "Диаграмма должна быть объектом JSON.")])
+
+
+# ============================================================
+#   ДИАГРАММА КЛАССОВ
+# ============================================================
+def check_class_diagram(data: Any) -> ClassDiagram:
+    """Проверяет диаграмму классов и строит её IR за один проход"""
+    errors = _Collector()
+    if isinstance(data, ClassDiagram):
+        # записи IR строит парсер: обязательные поля есть по построению
+        _check_inheritance(data.classes, [pointer("classes", index) for index in range(len(data.classes))], errors)
+        errors.raise_if_any()
+        return data
+    _require_mapping(data)
+
+    classes = []
+    class_paths = []
+    for path, cls in errors.items(data, "classes"):
+        model = _check_class(cls, path, errors)
+        if model is not None:
+            classes.append(model)
+            class_paths.append(path)
+
+    relationships = []
+    for path, rel in errors.items(data, "relationships", required=False):
+        if not errors.missing(rel, path, ("type", "from", "to"), "Связь должна иметь 'type', 'from' и 'to'."):
+            relationships.append(Relationship(rel["type"], rel["from"], rel["to"], rel.get("multiplicity", "one-to-one")))
+
+    unresolved = data.get("unresolved", [])
+    if not isinstance(unresolved, list) or not all(isinstance(name, str) for name in unresolved):
+        errors.add(pointer("unresolved"), "'unresolved' должно быть списком строк.")
+        unresolved = []
+
+    _check_inheritance(classes, class_paths, errors)
+    errors.raise_if_any()
+    return ClassDiagram(classes, relationships, [intern(name) for name in unresolved])
+
+
+def _check_class(cls: Dict[str, Any], path: str, errors: _Collector) -> Optional[ClassModel]:
+    name = cls.get("name")
+    if not name:
+        errors.add(f"{path}/name", "Класс должен иметь имя.")
+    if errors.missing(cls, path, ("attributes", "methods"), "Класс должен иметь поля 'attributes' и 'methods'."):
+        return None
+
+    attributes = []
+    for attr_path, attr in errors.list_items(cls["attributes"], f"{path}/attributes", "'attributes'"):
+        if not errors.missing(attr, attr_path, ("name", "type"), "Атрибут должен иметь 'name' и 'type'."):
+            attributes.append(Attribute(attr["name"], attr["type"]))
+
+    methods = []
+    for method_path, method in errors.list_items(cls["methods"], f"{path}/methods", "'methods'"):
+        method_name = method.get("name")
+        complete = not errors.missing(method, method_path, ("name", "return_type"),
+                                      "Метод должен иметь 'name' и 'return_type'.")
+        params = []
+        for param_path, param in errors.list_items(method.get("params", []), f"{method_path}/params", "'params'"):
+            if not errors.missing(param, param_path, ("name", "type"),
+                                  "Параметр метода должен иметь 'name' и 'type'."):
+                params.append(Attribute(param["name"], param["type"]))
+        if complete:
+            methods.append(Method(method_name, method["return_type"], params))
+
+    if not name:
+        return None
+    return ClassModel(name, attributes, methods, cls.get("inherits"))
+
+
+def linearize_inheritance(parents: Dict[str, Optional[str]]) -> Tuple[Dict[str, Tuple[str, ...]], List[List[str]]]:
+    """Предки каждого класса от корня к родителю и циклы наследования.
+
+    Каждый класс обходится один раз. Родитель вне модели (внешний базовый
+    класс) в цепочку не входит. Цикл — имена от класса, на котором он
+    замкнулся, до него же; классам цикла и ведущим в него предки не назначаются.
+    Общая реализация для проверки диаграммы и генераторов (main).
+    """
+    ancestors: Dict[str, Tuple[str, ...]] = {}
+    cycles: List[List[str]] = []
+    for start in parents:
+        path = []
+        on_path = set()
+        name = start
+        while name in parents and name not in ancestors:
+            if name in on_path:
+                cycles.append(path[path.index(name):] + [name])
+                for child in path:
+                    ancestors[child] = ()
+                break
+            path.append(name)
+            on_path.add(name)
+            name = parents[name]
+        else:
+            chain = ancestors.get(name, ())
+            if name in ancestors:
+                chain += (name,)
+            # путь разворачивается от ближайшего к известному предку
+            for child in reversed(path):
+                ancestors[child] = chain
+                chain += (child,)
+    return ancestors, cycles
+
+
+def inheritance_cycle_message(cycle: List[str]) -> str:
+    return f"Циклическое наследование: {' -> '.join(cycle)}"
+
+
+def _check_inheritance(classes: List[ClassModel], paths: List[str], errors: _Collector) -> None:
+    """Циклы наследования (см. linearize_inheritance)"""
+    positions = {cls.name: path for cls, path in zip(classes, paths)}
+    _, cycles = linearize_inheritance({cls.name: cls.inherits for cls in classes})
+    for cycle in cycles:
+        errors.add(f"{positions[cycle[0]]}/inherits", inheritance_cycle_message(cycle))
+
+
+# ============================================================
+#   ДИАГРАММА БАЗЫ ДАННЫХ
+# ============================================================
+def check_database_diagram(data: Any) -> Tuple[DatabaseDiagram, SchemaIndex]:
+    """Проверяет диаграмму базы данных и строит её IR и индекс схемы за один проход"""
+    errors = _Collector()
+    if isinstance(data, DatabaseDiagram):
+        # для IR остаётся только проверка ссылочной целостности
+        schema = SchemaIndex(data.tables)
+        _check_foreign_keys(schema, _column_paths(data.tables), errors)
+        errors.raise_if_any()
+        return data, schema
+    _require_mapping(data)
+
+    tables = []
+    column_paths: Dict[Tuple[str, str], str] = {}
+    for path, table in errors.items(data, "tables"):
+        table_name = table.get("name")
+        if table_name is None:
+            errors.add(f"{path}/name", "Таблица должна иметь имя.")
+        if "columns" not in table:
+            errors.add(f"{path}/columns", "Таблица должна содержать список 'columns'.")
+            continue
+        columns = []
+        for column_path, column in errors.list_items(table["columns"], f"{path}/columns",
+                                                     "'columns'"):
+            record = _check_column(column, column_path, table_name, errors)
+            if record is not None:
+                columns.append(record)
+                column_paths[(table_name, record.name)] = column_path
+        if table_name is not None:
+            tables.append(Table(table_name, columns))
+
+    relationships = []
+    for path, rel in errors.items(data, "relationships", required=False):
+        if not errors.missing(rel, path, ("type", "from", "to"), "Связь должна иметь 'type', 'from' и 'to'."):
+            relationships.append(TableRelationship(rel["type"], rel["from"], rel["to"], rel.get("on")))
+
+    # индекс строится по нормализованным внешним ключам и переиспользуется генератором
+    schema = SchemaIndex(tables)
+    _check_foreign_keys(schema, column_paths, errors)
+    errors.raise_if_any()
+    return DatabaseDiagram(tables, relationships), schema
+
+
+def _check_column(column: Dict[str, Any], path: str, table_name: str, errors: _Collector) -> Optional[Column]:
+    if errors.missing(column, path, ("name", "type"), "Столбец должен иметь 'name' и 'type'."):
+        return None
+    name = column["name"]
+    foreign_key = column.get("foreign_key")
+    fk_path = f"{path}/foreign_key"
+    if isinstance(foreign_key, dict):
+        if errors.missing(foreign_key, fk_path, ("references", "column"),
+                          f"'foreign_key' в столбце {name} таблицы {table_name} должен содержать 'references' и 'column'."):
+            return None
+        foreign_key = ForeignKey(foreign_key["references"], foreign_key["column"])
+    elif isinstance(foreign_key, str):
+        match = _FOREIGN_KEY.match(foreign_key.strip())
+        if not (match and match.group("col")):
+            errors.add(fk_path, f"'foreign_key' в столбце {name} таблицы {table_name} должен быть словарём или строкой 'Table.column'.")
+            return None
+        foreign_key = ForeignKey(match.group("table"), match.group("col"))
+    elif foreign_key is not None:
+        errors.add(fk_path, f"'foreign_key' в столбце {name} таблицы {table_name} должен быть словарём, строкой или None.")
+        return None
+    return Column(name, column["type"], column.get("primary_key", False), column.get("auto_increment", False),
+                  column.get("not_null", False), foreign_key)
+
+
+def _column_paths(tables: List[Table]) -> Dict[Tuple[str, str], str]:
+    return {
+        (table.name, column.name): pointer("tables", table_index, "columns", column_index)
+        for table_index, table in enumerate(tables)
+        for column_index, column in enumerate(table.columns)
+    }
+
+
+def _check_foreign_keys(schema: SchemaIndex, column_paths: Dict[Tuple[str, str], str], errors: _Collector) -> None:
+    """Внешние ключи должны ссылаться на существующие таблицы и столбцы"""
+    for table_name, fk in schema.dangling_foreign_keys():
+        path = column_paths.get((table_name, fk.name), "") + "/foreign_key"
+        if not schema.has_table(fk.references):
+            errors.add(path, f"Внешний ключ {table_name}.{fk.name} ссылается на несуществующую таблицу {fk.references}.")
+        else:
+            errors.add(path, f"Внешний ключ {table_name}.{fk.name} ссылается на несуществующий столбец {fk.references}.{fk.column}.")
+
+
+# ============================================================
+#   ДИАГРАММА РАЗВЕРТЫВАНИЯ
+# ============================================================
+def check_deployment_diagram(data: Any) -> DeploymentDiagram:
+    """Проверяет диаграмму развертывания и строит её IR за один проход"""
+    errors = _Collector()
+    if isinstance(data, DeploymentDiagram):
+        node_names = {node.name for node in data.nodes}
+        for index, connection in enumerate(data.connections):
+            _check_endpoints(connection, pointer("connections", index), node_names, errors)
+        errors.raise_if_any()
+        return data
+    _require_mapping(data)
+
+    nodes = []
+    for path, node in errors.items(data, "nodes"):
+        if not errors.missing(node, path, ("name",), "Каждый узел в 'nodes' должен иметь ключ 'name'."):
+            nodes.append(Node(node["name"]))
+    node_names = {node.name for node in nodes}
+
+    connections = []
+    for path, connection in errors.items(data, "connections", required=False):
+        if errors.missing(connection, path, ("from", "to", "label"), "Соединение должно содержать ключи 'from', 'to' и 'label'."):
+            continue
+        record = Connection(connection["from"], connection["to"], connection["label"])
+        _check_endpoints(record, path, node_names, errors)
+        connections.append(record)
+
+    errors.raise_if_any()
+    return DeploymentDiagram(nodes, connections)
+
+
+def _check_endpoints(connection: Connection, path: str, node_names: set, errors: _Collector) -> None:
+    if connection.source not in node_names:
+        errors.add(f"{path}/from", f"Узел-источник '{connection.source}' не найден в 'nodes'.")
+    if connection.target not in node_names:
+        errors.add(f"{path}/to", f"Узел-получатель '{connection.target}' не найден в 'nodes'.")
@@ -0,0 +1,138 @@
+"""Инкрементальная запись сгенерированных файлов.
+
+Шаблоны генераторов состоят из макросов header / unit / footer, где unit —
+один класс, таблица или сервис. Рядом с выходным файлом хранится манифест
+(.<имя>.manifest.json): хеш шаблона, хеш файла и для каждого unit — хеш
+его среза модели и позиция текста в файле. При повторной генерации
+перерисовываются только unit с новым хешем, остальные копируются из
+текущего файла. Файл пишется атомарно и только если текст изменился, так
+что mtime неизменённых файлов не трогается.
+"""
+import filecmp
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from jinja2 import Template
+
+MANIFEST_VERSION = 1
+
+
+class RenderStats(NamedTuple):
+    """Итог записи: written — файл перезаписан; rendered/total — перерисованные unit"""
+    written: bool
+    rendered: int
+    total: int
+
+
+def manifest_path(output_file: Path) -> Path:
+    return output_file.with_name(f".{output_file.name}.manifest.json")
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _temp_path(path: Path) -> Path:
+    # open() создаёт файл с правами по umask, в отличие от tempfile (0600)
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Пишет во временный файл того же каталога и подменяет им path"""
+    tmp = _temp_path(path)
+    try:
+        with tmp.open("w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def write_if_changed(path: Path, text: str) -> bool:
+    """Атомарно записывает text, если он отличается от содержимого path"""
+    try:
+        if path.read_text(encoding="utf-8") == text:
+            return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    atomic_write_text(path, text)
+    return True
+
+
+def write_chunks_if_changed(path: Path, chunks: Iterable[str]) -> bool:
+    """Потоковый вариант write_if_changed: части пишутся во временный файл,
+    который подменяет path, только если отличается от него"""
+    tmp = _temp_path(path)
+    try:
+        with tmp.open("w", encoding="utf-8") as file:
+            file.writelines(chunks)
+        if path.exists() and filecmp.cmp(tmp, path, shallow=False):
+            return False
+        os.replace(tmp, path)
+        return True
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _template_hash(template: Template) -> str:
+    with open(template.filename, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def _load_previous(output_file: Path, template_hash: str) -> Tuple[Optional[str], Dict[str, Tuple[int, int]]]:
+    """Текущий текст файла и хеш unit -> (начало, конец), если манифест ему соответствует"""
+    try:
+        manifest = json.loads(manifest_path(output_file).read_text(encoding="utf-8"))
+        text = output_file.read_text(encoding="utf-8")
+    except (OSError, ValueError):
+        return None, {}
+    if (manifest.get("version") != MANIFEST_VERSION or manifest.get("template") != template_hash
+            or manifest.get("output") != _sha256(text)):
+        return None, {}
+    return text, {unit["hash"]: (unit["start"], unit["end"]) for unit in manifest["units"]}
+
+
+def render_incremental(template: Template, context: Dict[str, Any], units_key: str,
+                       unit_args: Callable[[Any, Dict[str, Any]], Tuple], output_file: Path) -> RenderStats:
+    """Собирает файл из header, unit и footer шаблона, перерисовывая только
+    изменившиеся unit, и записывает его вместе с манифестом.
+
+    unit_args(unit, context) — аргументы макроса unit; по ним считается хеш
+    среза модели, поэтому они должны включать всё, от чего зависит текст.
+    """
+    template_hash = _template_hash(template)
+    previous_text, previous = _load_previous(output_file, template_hash)
+    units = context[units_key]
+    # корневой рендер с пустым списком дешёв и даёт доступ к макросам
+    module = template.make_module({**context, units_key: []})
+
+    parts: List[str] = [str(module.header(units))]
+    offset = len(parts[0])
+    records = []
+    rendered = 0
+    for unit in units:
+        args = unit_args(unit, context)
+        unit_hash = _sha256(template_hash + repr(args))
+        span = previous.get(unit_hash)
+        if span is not None:
+            fragment = previous_text[span[0]:span[1]]
+        else:
+            fragment = str(module.unit(*args))
+            rendered += 1
+        name = (unit.get("name") or unit.get("container_name")) if isinstance(unit, dict) else None
+        records.append({"name": name, "hash": unit_hash, "start": offset, "end": offset + len(fragment)})
+        parts.append(fragment)
+        offset += len(fragment)
+    parts.append(str(module.footer(units)))
+
+    text = "".join(parts)
+    written = text != previous_text and write_if_changed(output_file, text)
+    manifest = {"version": MANIFEST_VERSION, "template": template_hash, "output": _sha256(text), "units": records}
+    write_if_changed(manifest_path(output_file), json.dumps(manifest, ensure_ascii=False))
+    return RenderStats(written, rendered, len(units))
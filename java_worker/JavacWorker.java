@@ -0,0 +1,89 @@
+import javax.tools.Diagnostic;
+import javax.tools.DiagnosticCollector;
+import javax.tools.FileObject;
+import javax.tools.ForwardingJavaFileManager;
+import javax.tools.JavaCompiler;
+import javax.tools.JavaFileManager;
+import javax.tools.JavaFileObject;
+import javax.tools.SimpleJavaFileObject;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.ToolProvider;
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.net.URI;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.Locale;
+
+/**
+ * Резидентный компилятор для проверки сгенерированного Java-кода (validation_workers.py).
+ *
+ * Протокол по stdin/stdout, UTF-8, построчно. После запуска печатается READY.
+ * Запрос — пути файлов через табуляцию. Ответ — строки
+ * D\tпуть\tстрока\tстолбец\tвид\tсообщение (табуляции и переводы строк
+ * экранированы) и завершающая E\t1 (успех) или E\t0.
+ * Байткод остаётся в памяти и отбрасывается.
+ */
+public class JavacWorker {
+
+    public static void main(String[] args) throws IOException {
+        PrintStream out = new PrintStream(System.out, true, "UTF-8");
+        JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler == null) {
+            out.println("X\tsystem Java compiler is not available");
+            return;
+        }
+        StandardJavaFileManager standard = compiler.getStandardFileManager(null, Locale.ROOT, StandardCharsets.UTF_8);
+        JavaFileManager memory = new ForwardingJavaFileManager<JavaFileManager>(standard) {
+            @Override
+            public JavaFileObject getJavaFileForOutput(Location location, String className,
+                                                       JavaFileObject.Kind kind, FileObject sibling) {
+                URI uri = URI.create("mem:///" + className.replace('.', '/') + kind.extension);
+                return new SimpleJavaFileObject(uri, kind) {
+                    @Override
+                    public OutputStream openOutputStream() {
+                        return new ByteArrayOutputStream();
+                    }
+                };
+            }
+        };
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        out.println("READY");
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            List<File> files = new ArrayList<>();
+            for (String path : line.split("\t")) {
+                files.add(new File(path));
+            }
+            DiagnosticCollector<JavaFileObject> diagnostics = new DiagnosticCollector<>();
+            boolean ok;
+            try {
+                ok = compiler.getTask(null, memory, diagnostics, null, null,
+                        standard.getJavaFileObjectsFromFiles(files)).call();
+            } catch (RuntimeException e) {
+                ok = false;
+                out.println("D\t\t-1\t-1\tERROR\t" + escape(String.valueOf(e)));
+            }
+            for (Diagnostic<? extends JavaFileObject> d : diagnostics.getDiagnostics()) {
+                String source = d.getSource() == null ? "" : new File(d.getSource().toUri()).getPath();
+                out.println("D\t" + source + "\t" + d.getLineNumber() + "\t" + d.getColumnNumber() + "\t"
+                        + d.getKind() + "\t" + escape(d.getMessage(Locale.ROOT)));
+            }
+            out.println("E\t" + (ok ? 1 : 0));
+        }
+    }
+
+    private static String escape(String text) {
+        return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\r", "").replace("\n", "\\n");
+    }
+}
@@ -0,0 +1,362 @@
+"""Job and pairing-code store for the PlantUML server.
+
+`JobStore` is the interface `puml_server/server.py` uses for `/generate` jobs
+and one-time pairing codes. Two implementations:
+
+- `SQLiteJobStore` (default): one SQLite database in WAL mode, indexed by
+  job_id, status and created_at. Every uvicorn worker on the host opens the
+  same file, so `/status` and `/pair` work whichever worker takes the request.
+  Status updates are buffered and written by a background thread in one
+  transaction per batch; reads in the same process see pending updates.
+- `MemoryJobStore`: process-local dicts, for tests and single-process runs.
+
+Keys (idempotency keys, content hashes of requests) are bound to jobs with
+`claim()`: the first request binds its job, identical later requests get the
+bound job back instead of starting another one.
+
+Jobs and keys older than the TTL and expired pairing codes are removed by `expire()`,
+which the SQLite store also runs periodically from its flush thread.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+JOB_TTL = int(os.getenv("PUML_JOB_TTL", str(7 * 24 * 3600)))  # seconds
+FLUSH_INTERVAL = float(os.getenv("PUML_JOB_FLUSH_INTERVAL", "0.1"))  # seconds
+EXPIRE_INTERVAL = 600  # seconds between automatic expire() runs
+
+# Fields stored in their own columns; the rest of a job is kept as JSON in `data`
+_JOB_COLUMNS = ("job_id", "status")
+
+
+class JobStore:
+    """Interface of a job store.
+
+    A job is a JSON-serializable dict with at least "job_id" and "status".
+    """
+
+    def __init__(self, ttl: float = JOB_TTL):
+        self.ttl = ttl
+
+    def create(self, job: Dict[str, Any]) -> None:
+        """Add a job; it is visible to other workers once this returns."""
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        """Merge fields into a job. Writes may be batched."""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def delete(self, job_id: str) -> None:
+        raise NotImplementedError
+
+    def claim(self, key: str, job_id: str, max_age: Optional[float] = None, replace_errors: bool = False) -> str:
+        """Bind `key` to `job_id` unless it is already bound to an existing job
+        within `max_age` seconds (default: the TTL); returns the job the key is bound to.
+
+        With `replace_errors` a key bound to a failed job is rebound.
+        """
+        raise NotImplementedError
+
+    def bind(self, key: str, job_id: str) -> None:
+        """Bind `key` to `job_id` unconditionally."""
+        raise NotImplementedError
+
+    def add_pair_code(self, code: str, expires_at: float) -> None:
+        raise NotImplementedError
+
+    def consume_pair_code(self, code: str) -> bool:
+        """Remove a pairing code; True if it existed and had not expired."""
+        raise NotImplementedError
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Remove jobs and keys older than the TTL and expired pairing codes; returns the number of jobs removed."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of jobs by status."""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Write buffered updates."""
+
+    def close(self) -> None:
+        self.flush()
+
+
+class MemoryJobStore(JobStore):
+    """Process-local store; jobs are lost on restart and not shared between workers."""
+
+    def __init__(self, ttl: float = JOB_TTL):
+        super().__init__(ttl)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._created: Dict[str, float] = {}
+        self._pair_codes: Dict[str, float] = {}
+        self._keys: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+            self._created[job["job_id"]] = time.time()
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._created.pop(job_id, None)
+
+    def claim(self, key: str, job_id: str, max_age: Optional[float] = None, replace_errors: bool = False) -> str:
+        now = time.time()
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            bound, bound_at = self._keys.get(key, (None, 0.0))
+            job = self._jobs.get(bound)
+            if job is not None and bound_at >= now - max_age and not (replace_errors and job["status"] == "error"):
+                return bound
+            self._keys[key] = (job_id, now)
+        return job_id
+
+    def bind(self, key: str, job_id: str) -> None:
+        with self._lock:
+            self._keys[key] = (job_id, time.time())
+
+    def add_pair_code(self, code: str, expires_at: float) -> None:
+        with self._lock:
+            self._pair_codes[code] = expires_at
+
+    def consume_pair_code(self, code: str) -> bool:
+        with self._lock:
+            expires_at = self._pair_codes.pop(code, None)
+        return expires_at is not None and expires_at >= time.time()
+
+    def expire(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        with self._lock:
+            old = [job_id for job_id, created in self._created.items() if created < now - self.ttl]
+            for job_id in old:
+                del self._jobs[job_id]
+                del self._created[job_id]
+            for code in [code for code, expires_at in self._pair_codes.items() if expires_at < now]:
+                del self._pair_codes[code]
+            for key in [key for key, (_, bound_at) in self._keys.items() if bound_at < now - self.ttl]:
+                del self._keys[key]
+        return len(old)
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"backend": "memory", "jobs": counts}
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite store shared by all processes that open the same file.
+
+    Each thread gets its own connection. `update` only queues the fields;
+    a daemon thread writes the queue every `flush_interval` seconds in a
+    single transaction (and runs `expire` every EXPIRE_INTERVAL seconds).
+    """
+
+    def __init__(self, path: Union[str, Path], ttl: float = JOB_TTL, flush_interval: float = FLUSH_INTERVAL):
+        super().__init__(ttl)
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        self._last_expire = 0.0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+            CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+            CREATE TABLE IF NOT EXISTS pair_codes (
+                code TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_keys (
+                key TEXT PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS job_keys_created_at ON job_keys (created_at);
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def create(self, job: Dict[str, Any]) -> None:
+        data = {k: v for k, v in job.items() if k not in _JOB_COLUMNS}
+        self._connection().execute(
+            "INSERT OR REPLACE INTO jobs (job_id, status, created_at, data) VALUES (?, ?, ?, ?)",
+            (job["job_id"], job["status"], time.time(), json.dumps(data, ensure_ascii=False)),
+        )
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            self._pending.setdefault(job_id, {}).update(fields)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="job-store-flush", daemon=True)
+                self._flusher.start()
+        self._wakeup.set()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute("SELECT status, data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        pending = self._pending_fields(job_id)
+        if row is None:
+            return None
+        job = {"job_id": job_id, "status": row[0], **json.loads(row[1])}
+        job.update(pending)
+        return job
+
+    def _pending_fields(self, job_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._inflight.get(job_id, {}), **self._pending.get(job_id, {})}
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._pending.pop(job_id, None)
+        self._connection().execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def claim(self, key: str, job_id: str, max_age: Optional[float] = None, replace_errors: bool = False) -> str:
+        now = time.time()
+        max_age = self.ttl if max_age is None else max_age
+        db = self._connection()
+        # IMMEDIATE takes the write lock up front: concurrent claims from other workers queue behind it
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT k.job_id, j.status FROM job_keys k JOIN jobs j ON j.job_id = k.job_id"
+                " WHERE k.key = ? AND k.created_at >= ?", (key, now - max_age)).fetchone()
+            if row is not None:
+                status = self._pending_fields(row[0]).get("status", row[1])
+                if not (replace_errors and status == "error"):
+                    db.execute("COMMIT")
+                    return row[0]
+            db.execute("INSERT OR REPLACE INTO job_keys (key, job_id, created_at) VALUES (?, ?, ?)", (key, job_id, now))
+            db.execute("COMMIT")
+        except Exception:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def bind(self, key: str, job_id: str) -> None:
+        self._connection().execute("INSERT OR REPLACE INTO job_keys (key, job_id, created_at) VALUES (?, ?, ?)",
+                                   (key, job_id, time.time()))
+
+    def add_pair_code(self, code: str, expires_at: float) -> None:
+        self._connection().execute("INSERT OR REPLACE INTO pair_codes (code, expires_at) VALUES (?, ?)", (code, expires_at))
+
+    def consume_pair_code(self, code: str) -> bool:
+        # a single DELETE: two workers cannot both consume the same code
+        cursor = self._connection().execute("DELETE FROM pair_codes WHERE code = ? AND expires_at >= ?", (code, time.time()))
+        return cursor.rowcount == 1
+
+    def expire(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        db = self._connection()
+        removed = db.execute("DELETE FROM jobs WHERE created_at < ?", (now - self.ttl,)).rowcount
+        db.execute("DELETE FROM job_keys WHERE created_at < ?", (now - self.ttl,))
+        db.execute("DELETE FROM pair_codes WHERE expires_at < ?", (now,))
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        self.flush()
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"backend": "sqlite", "path": str(self.path), "jobs": dict(rows)}
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            # updates being written stay visible to get() until the commit
+            pending = self._inflight = self._pending
+            self._pending = {}
+        if not pending:
+            return
+        db = self._connection()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for job_id, fields in pending.items():
+                row = db.execute("SELECT status, data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                if row is None:
+                    continue
+                data = json.loads(row[1])
+                data.update({k: v for k, v in fields.items() if k not in _JOB_COLUMNS})
+                db.execute("UPDATE jobs SET status = ?, data = ? WHERE job_id = ?",
+                           (fields.get("status", row[0]), json.dumps(data, ensure_ascii=False), job_id))
+            db.execute("COMMIT")
+        except Exception:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            # keep the batch for the next attempt; newer updates win
+            with self._lock:
+                for job_id, fields in pending.items():
+                    self._pending[job_id] = {**fields, **self._pending.get(job_id, {})}
+            raise
+        finally:
+            with self._lock:
+                self._inflight = {}
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(timeout=EXPIRE_INTERVAL)
+            self._wakeup.clear()
+            # let a burst of updates accumulate into one transaction
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                if time.time() - self._last_expire >= EXPIRE_INTERVAL:
+                    self._last_expire = time.time()
+                    self.expire()
+            except sqlite3.Error as e:
+                print("Failed to write job store:", e)
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+
+
+def open_job_store(location: Union[str, Path]) -> JobStore:
+    """"memory" for MemoryJobStore, otherwise the path of an SQLite database."""
+    if str(location) == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore(location)
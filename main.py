@@ -1,157 +1,154 @@
+import hashlib
 import json
+import os
 import re
-import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any
-from jinja2 import Template
+from typing import Dict, Any, List, Union, Iterator, Iterable, Tuple
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template, TemplateNotFound
 
+from code_validation import ENGINE, ValidationResult
+from diagram_check import (
+    check_class_diagram, check_database_diagram, check_deployment_diagram,
+    inheritance_cycle_message, linearize_inheritance,
+)
+from incremental_output import RenderStats, render_incremental, write_chunks_if_changed, write_if_changed
+from schema_index import SchemaIndex, ForeignKeyRef
+from type_expr import TypeMapper
+from puml2json import StreamingJSONReader
+from model_ir import as_model, record_from_json, model_from_records, DIAGRAM_TYPES
+import model_binary
 
-class CodeValidator:
-    """ Проверка сгенерированного кода для Python, Java и C++ """
+TEMPLATES_DIR = Path(__file__).resolve().parent / "jinja_templates"
+# Байткод шаблонов переживает перезапуск процесса; по умолчанию — во временном каталоге
+BYTECODE_CACHE = FileSystemBytecodeCache(os.getenv("PUML_JINJA_CACHE_DIR") or None)
 
-    def __init__(self, language: str):
-        self.language = language.lower()
 
-    def validate(self, file_path: str):
-        if self.language == "python":
-            self._validate_python(file_path)
-        elif self.language == "java":
-            self._validate_java(file_path)
-        elif self.language == "cpp":
-            self._validate_cpp(file_path)
-        else:
-            print(f"⚠️ Валидация для языка '{self.language}' пока не поддерживается.")
-
-    def _validate_python(self, file_path: str):
-        print(f"🔍 Проверка Python кода: {file_path}")
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                source = f.read()
-            compile(source, file_path, "exec")
-            print("✅ Python код успешно прошел проверку.\n")
-        except SyntaxError as e:
-            print(f"❌ Ошибка в Python коде:\n{e}\n")
-
-    def _validate_java(self, file_path: str):
-        print(f"🔍 Проверка Java кода: {file_path}")
-        try:
-            subprocess.run(["javac", file_path], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            print("✅ Java код успешно прошел проверку.\n")
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Ошибка компиляции Java:\n{e.stderr.decode()}\n")
-        except FileNotFoundError:
-            print("❌ Компилятор Java (javac) не найден. Убедитесь, что он установлен и добавлен в PATH.\n")
-
-    def _validate_cpp(self, file_path: str):
-        print(f"🔍 Проверка C++ кода: {file_path}")
-        try:
-            subprocess.run(["g++", "-fsyntax-only", file_path], check=True, stdout=subprocess.PIPE,
-                           stderr=subprocess.PIPE)
-            print("✅ C++ код успешно прошел проверку.\n")
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Ошибка компиляции C++:\n{e.stderr.decode()}\n")
-        except FileNotFoundError:
-            print("❌ Компилятор C++ (g++) не найден. Убедитесь, что он установлен и добавлен в PATH.\n")
+def _make_environment(directory: Path) -> Environment:
+    """ Окружение Jinja: скомпилированные шаблоны кешируются в памяти и
+    перечитываются при изменении mtime файла (auto_reload) """
+    return Environment(
+        loader=FileSystemLoader(str(directory)),
+        auto_reload=True,
+        cache_size=64,
+        bytecode_cache=BYTECODE_CACHE,
+    )
 
 
-class ClassDiagramValidator:
-    """ Проверка корректности представления диаграммы классов (без проверки связей) """
+# Общее окружение для шаблонов из jinja_templates/
+TEMPLATE_ENV = _make_environment(TEMPLATES_DIR)
 
-    def __init__(self, data: Dict[str, Any]):
-        self.data = data
-        self.class_names = {cls["name"] for cls in data.get("classes", [])}
 
-    def validate(self) -> None:
-        """ Проверяет корректность диаграммы классов """
-        self._validate_classes()
+@lru_cache(maxsize=16)
+def _environment_for(directory: str) -> Environment:
+    return _make_environment(Path(directory))
+
+
+def get_template(template_file: Union[str, Path]) -> Template:
+    """ Возвращает скомпилированный шаблон из общего кеша.
+
+    Шаблоны из jinja_templates/ ищутся по имени независимо от текущего
+    каталога; для прочих путей заводится окружение на их каталог.
+    """
+    path = Path(template_file)
+    if path.parent.name == TEMPLATES_DIR.name and (TEMPLATES_DIR / path.name).exists():
+        env, name = TEMPLATE_ENV, path.name
+    else:
+        env, name = _environment_for(str(path.resolve().parent)), path.name
+    try:
+        return env.get_template(name)
+    except TemplateNotFound:
+        raise FileNotFoundError(f"Шаблон не найден: {template_file}")
+
+
+def warm_templates() -> List[str]:
+    """ Компилирует все шаблоны jinja_templates/ заранее (например, при старте сервера) """
+    names = TEMPLATE_ENV.list_templates(extensions=["jinja2"])
+    for name in names:
+        TEMPLATE_ENV.get_template(name)
+    return names
+
+
+def templates_version() -> str:
+    """ Отпечаток шаблонов jinja_templates/ по именам, размерам и mtime файлов:
+    меняется при правке любого шаблона (auto_reload подхватит её так же) """
+    digest = hashlib.sha256()
+    for name in sorted(TEMPLATE_ENV.list_templates(extensions=["jinja2"])):
+        stat = (TEMPLATES_DIR / name).stat()
+        digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
 
-    def _validate_classes(self) -> None:
-        """ Проверяет корректность классов (наличие обязательных полей и правильность типов) """
-        for cls in self.data.get("classes", []):
-            self._validate_class(cls)
+class CodeValidator:
+    """ Проверка сгенерированного кода для Python, Java и C++ с выводом в консоль;
+    проверка выполняется общим движком code_validation.ENGINE """
 
-    def _validate_class(self, cls: Dict[str, Any]) -> None:
-        """ Проверяет корректность одного класса """
-        if not cls.get("name"):
-            raise ValueError(f"Класс должен иметь имя. Проблема в классе: {cls}")
+    LANGUAGE_NAMES = {"python": "Python", "java": "Java", "cpp": "C++"}
 
-        if "attributes" not in cls or "methods" not in cls:
-            raise ValueError(f"Класс {cls['name']} должен иметь поля 'attributes' и 'methods'.")
+    def __init__(self, language: str):
+        self.language = language.lower()
 
-        # Проверка атрибутов
-        for attr in cls.get("attributes", []):
-            if "name" not in attr or "type" not in attr:
-                raise ValueError(f"Атрибут {attr} в классе {cls['name']} должен иметь 'name' и 'type'.")
+    def validate(self, file_path: str) -> ValidationResult:
+        return self.validate_many([(self.language, file_path)])[0]
+
+    @classmethod
+    def validate_many(cls, files: Iterable[Tuple[str, Union[str, Path]]]) -> List[ValidationResult]:
+        """ Проверяет несколько файлов за один проход движка и печатает итоги """
+        results = ENGINE.validate(files)
+        for result in results:
+            cls.report(result)
+        return results
+
+    @classmethod
+    def report(cls, result: ValidationResult) -> None:
+        if result.status == "unsupported":
+            print(f"⚠️ Валидация для языка '{result.language}' пока не поддерживается.")
+            return
+        name = cls.LANGUAGE_NAMES[result.language]
+        print(f"🔍 Проверка {name} кода: {result.file}")
+        if result.status == "ok":
+            print(f"✅ {name} код успешно прошел проверку.\n")
+            return
+        if result.status == "unavailable":
+            print(f"❌ {result.diagnostics[0].message}\n")
+            return
+        lines = "\n".join(
+            f"{result.file}:{d.line}: {d.severity}: {d.message}" if d.line else d.message
+            for d in result.diagnostics
+        )
+        print(f"❌ Ошибка в {name} коде:\n{lines}\n")
 
-        # Проверка методов
-        for method in cls.get("methods", []):
-            if "name" not in method or "return_type" not in method:
-                raise ValueError(f"Метод {method} в классе {cls['name']} должен иметь 'name' и 'return_type'.")
 
-            for param in method.get("params", []):
-                if "name" not in param or "type" not in param:
-                    raise ValueError(f"Параметр {param} в методе {method['name']} должен иметь 'name' и 'type'.")
+class ClassDiagramValidator:
+    """ Проверка корректности представления диаграммы классов (без проверки связей).
+    Проверка и построение IR идут одним проходом (diagram_check); после
+    validate() готовая модель доступна как self.model """
+
+    def __init__(self, data: Any):
+        self.data = data
+        self.model = None
+
+    def validate(self) -> None:
+        """ Проверяет корректность диаграммы классов; все ошибки — в одном DiagramValidationError """
+        self.model = check_class_diagram(self.data)
 
 
 class DatabaseDiagramValidator:
-    """Проверяет корректность представления диаграммы базы данных."""
+    """Проверяет корректность представления диаграммы базы данных.
+
+    После validate() доступны IR с нормализованными внешними ключами
+    (self.model) и индекс схемы (self.schema) для генератора.
+    """
 
     def __init__(self, diagram: dict):
         self.diagram = diagram
+        self.model = None
+        self.schema = None
 
     def validate(self) -> None:
-        """Запускает все проверки."""
-        if "tables" not in self.diagram:
-            raise ValueError("Диаграмма должна содержать ключ 'tables'.")
-
-        if not isinstance(self.diagram["tables"], list):
-            raise ValueError("'tables' должно быть списком.")
-
-        for table in self.diagram["tables"]:
-            self._validate_table(table)
-
-        # сделаем только базовую проверку существования ключа:
-        if "relationships" in self.diagram:
-            if not isinstance(self.diagram["relationships"], list):
-                raise ValueError("'relationships' должно быть списком.")
-
-    def _validate_table(self, table: dict) -> None:
-        """Проверяет корректность одной таблицы."""
-        if "name" not in table:
-            raise ValueError(f"Таблица должна иметь имя: {table}")
-
-        if "columns" not in table:
-            raise ValueError(f"Таблица {table['name']} должна содержать список 'columns'.")
-
-        if not isinstance(table["columns"], list):
-            raise ValueError(f"'columns' таблицы {table['name']} должно быть списком.")
-
-        for column in table["columns"]:
-            self._validate_column(column, table_name=table["name"])
-
-    def _validate_column(self, column: dict, table_name: str) -> None:
-        """Проверяет корректность одного столбца."""
-        if "name" not in column or "type" not in column:
-            raise ValueError(f"Каждый столбец в таблице {table_name} должен иметь 'name' и 'type'.")
-
-        if "foreign_key" in column:
-            foreign_key = column["foreign_key"]
-            # Accept None, dict, or string shorthand like "Table.column"
-            if foreign_key is None:
-                return
-            if isinstance(foreign_key, dict):
-                if "references" not in foreign_key or "column" not in foreign_key:
-                    raise ValueError(f"'foreign_key' в столбце {column['name']} таблицы {table_name} должен содержать 'references' и 'column'.")
-                return
-            if isinstance(foreign_key, str):
-                # try to parse formats like "Table.column" or "Table(column)" or "Table:column"
-                m = re.match(r"^(?P<table>[A-Za-z0-9_]+)[\.:(]?(?P<col>[A-Za-z0-9_]+)?\)?$", foreign_key.strip())
-                if m and m.group('col'):
-                    # normalize into dict for downstream code
-                    column["foreign_key"] = {"references": m.group('table'), "column": m.group('col')}
-                    return
-                raise ValueError(f"'foreign_key' в столбце {column['name']} таблицы {table_name} должен быть словарём или строкой 'Table.column'.")
-            raise ValueError(f"'foreign_key' в столбце {column['name']} таблицы {table_name} должен быть словарём, строкой или None.")
+        """Запускает все проверки за один проход."""
+        self.model, self.schema = check_database_diagram(self.diagram)
 
 
 class DockerComposeDiagramValidator:
@@ -159,42 +156,30 @@ class DockerComposeDiagramValidator:
 
     def __init__(self, diagram: dict):
         self.diagram = diagram
+        self.model = None
 
     def validate(self) -> None:
-        """Запускает все проверки."""
-        if "nodes" not in self.diagram:
-            raise ValueError("Диаграмма должна содержать ключ 'nodes'.")
-
-        if not isinstance(self.diagram["nodes"], list):
-            raise ValueError("'nodes' должно быть списком.")
-
-        if any("name" not in node for node in self.diagram["nodes"]):
-            raise ValueError("Каждый узел в 'nodes' должен иметь ключ 'name'.")
+        """Запускает все проверки за один проход."""
+        self.model = check_deployment_diagram(self.diagram)
 
-        node_names = {node["name"] for node in self.diagram["nodes"]}
 
-        if "connections" in self.diagram:
-            if not isinstance(self.diagram["connections"], list):
-                raise ValueError("'connections' должно быть списком.")
-            for connection in self.diagram["connections"]:
-                self._validate_connection(connection, node_names)
-
-    def _validate_connection(self, connection: dict, node_names: set) -> None:
-        """Проверяет корректность одного соединения."""
-        required_keys = {"from", "to", "label"}
-        if not required_keys.issubset(connection.keys()):
-            raise ValueError(f"Соединение должно содержать ключи {required_keys}: {connection}")
-
-        if connection["from"] not in node_names:
-            raise ValueError(f"Узел-источник '{connection['from']}' не найден в 'nodes'.")
-
-        if connection["to"] not in node_names:
-            raise ValueError(f"Узел-получатель '{connection['to']}' не найден в 'nodes'.")
+def report_output(output_file: Path, stats: RenderStats) -> None:
+    if not stats.written:
+        print(f"Сгенерированный файл не изменился: {output_file}")
+    elif stats.total:
+        print(f"Сгенерированный файл записан: {output_file} (перерисовано блоков: {stats.rendered} из {stats.total})")
+    else:
+        print(f"Сгенерированный файл записан: {output_file}")
 
 
 class Generator:
     """ Базовый класс генератора """
 
+    # Ключ контекста шаблона со списком блоков (класс, таблица, сервис) для инкрементальной генерации
+    UNITS: str = None
+    # IR, уже построенный валидатором; если задан, load_model не читает файл заново
+    model = None
+
     def __init__(self, file_path: str, template_file: str, output_file: str, language: str = None, validate_code: bool = True):
         self.file_path = Path(file_path)
         self.template_file = Path(template_file)
@@ -202,39 +187,95 @@ class Generator:
         self.language = language  # Новый параметр для понимания типа кода
         self.validate_code = validate_code  # Флаг для включения/выключения валидации
 
-    def load_json(self) -> Dict[str, Any]:
-        """ Загружает JSON-файл """
+    def load_json(self, stream: bool = False) -> Any:
+        """ Загружает JSON-файл.
+
+        С stream=True возвращает итератор пар (секция, элемент): файл читается
+        блоками, и в памяти не держится весь документ.
+        """
         if not self.file_path.exists():
             raise FileNotFoundError(f"Файл {self.file_path} не найден.")
 
+        if stream:
+            return self._iter_json()
+
         with self.file_path.open(encoding="utf-8") as file:
             try:
                 return json.load(file)
             except json.JSONDecodeError as e:
                 raise ValueError(f"Ошибка при разборе JSON: {e}")
 
-    def parse_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """ Должен быть реализован в подклассах """
-        raise NotImplementedError
-
-    def generate(self) -> None:
-        """ Генерирует код на основе данных и шаблона """
-        data = self.load_json()
-        parsed_data = self.parse_data(data)
-
-        if not self.template_file.exists():
-            raise FileNotFoundError(f"Шаблон не найден: {self.template_file}")
-
-        with self.template_file.open(encoding="utf-8") as file:
-            template_str = file.read()
-
-        template = Template(template_str)
-        output_content = template.render(parsed_data)
+    def _iter_json(self) -> Iterator[Tuple[str, Any]]:
+        with self.file_path.open(encoding="utf-8") as file:
+            try:
+                yield from StreamingJSONReader(file)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Ошибка при разборе JSON: {e}")
 
-        with self.output_file.open("w", encoding="utf-8") as file:
-            file.write(output_content)
+    def load_stream(self) -> Iterator[Tuple[str, Any]]:
+        """ Поток пар (секция, запись IR) из бинарной модели или JSON-файла """
+        if model_binary.is_binary_model(self.file_path):
+            with model_binary.open_model(self.file_path) as model:
+                yield from model.iter_records()
+        else:
+            for section, item in self.load_json(stream=True):
+                yield section, record_from_json(section, item)
+
+    def load_model(self):
+        """ Загружает модель: бинарный формат (model_binary) определяется по сигнатуре, иначе JSON """
+        if self.model is not None:
+            return self.model
+        if model_binary.is_binary_model(self.file_path):
+            return model_binary.load(self.file_path)
+        return as_model(self.load_json())
+
+    def parse_data(self, data: Any) -> Dict[str, Any]:
+        """ Должен быть реализован в подклассах; data — IR или его JSON-представление """
+        raise NotImplementedError
 
-        print(f"Сгенерированный файл записан: {self.output_file}")
+    def parse_stream(self, events: Iterable[Tuple[str, Any]]) -> Dict[str, Any]:
+        """ Контекст шаблона из потока записей. По умолчанию модель собирается
+        целиком; подклассы, чьим шаблонам достаточно одного прохода, переопределяют """
+        return self.parse_data(model_from_records(events))
+
+    def unit_args(self, unit: Any, parsed_data: Dict[str, Any]) -> Tuple:
+        """ Аргументы макроса unit шаблона — срез модели, от которого зависит текст блока """
+        return (unit,)
+
+    def write_output(self, parsed_data: Dict[str, Any], output_file: Path = None,
+                     incremental: bool = True) -> RenderStats:
+        """ Записывает результат, только если он изменился.
+
+        С incremental=True перерисовываются лишь блоки (unit), чей срез модели
+        изменился с прошлой генерации (см. incremental_output); иначе шаблон
+        выводится по частям (Template.generate), что подходит и для ленивого
+        контекста parse_stream.
+        """
+        output_file = output_file or self.output_file
+        template = get_template(self.template_file)
+        if incremental and self.UNITS is not None:
+            return render_incremental(template, parsed_data, self.UNITS, self.unit_args, output_file)
+        written = write_chunks_if_changed(output_file, template.generate(parsed_data))
+        return RenderStats(written, 0, 0)
+
+    def render(self, data: Any = None) -> bytes:
+        """ Артефакт в памяти (UTF-8), без записи файлов и проверки кода.
+        data — IR или его JSON-представление; по умолчанию — load_model() """
+        model = self.load_model() if data is None else data
+        template = get_template(self.template_file)
+        return "".join(template.generate(self.parse_data(model))).encode("utf-8")
+
+    def generate(self, stream: bool = False, incremental: bool = True) -> None:
+        """ Генерирует код на основе данных и шаблона.
+
+        С stream=True вход читается по элементам (load_stream / parse_stream),
+        а вывод идёт в файл по частям, без инкрементальной сборки.
+        """
+        if stream:
+            stats = self.write_output(self.parse_stream(self.load_stream()), incremental=False)
+        else:
+            stats = self.write_output(self.parse_data(self.load_model()), incremental=incremental)
+        report_output(self.output_file, stats)
 
         if self.validate_code:
             if self.language:
@@ -244,33 +285,41 @@ class Generator:
 
 class SQLGenerator(Generator):
     """ Генератор SQL-кода для Postgesql """
+    UNITS = "tables"
 
-    def parse_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """ Разбирает JSON-схему базы данных """
-        tables = data.get("tables", [])
-        parsed_data = {"tables": []}
-
-        for table in tables:
-            parsed_table = {
-                "name": table["name"],
-                "columns": []
-            }
+    # Индекс схемы от валидатора; если не задан, строится в parse_data
+    schema: SchemaIndex = None
 
-            for column in table.get("columns", []):
-                parsed_column = {
-                    "name": column["name"],
-                    "type": column["type"],
-                    "primary_key": column.get("primary_key", False),
-                    "auto_increment": column.get("auto_increment", False),
-                    "not_null": column.get("not_null", False),
-                    "foreign_key": column.get("foreign_key")
-                }
-                parsed_table["columns"].append(parsed_column)
+    def parse_data(self, data: Any) -> Dict[str, Any]:
+        """ Разбирает схему базы данных; колонки передаются в шаблон как записи IR без копирования """
+        model = as_model(data)
+        parsed_data = {"tables": []}
+        schema = self.schema if self.schema is not None else SchemaIndex(model.tables)
 
-            parsed_data["tables"].append(parsed_table)
+        for table in model.tables:
+            parsed_data["tables"].append(self._table_context(table, schema.foreign_keys.get(table.name, [])))
 
         return parsed_data
 
+    def parse_stream(self, events: Iterable[Tuple[str, Any]]) -> Dict[str, Any]:
+        """ Таблицы отдаются шаблону лениво, по одной: SQL-шаблоны обходят их один раз """
+        tables = (
+            self._table_context(table, [
+                ForeignKeyRef(column.name, column.foreign_key.references, column.foreign_key.column)
+                for column in table.columns if column.foreign_key
+            ])
+            for section, table in events if section == "tables"
+        )
+        return {"tables": tables}
+
+    @staticmethod
+    def _table_context(table, foreign_keys: List[ForeignKeyRef]) -> Dict[str, Any]:
+        return {
+            "name": table.name,
+            "columns": table.columns,
+            "foreign_keys": foreign_keys
+        }
+
 
 class MySQLGenerator(SQLGenerator):
     """ Генератор SQL-кода для MySQL """
@@ -286,109 +335,268 @@ class OracleSQLGenerator(SQLGenerator):
         super().__init__(file_path, "jinja_templates/oracle_template.jinja2", "generated_sql/oracle_db.sql")
 
 
+def _render_shard_batch(task: Tuple[str, List[Tuple]]) -> List[str]:
+    """ Задача пула процессов: рендер пачки файлов макросом shard шаблона """
+    template_file, batch = task
+    module = get_template(template_file).make_module()
+    return [str(module.shard(*args)) for args in batch]
+
+
+def render_shards(template_file: str, shard_args: List[Tuple], max_workers: int = None) -> List[str]:
+    """ Рендерит файлы пофайлового режима в ProcessPoolExecutor по числу CPU;
+    max_workers=1 — в текущем процессе """
+    workers = min(max_workers or os.cpu_count() or 1, len(shard_args) or 1)
+    if workers <= 1:
+        return _render_shard_batch((template_file, shard_args))
+
+    size = max(1, -(-len(shard_args) // (workers * 4)))
+    batches = [(template_file, shard_args[i:i + size]) for i in range(0, len(shard_args), size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [text for texts in pool.map(_render_shard_batch, batches) for text in texts]
+
+
+def order_parents_first(classes: List[Any], ancestors: Dict[str, Tuple[str, ...]]) -> List[Any]:
+    """ Порядок классов модели, в котором родитель стоит раньше потомков
+    (базовый класс должен быть определён до наследника); уже подходящий
+    порядок не меняется """
+    by_name = {cls.name: cls for cls in classes}
+    emitted = set()
+    ordered = []
+    for cls in classes:
+        for item in [by_name[name] for name in ancestors[cls.name]] + [cls]:
+            if id(item) not in emitted:
+                emitted.add(id(item))
+                ordered.append(item)
+    return ordered
+
+
+def add_inherited_attributes(classes: List[Dict[str, Any]]) -> None:
+    """ Дополняет контексты классов атрибутами для __init__:
+    inherited_attributes — атрибуты всех предков от корня (имя — один раз),
+    init_attributes — собственные атрибуты, не совпадающие по имени с унаследованными.
+    Списки родителя переиспользуются, поэтому родитель обрабатывается раньше потомков """
+    by_name = {cls["name"]: cls for cls in classes}
+    for cls in sorted(classes, key=lambda c: len(c["ancestors"])):
+        parent = by_name.get(cls["inherits"]) if cls["ancestors"] else None
+        inherited = parent["inherited_attributes"] + parent["init_attributes"] if parent else []
+        names = {name for name, _ in inherited}
+        cls["inherited_attributes"] = inherited
+        cls["init_attributes"] = [attr for attr in cls["attributes"] if attr[0] not in names]
+
+
 class PythonClassGenerator(Generator):
     """ Генератор Python-классов с типами """
+    UNITS = "classes"
+    # Пофайловый режим (generate_sharded): шаблон с макросами shard / index, расширение и имя индекса
+    SHARD_TEMPLATE = "jinja_templates/classes_python_sharded.jinja2"
+    SHARD_SUFFIX = ".py"
+    SHARD_INDEX = "__init__.py"
+
     def __init__(self, file_path: str, template_file: str, output_file: str, language: str, validate_code: bool = False):
         super().__init__(file_path, template_file, output_file, language, validate_code)
 
-    def map_type(self, type_name: str) -> str:
-        """ Сопоставление типов для Python """
-        type_mappings = {
+    # Таблица сопоставления типов языка; компилируется один раз и запоминает результаты
+    TYPE_MAPPER = TypeMapper(
+        scalars={
             "int": "int",
             "str": "str",
             "float": "float",
             "bool": "bool",
             "Any": "Any"
+        },
+        generics={
+            "List": "List[{0}]",
+            "Dict": "Dict[{0}, {1}]",
+            "Set": "Set[{0}]",
+            "Optional": "Optional[{0}]",
+            "Tuple": "Tuple[{args}]"
         }
-        if type_name.startswith("List["):
-            inner_type = type_name[5:-1]
-            return f"List[{self.map_type(inner_type)}]"
-        return type_mappings.get(type_name, type_name)
-
-    def parse_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """ Разбирает JSON-схему UML-диаграммы классов для Python """
-        classes = data.get("classes", [])
+    )
+
+    def map_type(self, type_name: str) -> str:
+        """ Сопоставление типов для языка генератора """
+        return self.TYPE_MAPPER(type_name)
+
+    def parse_data(self, data: Any) -> Dict[str, Any]:
+        """ Разбирает UML-диаграмму классов и сопоставляет типы целевого языка """
+        return self.map_types(self.normalize(data))
+
+    @staticmethod
+    def normalize(data: Any) -> Dict[str, Any]:
+        """ Контекст шаблона с исходными типами; не зависит от языка, поэтому
+        при генерации нескольких языков строится один раз """
+        model = as_model(data)
         parsed_data = {"classes": []}
+        ancestors, cycles = linearize_inheritance({cls.name: cls.inherits for cls in model.classes})
+        if cycles:
+            raise ValueError(inheritance_cycle_message(cycles[0]))
 
-        for cls in classes:
+        for cls in order_parents_first(model.classes, ancestors):
             methods = []
-            for method in cls.get("methods", []):
-                params = [(param["name"], self.map_type(param["type"])) for param in method.get("params", [])]
+            for method in cls.methods:
                 methods.append({
-                    "name": method["name"],
-                    "params": params,
-                    "return_type": self.map_type(method.get("return_type", "None"))
+                    "name": method.name,
+                    "params": [(param.name, param.type) for param in method.params],
+                    "return_type": method.return_type
                 })
 
             parsed_data["classes"].append({
-                "name": cls.get("name"),
-                "attributes": [(attr["name"], self.map_type(attr.get("type", "Any"))) for attr in cls.get("attributes", [])],
+                "name": cls.name,
+                "attributes": [(attr.name, attr.type) for attr in cls.attributes],
                 "methods": methods,
-                "inherits": cls.get("inherits", None)
+                "inherits": cls.inherits,
+                "ancestors": ancestors[cls.name]
             })
 
         return parsed_data
 
+    def shard_tasks(self, parsed_data: Dict[str, Any]) -> List[Tuple]:
+        """ Аргументы макроса shard по классам """
+        return [(cls,) for cls in parsed_data["classes"]]
+
+    def generate_sharded(self, output_dir: Union[str, Path] = None, max_workers: int = None) -> List[Path]:
+        """ Пофайловый режим: файл на класс и индексный файл.
+
+        Файлы рендерятся параллельно (render_shards) в output_dir (по
+        умолчанию — каталог <имя выходного файла>_<язык>) и
+        записываются, только если изменились. Проверка кода идёт по файлам,
+        так что компиляторы работают параллельно.
+        """
+        parsed_data = self.parse_data(self.load_model())
+        output_dir = Path(output_dir) if output_dir else self.output_file.with_name(f"{self.output_file.stem}_{self.language}")
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        classes = parsed_data["classes"]
+        texts = render_shards(self.SHARD_TEMPLATE, self.shard_tasks(parsed_data), max_workers)
+        files = [(output_dir / f"{cls['name']}{self.SHARD_SUFFIX}", text) for cls, text in zip(classes, texts)]
+        index = get_template(self.SHARD_TEMPLATE).make_module().index(classes)
+        files.append((output_dir / self.SHARD_INDEX, str(index)))
+
+        written = sum(write_if_changed(path, text) for path, text in files)
+        print(f"Сгенерировано файлов: {len(files)} (изменено: {written}) в {output_dir}")
+
+        if self.validate_code and self.language:
+            # печатаются только файлы с ошибками: файлов может быть тысячи
+            results = ENGINE.validate((self.language, path) for path, _ in files)
+            failed = [result for result in results if not result.ok]
+            for result in failed:
+                CodeValidator.report(result)
+                if result.status in ("unavailable", "unsupported"):
+                    break  # у всех файлов одна и та же причина
+            print(f"Проверено файлов: {len(results)}, с ошибками: {len(failed)}")
+        return [path for path, _ in files]
+
+    def map_types(self, normalized: Dict[str, Any]) -> Dict[str, Any]:
+        """ Копия нормализованного контекста с типами языка генератора """
+        map_type = self.map_type
+
+        mapped = {"classes": [
+            {
+                "name": cls["name"],
+                "attributes": [(name, map_type(tp)) for name, tp in cls["attributes"]],
+                "methods": [
+                    {
+                        "name": method["name"],
+                        "params": [(name, map_type(tp)) for name, tp in method["params"]],
+                        "return_type": map_type(method["return_type"])
+                    }
+                    for method in cls["methods"]
+                ],
+                "inherits": cls["inherits"],
+                "ancestors": cls["ancestors"]
+            }
+            for cls in normalized["classes"]
+        ]}
+        add_inherited_attributes(mapped["classes"])
+        return mapped
+
 
 class JavaClassGenerator(PythonClassGenerator):
     """ Генератор Java-классов """
-    def map_type(self, type_name: str) -> str:
-        """ Сопоставление типов Python -> Java """
-        type_mappings = {
+    SHARD_TEMPLATE = "jinja_templates/classes_java_sharded.jinja2"
+    SHARD_SUFFIX = ".java"
+    SHARD_INDEX = "Main.java"
+
+    TYPE_MAPPER = TypeMapper(
+        scalars={
             "int": "int",
             "str": "String",
             "float": "float",
             "bool": "boolean",
             "Any": "Object",
             "None": "void"  # ВАЖНО: исправляем None -> void
-        }
-        if type_name.startswith("List["):
-            inner_type = type_name[5:-1]
-            return f"List<{self.map_type(inner_type)}>"
-        return type_mappings.get(type_name, type_name)
-
-    def parse_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """ Разбирает и сопоставляет типы для Java """
-        parsed_data = super().parse_data(data)
-        for cls in parsed_data["classes"]:
-            cls["attributes"] = [(name, self.map_type(tp)) for name, tp in cls["attributes"]]
-            for method in cls["methods"]:
-                method["params"] = [(name, self.map_type(tp)) for name, tp in method["params"]]
-                method["return_type"] = self.map_type(method["return_type"])
-        return parsed_data
+        },
+        # аргументы обобщённых типов Java — только ссылочные типы
+        nested_scalars={
+            "int": "Integer",
+            "float": "Float",
+            "bool": "Boolean",
+            "None": "Void"
+        },
+        generics={
+            "List": "List<{0}>",
+            "Dict": "Map<{0}, {1}>",
+            "Set": "Set<{0}>",
+            "Optional": "Optional<{0}>",
+            "Tuple": "Object[]"
+        },
+        open="<", close=">"
+    )
+
+
+CPP_IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
 
 
 class CppClassGenerator(PythonClassGenerator):
     """ Генератор C++-классов """
+    SHARD_TEMPLATE = "jinja_templates/classes_cpp_sharded.jinja2"
+    SHARD_SUFFIX = ".hpp"
+    SHARD_INDEX = "classes.hpp"
 
-    def map_type(self, type_name: str) -> str:
-        """ Сопоставляет типы Python -> C++ """
-        type_mappings = {
+    def shard_tasks(self, parsed_data: Dict[str, Any]) -> List[Tuple]:
+        """ Заголовку класса нужны другие классы: для атрибутов (хранятся по
+        значению) — #include их заголовков, для методов — предварительные объявления """
+        names = {cls["name"] for cls in parsed_data["classes"]}
+
+        def referenced(types: Iterable[str]) -> set:
+            return {name for tp in types for name in CPP_IDENTIFIER.findall(tp)} & names
+
+        tasks = []
+        for cls in parsed_data["classes"]:
+            own = {cls["name"], cls["inherits"]}
+            includes = referenced(tp for _, tp in cls["attributes"]) - own
+            declared = referenced(
+                tp for method in cls["methods"] for tp in [method["return_type"], *(tp for _, tp in method["params"])]
+            ) - own - includes
+            tasks.append((cls, sorted(includes), sorted(declared)))
+        return tasks
+
+    TYPE_MAPPER = TypeMapper(
+        scalars={
             "int": "int",
             "str": "std::string",
             "float": "float",
             "bool": "bool",
             "Any": "auto",
             "None": "void"  # ВАЖНО: исправляем None -> void
-        }
-        if type_name.startswith("List["):
-            inner_type = type_name[5:-1]
-            return f"std::vector<{self.map_type(inner_type)}>"
-        return type_mappings.get(type_name, type_name)
-
-    def parse_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """ Разбирает и сопоставляет типы для C++ """
-        parsed_data = super().parse_data(data)
-        for cls in parsed_data["classes"]:
-            cls["attributes"] = [(name, self.map_type(tp)) for name, tp in cls["attributes"]]
-            for method in cls["methods"]:
-                method["params"] = [(name, self.map_type(tp)) for name, tp in method["params"]]
-                method["return_type"] = self.map_type(method["return_type"])
-        return parsed_data
+        },
+        nested_scalars={
+            "Any": "std::any"
+        },
+        generics={
+            "List": "std::vector<{0}>",
+            "Dict": "std::map<{0}, {1}>",
+            "Set": "std::set<{0}>",
+            "Optional": "std::optional<{0}>",
+            "Tuple": "std::tuple<{args}>"
+        },
+        open="<", close=">"
+    )
 
 
 class DockerComposeGenerator(Generator):
     """ Генератор docker-compose.yaml """
+    UNITS = "services"
 
     def sanitize_name(self, name: str) -> str:
         name = name.lower().replace(" ", "-")
@@ -396,19 +604,16 @@ class DockerComposeGenerator(Generator):
         name = re.sub(r'-+', '-', name)
         return name.strip("-")
 
-    def parse_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        nodes = data.get("nodes", [])
-        connections = data.get("connections", [])
+    def parse_data(self, data: Any) -> Dict[str, Any]:
+        model = as_model(data)
 
-        service_map = {node["name"]: {
-            "name": node["name"],
+        service_map = {node.name: {
+            "name": node.name,
             "depends_on": []
-        } for node in nodes}
+        } for node in model.nodes}
 
-        for conn in connections:
-            src = conn["from"]
-            dest = conn["to"]
-            service_map[dest]["depends_on"].append(src)
+        for conn in model.connections:
+            service_map[conn.target]["depends_on"].append(conn.source)
 
         parsed_services = []
         for svc in service_map.values():
@@ -422,7 +627,131 @@ class DockerComposeGenerator(Generator):
         return {"services": parsed_services}
 
 
-def detect_generator(file_path: str) -> Generator:
+# ============================================================
+#   ЦЕЛИ ГЕНЕРАЦИИ
+# ============================================================
+IN_MEMORY = "<in-memory>"
+
+# Цель -> фабрика генератора (file_path, validate_code)
+CLASS_TARGETS = {
+    "python": lambda file_path, validate_code=False: PythonClassGenerator(
+        file_path, "jinja_templates/classes_python.jinja2", "generated_code/classes.py",
+        language="python", validate_code=validate_code),
+    "java": lambda file_path, validate_code=False: JavaClassGenerator(
+        file_path, "jinja_templates/classes_java.jinja2", "generated_code/classes.java",
+        language="java", validate_code=validate_code),
+    "cpp": lambda file_path, validate_code=False: CppClassGenerator(
+        file_path, "jinja_templates/classes_cpp.jinja2", "generated_code/classes.cpp",
+        language="cpp", validate_code=validate_code),
+}
+DB_TARGETS = {
+    "postgresql": lambda file_path, validate_code=False: SQLGenerator(
+        file_path, "jinja_templates/postgresql_template.jinja2", "generated_sql/postgresql_db.sql"),
+    "mysql": lambda file_path, validate_code=False: MySQLGenerator(file_path),
+    "oracle": lambda file_path, validate_code=False: OracleSQLGenerator(file_path),
+}
+DEPLOYMENT_TARGETS = {
+    "docker-compose": lambda file_path, validate_code=False: DockerComposeGenerator(
+        file_path, "jinja_templates/docker_compose.jinja2", "generated_code/docker-compose.yaml"),
+}
+
+
+def _targets_for(data: Any):
+    """ (валидатор, таблица целей) для вида диаграммы """
+    keys = data.SECTIONS if isinstance(data, DIAGRAM_TYPES) else data
+    if "tables" in keys:
+        return DatabaseDiagramValidator(data), DB_TARGETS
+    if "classes" in keys:
+        return ClassDiagramValidator(data), CLASS_TARGETS
+    if "nodes" in keys and "connections" in keys:
+        return DockerComposeDiagramValidator(data), DEPLOYMENT_TARGETS
+    raise ValueError("Неизвестный формат данных для генерации")
+
+
+class MultiTargetGenerator:
+    """ Генерация одной модели сразу для нескольких целей.
+
+    Модель проверяется и нормализуется один раз; на каждую цель остаётся
+    только сопоставление типов (для классов) и рендеринг шаблона, которые
+    выполняются параллельно в пуле потоков.
+    """
+
+    def __init__(self, data: Any, targets: Iterable[str] = None, max_workers: int = None,
+                 validate_code: bool = False):
+        validator, available = _targets_for(data)
+        validator.validate()
+        self.model = validator.model
+
+        targets = list(targets) if targets else list(available)
+        unknown = [target for target in targets if target not in available]
+        if unknown:
+            raise ValueError(f"Неизвестные цели генерации: {', '.join(unknown)}. Доступны: {', '.join(available)}")
+
+        self.generators: Dict[str, Generator] = {
+            target: available[target](IN_MEMORY, validate_code) for target in targets
+        }
+        schema = getattr(validator, "schema", None)
+        for generator in self.generators.values():
+            if isinstance(generator, SQLGenerator):
+                generator.schema = schema
+        self.max_workers = max_workers or len(self.generators)
+        self._shared = None
+
+    def shared_context(self) -> Dict[str, Any]:
+        """ Языконезависимый контекст шаблонов, строится один раз """
+        if self._shared is None:
+            first = next(iter(self.generators.values()))
+            if isinstance(first, PythonClassGenerator):
+                self._shared = PythonClassGenerator.normalize(self.model)
+            else:
+                # SQL-контекст одинаков для всех диалектов, docker-compose — одна цель
+                self._shared = first.parse_data(self.model)
+        return self._shared
+
+    def context(self, target: str) -> Dict[str, Any]:
+        generator = self.generators[target]
+        if isinstance(generator, PythonClassGenerator):
+            return generator.map_types(self.shared_context())
+        return self.shared_context()
+
+    def _run(self, task) -> Dict[str, Any]:
+        self.shared_context()
+        # шаблоны компилируются заранее, чтобы потоки не компилировали один и тот же
+        for generator in self.generators.values():
+            get_template(generator.template_file)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {target: pool.submit(task, target) for target in self.generators}
+            return {target: future.result() for target, future in futures.items()}
+
+    def render(self) -> Dict[str, str]:
+        """ Тексты артефактов по целям """
+        def render_one(target: str) -> str:
+            template = get_template(self.generators[target].template_file)
+            return "".join(template.generate(self.context(target)))
+
+        return self._run(render_one)
+
+    def generate(self, output_dir: Union[str, Path] = None, incremental: bool = True) -> Dict[str, Path]:
+        """ Записывает артефакты всех целей (в output_dir или в пути генераторов по умолчанию);
+        incremental — как в Generator.write_output """
+        def generate_one(target: str) -> Tuple[Path, RenderStats]:
+            generator = self.generators[target]
+            output_file = Path(output_dir) / generator.output_file.name if output_dir else generator.output_file
+            return output_file, generator.write_output(self.context(target), output_file, incremental)
+
+        results = self._run(generate_one)
+        outputs = {target: output_file for target, (output_file, _) in results.items()}
+        for output_file, stats in results.values():
+            report_output(output_file, stats)
+        # все файлы проверяются за один проход: javac запускается один раз
+        CodeValidator.validate_many([
+            (self.generators[target].language, output_file) for target, output_file in outputs.items()
+            if self.generators[target].validate_code and self.generators[target].language
+        ])
+        return outputs
+
+
+def detect_generator(file_path: str) -> Union[Generator, MultiTargetGenerator]:
     """ Определяет, какой генератор использовать: SQL, Классы (Python/Java/Cpp) или Docker Compose """
     with open(file_path, encoding="utf-8") as file:
         data = json.load(file)
@@ -430,74 +759,61 @@ def detect_generator(file_path: str) -> Generator:
     if "tables" in data:
         validator = DatabaseDiagramValidator(data)
         validator.validate()
-        db_type = input("Выберите тип базы данных для генерации (postgresql/mysql/oracle): ").strip().lower()
-        if db_type == "postgresql":
-            return SQLGenerator(file_path, "jinja_templates/postgresql_template.jinja2", "generated_sql/postgresql_db.sql")
-        elif db_type == "mysql":
-            return MySQLGenerator(file_path)
-        elif db_type == "oracle":
-            return OracleSQLGenerator(file_path)
-        else:
+        db_type = input("Выберите тип базы данных для генерации (postgresql/mysql/oracle/all): ").strip().lower()
+        if db_type == "all":
+            return MultiTargetGenerator(validator.model)
+        if db_type not in DB_TARGETS:
             raise ValueError(f"Неизвестная база данных: {db_type}")
+        generator = DB_TARGETS[db_type](file_path)
+        generator.model, generator.schema = validator.model, validator.schema
+        return generator
     elif "classes" in data:
         validator = ClassDiagramValidator(data)
         validator.validate()
         validate_code_input = input("Хотите ли вы выполнить проверку сгенерированного кода? (y/n): ").strip().lower()
         validate_code = validate_code_input == "y"
-        language = input("Выберите язык генерации (python/java/cpp): ").strip().lower()
-        if language == "python":
-            return PythonClassGenerator(file_path, "jinja_templates/classes_python.jinja2", "generated_code/classes.py", language=language, validate_code=validate_code)
-        elif language == "java":
-            return JavaClassGenerator(file_path, "jinja_templates/classes_java.jinja2", "generated_code/classes.java", language=language, validate_code=validate_code)
-        elif language == "cpp":
-            return CppClassGenerator(file_path, "jinja_templates/classes_cpp.jinja2", "generated_code/classes.cpp", language=language, validate_code=validate_code)
-        else:
+        language = input("Выберите язык генерации (python/java/cpp/all): ").strip().lower()
+        if language == "all":
+            return MultiTargetGenerator(validator.model, validate_code=validate_code)
+        if language not in CLASS_TARGETS:
             raise ValueError(f"Неизвестный язык генерации: {language}")
+        generator = CLASS_TARGETS[language](file_path, validate_code)
+        generator.model = validator.model
+        return generator
     elif "nodes" in data and "connections" in data:
         validator = DockerComposeDiagramValidator(data)
         validator.validate()
-        return DockerComposeGenerator(file_path, "jinja_templates/docker_compose.jinja2", "generated_code/docker-compose.yaml")
+        generator = DEPLOYMENT_TARGETS["docker-compose"](file_path)
+        generator.model = validator.model
+        return generator
     else:
         raise ValueError("Неизвестный формат JSON. Ожидаются ключи 'tables', 'classes' или 'nodes'.")
 
 
-def detect_generator_from_data(data: dict, *, prefer_language: str = None, validate_code: bool = False, db_type: str = None) -> Generator:
-    """Non-interactive generator selector from parsed JSON data.
+def detect_generator_from_data(data: Any, *, prefer_language: str = None, validate_code: bool = False, db_type: str = None) -> Generator:
+    """Non-interactive generator selector from parsed JSON data or a model_ir diagram.
 
     prefer_language: for classes -> 'python'|'java'|'cpp'
     db_type: for database -> 'postgresql'|'mysql'|'oracle'
     """
-    if "tables" in data:
-        validator = DatabaseDiagramValidator(data)
-        validator.validate()
-        if db_type is None:
-            db_type = "postgresql"
-        if db_type == "postgresql":
-            return SQLGenerator("<in-memory>", "jinja_templates/postgresql_template.jinja2", "generated_sql/postgresql_db.sql")
-        elif db_type == "mysql":
-            return MySQLGenerator("<in-memory>")
-        elif db_type == "oracle":
-            return OracleSQLGenerator("<in-memory>")
-        else:
+    validator, targets = _targets_for(data)
+    validator.validate()
+    if targets is DB_TARGETS:
+        db_type = db_type or "postgresql"
+        if db_type not in DB_TARGETS:
             raise ValueError(f"Неизвестная база данных: {db_type}")
-    elif "classes" in data:
-        validator = ClassDiagramValidator(data)
-        validator.validate()
+        generator = DB_TARGETS[db_type](IN_MEMORY)
+        generator.schema = validator.schema
+    elif targets is CLASS_TARGETS:
         language = (prefer_language or "python").lower()
-        if language == "python":
-            return PythonClassGenerator("<in-memory>", "jinja_templates/classes_python.jinja2", "generated_code/classes.py", language=language, validate_code=validate_code)
-        elif language == "java":
-            return JavaClassGenerator("<in-memory>", "jinja_templates/classes_java.jinja2", "generated_code/classes.java", language=language, validate_code=validate_code)
-        elif language == "cpp":
-            return CppClassGenerator("<in-memory>", "jinja_templates/classes_cpp.jinja2", "generated_code/classes.cpp", language=language, validate_code=validate_code)
-        else:
+        if language not in CLASS_TARGETS:
             raise ValueError(f"Неизвестный язык генерации: {language}")
-    elif "nodes" in data and "connections" in data:
-        validator = DockerComposeDiagramValidator(data)
-        validator.validate()
-        return DockerComposeGenerator("<in-memory>", "jinja_templates/docker_compose.jinja2", "generated_code/docker-compose.yaml")
+        generator = CLASS_TARGETS[language](IN_MEMORY, validate_code)
     else:
-        raise ValueError("Неизвестный формат данных для генерации")
+        generator = DEPLOYMENT_TARGETS["docker-compose"](IN_MEMORY)
+    # модель уже проверена и нормализована: генератор не разбирает вход повторно
+    generator.model = validator.model
+    return generator
 
 
 if __name__ == "__main__":
@@ -0,0 +1,419 @@
+"""Компактный бинарный формат модели (IR из model_ir).
+
+Раскладка файла (все числа — little-endian uint32, секции выровнены по 4 байта):
+
+    заголовок     MAGIC (6 байт), версия формата (1 байт), тип диаграммы (1 байт)
+    строки        count, blob_len, offsets[count + 1], utf-8 blob (+ выравнивание)
+    секции        для каждой секции модели: count, nwords, offsets[count], words[nwords]
+
+Каждая запись — последовательность uint32: идентификаторы строк из общей
+таблицы (0 означает None, строки нумеруются с 1), счётчики и флаги.
+Смещения записей позволяют читать файл лениво через mmap: строка или
+запись декодируется только при первом обращении.
+"""
+import os
+import sys
+import mmap
+import json
+import struct
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Union
+
+from model_ir import (
+    Attribute, Method, ClassModel, Relationship, ClassDiagram,
+    Column, ForeignKey, Table, TableRelationship, DatabaseDiagram,
+    Node, Connection, DeploymentDiagram, as_model,
+)
+
+MAGIC = b"PUMLIR"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<6sBB")
+COUNTS = struct.Struct("<II")
+NONE = 0
+
+MODEL_FILENAME = "parsed.pumlir"
+
+KIND_BY_TYPE = {ClassDiagram: 1, DatabaseDiagram: 2, DeploymentDiagram: 3}
+TYPE_BY_KIND = {kind: model_type for model_type, kind in KIND_BY_TYPE.items()}
+
+# флаги колонки
+PK, AI, NN, FK = 1, 2, 4, 8
+
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+# ============================================================
+#   ЗАПИСЬ
+# ============================================================
+class _StringTable:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def __call__(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        sid = self.ids.get(value)
+        if sid is None:
+            self.strings.append(value)
+            sid = self.ids[value] = len(self.strings)
+        return sid
+
+
+def _encode_class(cls: ClassModel, out: array, sid: _StringTable) -> None:
+    out.extend((sid(cls.name), sid(cls.inherits), len(cls.attributes)))
+    for attr in cls.attributes:
+        out.extend((sid(attr.name), sid(attr.type)))
+    out.append(len(cls.methods))
+    for method in cls.methods:
+        out.extend((sid(method.name), sid(method.return_type), len(method.params)))
+        for param in method.params:
+            out.extend((sid(param.name), sid(param.type)))
+
+
+def _encode_relationship(rel: Relationship, out: array, sid: _StringTable) -> None:
+    out.extend((sid(rel.type), sid(rel.source), sid(rel.target), sid(rel.multiplicity)))
+
+
+def _encode_name(name: str, out: array, sid: _StringTable) -> None:
+    out.append(sid(name))
+
+
+def _encode_table(table: Table, out: array, sid: _StringTable) -> None:
+    out.extend((sid(table.name), len(table.columns)))
+    for column in table.columns:
+        flags = ((PK if column.primary_key else 0) | (AI if column.auto_increment else 0)
+                 | (NN if column.not_null else 0) | (FK if column.foreign_key else 0))
+        out.extend((sid(column.name), sid(column.type), flags))
+        if column.foreign_key:
+            out.extend((sid(column.foreign_key.references), sid(column.foreign_key.column)))
+
+
+def _encode_table_relationship(rel: TableRelationship, out: array, sid: _StringTable) -> None:
+    out.extend((sid(rel.type), sid(rel.source), sid(rel.target), sid(rel.on)))
+
+
+def _encode_node(node: Node, out: array, sid: _StringTable) -> None:
+    out.append(sid(node.name))
+
+
+def _encode_connection(conn: Connection, out: array, sid: _StringTable) -> None:
+    out.extend((sid(conn.source), sid(conn.target), sid(conn.label)))
+
+
+ENCODERS = {
+    ClassDiagram: (_encode_class, _encode_relationship, _encode_name),
+    DatabaseDiagram: (_encode_table, _encode_table_relationship),
+    DeploymentDiagram: (_encode_node, _encode_connection),
+}
+
+
+def _to_le(words: array) -> bytes:
+    if not _LITTLE_ENDIAN:
+        words = array("I", words)
+        words.byteswap()
+    return words.tobytes()
+
+
+def _pad(size: int) -> bytes:
+    return b"\0" * (-size % 4)
+
+
+def dumps(model: Any) -> bytes:
+    """Сериализует IR (или его JSON-представление) в бинарный формат"""
+    model = as_model(model)
+    model_type = type(model)
+    sid = _StringTable()
+
+    sections = []
+    for name, encode in zip(model_type.SECTIONS, ENCODERS[model_type]):
+        items = getattr(model, name)
+        offsets = array("I")
+        words = array("I")
+        for item in items:
+            offsets.append(len(words))
+            encode(item, words, sid)
+        sections.append((len(items), offsets, words))
+
+    blob = bytearray()
+    string_offsets = array("I", [0])
+    for value in sid.strings:
+        blob += value.encode("utf-8")
+        string_offsets.append(len(blob))
+
+    parts = [
+        HEADER.pack(MAGIC, FORMAT_VERSION, KIND_BY_TYPE[model_type]),
+        COUNTS.pack(len(sid.strings), len(blob)),
+        _to_le(string_offsets),
+        bytes(blob),
+        _pad(len(blob)),
+    ]
+    for count, offsets, words in sections:
+        parts.append(COUNTS.pack(count, len(words)))
+        parts.append(_to_le(offsets))
+        parts.append(_to_le(words))
+    return b"".join(parts)
+
+
+def dump(model: Any, path: Union[str, Path]) -> Path:
+    """Атомарно записывает модель в файл (через временный файл и os.replace)"""
+    path = Path(path)
+    data = dumps(model)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+
+# ============================================================
+#   ЧТЕНИЕ
+# ============================================================
+def _decode_class(words, pos: int, s) -> ClassModel:
+    name, inherits, count = words[pos], words[pos + 1], words[pos + 2]
+    pos += 3
+    attributes = []
+    for _ in range(count):
+        attributes.append(Attribute(s(words[pos]), s(words[pos + 1])))
+        pos += 2
+    methods = []
+    count = words[pos]
+    pos += 1
+    for _ in range(count):
+        method_name, return_type, param_count = words[pos], words[pos + 1], words[pos + 2]
+        pos += 3
+        params = []
+        for _ in range(param_count):
+            params.append(Attribute(s(words[pos]), s(words[pos + 1])))
+            pos += 2
+        methods.append(Method(s(method_name), s(return_type), params))
+    return ClassModel(s(name), attributes, methods, s(inherits))
+
+
+def _decode_relationship(words, pos: int, s) -> Relationship:
+    return Relationship(s(words[pos]), s(words[pos + 1]), s(words[pos + 2]), s(words[pos + 3]))
+
+
+def _decode_name(words, pos: int, s) -> str:
+    return s(words[pos])
+
+
+def _decode_table(words, pos: int, s) -> Table:
+    name, count = words[pos], words[pos + 1]
+    pos += 2
+    columns = []
+    for _ in range(count):
+        column_name, column_type, flags = words[pos], words[pos + 1], words[pos + 2]
+        pos += 3
+        fk = None
+        if flags & FK:
+            fk = ForeignKey(s(words[pos]), s(words[pos + 1]))
+            pos += 2
+        columns.append(Column(s(column_name), s(column_type), bool(flags & PK), bool(flags & AI),
+                              bool(flags & NN), fk))
+    return Table(s(name), columns)
+
+
+def _decode_table_relationship(words, pos: int, s) -> TableRelationship:
+    return TableRelationship(s(words[pos]), s(words[pos + 1]), s(words[pos + 2]), s(words[pos + 3]))
+
+
+def _decode_node(words, pos: int, s) -> Node:
+    return Node(s(words[pos]))
+
+
+def _decode_connection(words, pos: int, s) -> Connection:
+    return Connection(s(words[pos]), s(words[pos + 1]), s(words[pos + 2]))
+
+
+DECODERS = {
+    ClassDiagram: (_decode_class, _decode_relationship, _decode_name),
+    DatabaseDiagram: (_decode_table, _decode_table_relationship),
+    DeploymentDiagram: (_decode_node, _decode_connection),
+}
+
+
+class LazySection:
+    """Секция модели, записи которой декодируются при первом обращении"""
+
+    def __init__(self, model: "BinaryModel", decode, offsets, words):
+        self._model = model
+        self._decode = decode
+        self._offsets = offsets
+        self._words = words
+        self._items: Dict[int, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("индекс записи вне секции")
+        item = self._items.get(index)
+        if item is None:
+            item = self._items[index] = self._decode(self._words, self._offsets[index], self._model.string)
+        return item
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class BinaryModel:
+    """Ленивое представление бинарной модели поверх bytes или mmap"""
+
+    def __init__(self, buffer, source: Optional[mmap.mmap] = None):
+        self._source = source
+        self._views = []
+        view = self._view(memoryview(buffer))
+        if len(view) < HEADER.size:
+            raise ValueError("Файл модели повреждён: нет заголовка.")
+        magic, version, kind = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("Неизвестный формат файла модели.")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия формата модели: {version} (ожидается {FORMAT_VERSION}).")
+        if kind not in TYPE_BY_KIND:
+            raise ValueError(f"Неизвестный тип диаграммы в файле модели: {kind}.")
+        self.model_type = TYPE_BY_KIND[kind]
+
+        pos = HEADER.size
+        count, blob_len = COUNTS.unpack_from(view, pos)
+        pos += COUNTS.size
+        self._string_offsets = self._words(view, pos, count + 1)
+        pos += 4 * (count + 1)
+        self._blob = self._view(view[pos:pos + blob_len])
+        pos += blob_len + (-blob_len % 4)
+        self._string_count = count
+        self._strings: Dict[int, str] = {}
+
+        self.sections: Dict[str, LazySection] = {}
+        for name, decode in zip(self.model_type.SECTIONS, DECODERS[self.model_type]):
+            count, nwords = COUNTS.unpack_from(view, pos)
+            pos += COUNTS.size
+            offsets = self._words(view, pos, count)
+            pos += 4 * count
+            words = self._words(view, pos, nwords)
+            pos += 4 * nwords
+            self.sections[name] = LazySection(self, decode, offsets, words)
+
+    def _view(self, view: memoryview) -> memoryview:
+        self._views.append(view)
+        return view
+
+    def _words(self, view: memoryview, pos: int, count: int):
+        chunk = view[pos:pos + 4 * count]
+        if len(chunk) != 4 * count:
+            raise ValueError("Файл модели повреждён: секция обрезана.")
+        if _LITTLE_ENDIAN:
+            return self._view(self._view(chunk).cast("I"))
+        words = array("I", chunk.tobytes())
+        words.byteswap()
+        return words
+
+    def string(self, sid: int) -> Optional[str]:
+        if sid == NONE:
+            return None
+        value = self._strings.get(sid)
+        if value is None:
+            value = self._strings[sid] = self._read_string(sid)
+        return value
+
+    def _read_string(self, sid: int) -> Optional[str]:
+        if sid == NONE:
+            return None
+        return sys.intern(str(self._blob[self._string_offsets[sid - 1]:self._string_offsets[sid]], "utf-8"))
+
+    def __getattr__(self, name: str) -> LazySection:
+        sections = self.__dict__.get("sections", {})
+        if name in sections:
+            return sections[name]
+        raise AttributeError(name)
+
+    def to_model(self):
+        """Полностью декодирует модель в новые записи model_ir.
+
+        В отличие от поэлементного доступа, строки и слова секций сначала
+        переводятся в обычные списки, поэтому декодирование идёт без
+        обращений к memoryview на каждое поле.
+        """
+        strings = [None]
+        strings.extend(self.string(sid) for sid in range(1, self._string_count + 1))
+        s = strings.__getitem__
+        sections = []
+        for name in self.model_type.SECTIONS:
+            section = self.sections[name]
+            words = section._words.tolist()
+            sections.append([section._decode(words, pos, s) for pos in section._offsets.tolist()])
+        return self.model_type(*sections)
+
+    def iter_records(self):
+        """Пары (секция, запись) по порядку файла; ни записи, ни строки не
+        кешируются, так что память при обходе не растёт с размером модели"""
+        for name in self.model_type.SECTIONS:
+            section = self.sections[name]
+            for pos in section._offsets:
+                yield name, section._decode(section._words, pos, self._read_string)
+
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def loads(data: bytes):
+    """Декодирует бинарную модель из памяти в записи model_ir"""
+    return BinaryModel(data).to_model()
+
+
+def open_model(path: Union[str, Path]) -> BinaryModel:
+    """Открывает файл модели через mmap для ленивого чтения"""
+    with open(path, "rb") as f:
+        source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return BinaryModel(source, source)
+    except Exception:
+        source.close()
+        raise
+
+
+def load(path: Union[str, Path]):
+    """Читает файл модели целиком и возвращает записи model_ir"""
+    return loads(Path(path).read_bytes())
+
+
+def is_binary_model(path: Union[str, Path]) -> bool:
+    """Проверяет сигнатуру файла, не полагаясь на расширение"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def load_any(path: Union[str, Path]):
+    """Бинарная модель -> записи model_ir; иначе файл читается как JSON (словарь)"""
+    if is_binary_model(path):
+        return load(path)
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
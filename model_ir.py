@@ -0,0 +1,359 @@
+"""Компактное промежуточное представление (IR) разобранных диаграмм.
+
+Парсеры `puml2json` создают эти записи напрямую, генераторы `main`
+потребляют их. Записи — классы со __slots__ (без __dict__ на экземпляр),
+имена и типы интернируются через sys.intern. JSON остаётся форматом обмена:
+`to_json()` / `from_json()` преобразуют без потерь в привычные словари.
+"""
+import sys
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+intern = sys.intern
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return intern(value) if isinstance(value, str) else value
+
+
+class _Record:
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, f) == getattr(other, f) for f in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{f}={getattr(self, f)!r}" for f in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+# ============================================================
+#   ДИАГРАММА КЛАССОВ
+# ============================================================
+class Attribute(_Record):
+    """Атрибут класса или параметр метода"""
+    __slots__ = ("name", "type")
+
+    def __init__(self, name: str, type: str):
+        self.name = intern(name)
+        self.type = intern(type)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"name": self.name, "type": self.type}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Attribute":
+        return cls(data["name"], data.get("type", "Any"))
+
+
+class Method(_Record):
+    __slots__ = ("name", "return_type", "params")
+
+    def __init__(self, name: str, return_type: str, params: List[Attribute]):
+        self.name = intern(name)
+        self.return_type = intern(return_type)
+        self.params = params
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "return_type": self.return_type,
+            "params": [param.to_json() for param in self.params]
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Method":
+        return cls(
+            data["name"],
+            data.get("return_type", "None"),
+            [Attribute.from_json(param) for param in data.get("params", [])]
+        )
+
+
+class ClassModel(_Record):
+    __slots__ = ("name", "attributes", "methods", "inherits")
+
+    def __init__(self, name: str, attributes: List[Attribute] = None, methods: List[Method] = None,
+                 inherits: Optional[str] = None):
+        self.name = intern(name)
+        self.attributes = attributes if attributes is not None else []
+        self.methods = methods if methods is not None else []
+        self.inherits = _intern(inherits)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "attributes": [attr.to_json() for attr in self.attributes],
+            "methods": [method.to_json() for method in self.methods],
+            "inherits": self.inherits
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "ClassModel":
+        return cls(
+            data["name"],
+            [Attribute.from_json(attr) for attr in data.get("attributes", [])],
+            [Method.from_json(method) for method in data.get("methods", [])],
+            data.get("inherits")
+        )
+
+
+class Relationship(_Record):
+    """Связь между классами; source/target соответствуют ключам "from"/"to" в JSON"""
+    __slots__ = ("type", "source", "target", "multiplicity")
+
+    def __init__(self, type: str, source: str, target: str, multiplicity: str = "one-to-one"):
+        self.type = intern(type)
+        self.source = intern(source)
+        self.target = intern(target)
+        self.multiplicity = intern(multiplicity)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"type": self.type, "from": self.source, "to": self.target, "multiplicity": self.multiplicity}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Relationship":
+        return cls(data["type"], data["from"], data["to"], data.get("multiplicity", "one-to-one"))
+
+
+class ClassDiagram(_Record):
+    __slots__ = ("classes", "relationships", "unresolved")
+    SECTIONS = ("classes", "relationships", "unresolved")
+
+    def __init__(self, classes: List[ClassModel] = None, relationships: List[Relationship] = None,
+                 unresolved: List[str] = None):
+        self.classes = classes if classes is not None else []
+        self.relationships = relationships if relationships is not None else []
+        self.unresolved = unresolved if unresolved is not None else []
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "classes": [cls.to_json() for cls in self.classes],
+            "relationships": [rel.to_json() for rel in self.relationships],
+            "unresolved": list(self.unresolved)
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "ClassDiagram":
+        return cls(
+            [ClassModel.from_json(item) for item in data.get("classes", [])],
+            [Relationship.from_json(item) for item in data.get("relationships", [])],
+            [intern(name) for name in data.get("unresolved", [])]
+        )
+
+
+# ============================================================
+#   ДИАГРАММА БАЗЫ ДАННЫХ
+# ============================================================
+class ForeignKey(_Record):
+    __slots__ = ("references", "column")
+
+    def __init__(self, references: str, column: str):
+        self.references = intern(references)
+        self.column = intern(column)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"references": self.references, "column": self.column}
+
+    @classmethod
+    def from_json(cls, data: Any) -> Optional["ForeignKey"]:
+        if isinstance(data, dict):
+            return cls(data["references"], data["column"])
+        if isinstance(data, str) and "." in data:
+            # сокращённая запись "Table.column"
+            table, _, column = data.partition(".")
+            return cls(table.strip(), column.strip())
+        return None
+
+
+class Column(_Record):
+    __slots__ = ("name", "type", "primary_key", "auto_increment", "not_null", "foreign_key")
+
+    def __init__(self, name: str, type: str, primary_key: bool = False, auto_increment: bool = False,
+                 not_null: bool = False, foreign_key: Optional[ForeignKey] = None):
+        self.name = intern(name)
+        self.type = intern(type)
+        self.primary_key = primary_key
+        self.auto_increment = auto_increment
+        self.not_null = not_null
+        self.foreign_key = foreign_key
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "type": self.type,
+            "primary_key": self.primary_key,
+            "auto_increment": self.auto_increment,
+            "not_null": self.not_null,
+            "foreign_key": self.foreign_key.to_json() if self.foreign_key else None
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Column":
+        return cls(
+            data["name"],
+            data["type"],
+            data.get("primary_key", False),
+            data.get("auto_increment", False),
+            data.get("not_null", False),
+            ForeignKey.from_json(data.get("foreign_key"))
+        )
+
+
+class Table(_Record):
+    __slots__ = ("name", "columns")
+
+    def __init__(self, name: str, columns: List[Column] = None):
+        self.name = intern(name)
+        self.columns = columns if columns is not None else []
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"name": self.name, "columns": [column.to_json() for column in self.columns]}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Table":
+        return cls(data["name"], [Column.from_json(column) for column in data.get("columns", [])])
+
+
+class TableRelationship(_Record):
+    """Связь между таблицами; on — колонка целевой таблицы с внешним ключом"""
+    __slots__ = ("type", "source", "target", "on")
+
+    def __init__(self, type: str, source: str, target: str, on: Optional[str] = None):
+        self.type = intern(type)
+        self.source = intern(source)
+        self.target = intern(target)
+        self.on = _intern(on)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"type": self.type, "from": self.source, "to": self.target, "on": self.on}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "TableRelationship":
+        return cls(data["type"], data["from"], data["to"], data.get("on"))
+
+
+class DatabaseDiagram(_Record):
+    __slots__ = ("tables", "relationships")
+    SECTIONS = ("tables", "relationships")
+
+    def __init__(self, tables: List[Table] = None, relationships: List[TableRelationship] = None):
+        self.tables = tables if tables is not None else []
+        self.relationships = relationships if relationships is not None else []
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "tables": [table.to_json() for table in self.tables],
+            "relationships": [rel.to_json() for rel in self.relationships]
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "DatabaseDiagram":
+        return cls(
+            [Table.from_json(item) for item in data.get("tables", [])],
+            [TableRelationship.from_json(item) for item in data.get("relationships", [])]
+        )
+
+
+# ============================================================
+#   ДИАГРАММА РАЗВЕРТЫВАНИЯ
+# ============================================================
+class Node(_Record):
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = intern(name)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"name": self.name}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Node":
+        return cls(data["name"])
+
+
+class Connection(_Record):
+    __slots__ = ("source", "target", "label")
+
+    def __init__(self, source: str, target: str, label: str):
+        self.source = intern(source)
+        self.target = intern(target)
+        self.label = label
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"from": self.source, "to": self.target, "label": self.label}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Connection":
+        return cls(data["from"], data["to"], data.get("label", ""))
+
+
+class DeploymentDiagram(_Record):
+    __slots__ = ("nodes", "connections")
+    SECTIONS = ("nodes", "connections")
+
+    def __init__(self, nodes: List[Node] = None, connections: List[Connection] = None):
+        self.nodes = nodes if nodes is not None else []
+        self.connections = connections if connections is not None else []
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "nodes": [node.to_json() for node in self.nodes],
+            "connections": [conn.to_json() for conn in self.connections]
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "DeploymentDiagram":
+        return cls(
+            [Node.from_json(item) for item in data.get("nodes", [])],
+            [Connection.from_json(item) for item in data.get("connections", [])]
+        )
+
+
+DIAGRAM_TYPES = (ClassDiagram, DatabaseDiagram, DeploymentDiagram)
+
+
+def model_from_json(data: Dict[str, Any]):
+    """Определяет тип диаграммы по ключам JSON и строит IR"""
+    if "tables" in data:
+        return DatabaseDiagram.from_json(data)
+    if "classes" in data:
+        return ClassDiagram.from_json(data)
+    if "nodes" in data:
+        return DeploymentDiagram.from_json(data)
+    raise ValueError("Неизвестный формат данных: ожидаются ключи 'tables', 'classes' или 'nodes'.")
+
+
+SECTION_RECORDS = {"classes": ClassModel, "tables": Table, "nodes": Node, "connections": Connection}
+
+
+def record_from_json(section: str, data: Any) -> Any:
+    """Запись IR для элемента секции (для потокового чтения JSON по элементам)"""
+    if section == "relationships":
+        return (Relationship if "multiplicity" in data else TableRelationship).from_json(data)
+    if section == "unresolved":
+        return intern(data)
+    record = SECTION_RECORDS.get(section)
+    return record.from_json(data) if record else data
+
+
+def model_from_records(events: Iterable[Tuple[str, Any]]):
+    """Собирает диаграмму из потока пар (секция, запись IR)"""
+    sections: Dict[str, list] = {}
+    for section, item in events:
+        sections.setdefault(section, []).append(item)
+    for model_type in DIAGRAM_TYPES:
+        if model_type.SECTIONS[0] in sections:
+            return model_type(*[sections.get(name, []) for name in model_type.SECTIONS])
+    raise ValueError("Неизвестный формат данных: ожидаются ключи 'tables', 'classes' или 'nodes'.")
+
+
+def as_model(data: Any):
+    """Возвращает IR как есть или строит его из JSON-словаря"""
+    if isinstance(data, DIAGRAM_TYPES):
+        return data
+    return model_from_json(data)
+
+
+def to_json(item: Any) -> Any:
+    """JSON-представление записи IR (строки и словари возвращаются как есть)"""
+    return item.to_json() if isinstance(item, _Record) else item
@@ -4,6 +4,9 @@
 Usage:
   python plugin_runner.py --input input.json --diagram-type classes --languages python,java
 
+The input may also be a binary model file (model_binary, e.g. parsed.pumlir);
+the format is detected from the file signature.
+
 It will write outputs into `puml_server/storage/plugin_runs/<job_id>/` and print generated files to console.
 """
 import argparse
@@ -13,16 +16,20 @@ import traceback
 from pathlib import Path
 import shutil
 
+import model_binary
+
 ROOT = Path(__file__).resolve().parent
 STORAGE = ROOT / 'puml_server' / 'storage' / 'plugin_runs'
 STORAGE.mkdir(parents=True, exist_ok=True)
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--input', '-i', help='Path to generated JSON (or - for stdin)', required=True)
+    parser.add_argument('--input', '-i', help='Path to generated JSON or binary model (or - for JSON on stdin)', required=True)
     parser.add_argument('--diagram-type', '-t', choices=['classes','database','deployment'], help='Diagram type from plugin', required=True)
     parser.add_argument('--languages', '-l', help='Comma-separated languages (can be multiple). For classes: python,cpp,java. For DB: postgresql,mysql,oracle. For deployment: ignored', default='')
     parser.add_argument('--no-validate', action='store_true', help='Disable code validation')
+    parser.add_argument('--sharded', action='store_true', help='Classes only: emit one file per class plus an index file, rendered in parallel')
+    parser.add_argument('--stream', action='store_true', help='Read the input item by item and stream the rendered output (flat memory for large schemas)')
     args = parser.parse_args()
 
     try:
@@ -36,7 +43,7 @@ def main():
             if not input_path.exists():
                 print('Input file not found:', input_path)
                 return
-            data = json.loads(input_path.read_text(encoding='utf-8'))
+            data = model_binary.load_any(input_path)
 
         langs = [x.strip().lower() for x in args.languages.split(',') if x.strip()]
 
@@ -45,11 +52,11 @@ def main():
         job_dir = STORAGE / job_id
         job_dir.mkdir(parents=True)
         # copy input JSON
-        in_copy = job_dir / 'input.json'
+        in_copy = job_dir / ('input.json' if isinstance(data, dict) else model_binary.MODEL_FILENAME)
         shutil.copyfile(str(input_path), str(in_copy))
 
         # import generator helpers from main
-        from main import detect_generator_from_data
+        from main import detect_generator_from_data, MultiTargetGenerator
 
         results = []
 
@@ -64,33 +71,56 @@ def main():
             except Exception:
                 out_name = f'output_{uuid.uuid4().hex[:6]}.txt'
             gen.output_file = job_dir / out_name
+            if args.sharded and hasattr(gen, 'generate_sharded'):
+                print(f'Running sharded generator: {gen.__class__.__name__} -> {job_dir}')
+                files = gen.generate_sharded()
+                # the index file stands for the whole shard directory
+                results.append({'generator': gen.__class__.__name__, 'file': str(files[-1].parent),
+                                'content': files[-1].read_text(encoding='utf-8')})
+                return
             print(f'Running generator: {gen.__class__.__name__} -> {gen.output_file}')
-            gen.generate()
+            gen.generate(stream=args.stream, incremental=False)
             if gen.output_file.exists():
                 content = gen.output_file.read_text(encoding='utf-8')
             else:
                 content = ''
             results.append({'generator': gen.__class__.__name__, 'file': str(gen.output_file), 'content': content})
 
+        # Several targets: validate and normalize the model once, render concurrently
+        def run_targets(targets, run_one):
+            if args.stream or args.sharded or len(targets) < 2:
+                for t in targets:
+                    run_one(t)
+                return
+            multi = MultiTargetGenerator(data, targets=targets, validate_code=not args.no_validate)
+            print(f'Running generators: {", ".join(targets)} -> {job_dir}')
+            for t, out_file in multi.generate(job_dir, incremental=False).items():
+                results.append({'generator': multi.generators[t].__class__.__name__, 'file': str(out_file),
+                                'content': out_file.read_text(encoding='utf-8')})
+
         if args.diagram_type == 'deployment':
             run_for_language()
         elif args.diagram_type == 'classes':
             if not langs:
                 # default to python
                 langs = ['python']
+            valid = []
             for l in langs:
                 if l not in ('python','java','cpp'):
                     print('Skipping unknown classes language:', l)
                     continue
-                run_for_language(prefer_lang=l)
+                valid.append(l)
+            run_targets(valid, lambda l: run_for_language(prefer_lang=l))
         elif args.diagram_type == 'database':
             if not langs:
                 langs = ['postgresql']
+            valid = []
             for l in langs:
                 if l not in ('postgresql','mysql','oracle'):
                     print('Skipping unknown database type:', l)
                     continue
-                run_for_language(db_type=l)
+                valid.append(l)
+            run_targets(valid, lambda l: run_for_language(db_type=l))
 
         # write summary
         summary = {'job_id': job_id, 'generated': [{'generator': r['generator'], 'file': r['file']} for r in results]}
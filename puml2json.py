@@ -1,24 +1,213 @@
 import re
 import json
 import sys
-from typing import List, Dict, Any, Optional
+import tempfile
+import shutil
+from collections import deque
+from typing import List, Dict, Any, Optional, Iterable, Iterator, NamedTuple, Tuple
+
+from schema_index import SchemaIndex
+from model_ir import (
+    Attribute, Method, ClassModel, Relationship, ClassDiagram,
+    Column, ForeignKey, Table, TableRelationship, DatabaseDiagram,
+    Node, Connection, DeploymentDiagram, to_json,
+)
+
+# Версия формата результата парсеров: увеличивать при любом изменении вывода,
+# чтобы кэши разбора (puml_service) не отдавали устаревшие результаты
+PARSER_VERSION = "5"
+
+
+# ============================================================
+#   ЛЕКСЕР ДИАГРАММЫ КЛАССОВ
+# ============================================================
+TOKEN_CLASS = "class"
+TOKEN_OPEN = "open"
+TOKEN_CLOSE = "close"
+TOKEN_ATTRIBUTE = "attribute"
+TOKEN_METHOD = "method"
+TOKEN_RELATION = "relation"
+
+
+class Token(NamedTuple):
+    kind: str
+    line: int
+    value: Dict[str, Any]
+
+
+class PlantUMLLexer:
+    """Однопроходный лексер классовой диаграммы.
+
+    Каждая строка классифицируется независимо от соседних, поэтому время
+    работы линейно по размеру входа. Все шаблоны скомпилированы заранее и
+    не содержат вложенных квантификаторов: сложные части строки (параметры
+    методов, стороны связи) разбираются через find/partition, а не regex.
+    """
+
+    CLASS_RE = re.compile(r'class\s+(\w+)')
+    NAME_RE = re.compile(r'\w+')
+    # Порядок альтернатив важен: длинные стрелки проверяются раньше '--'
+    ARROW_RE = re.compile(r'<\|--|--\|>|\.\.>|(?<!\w)[o*]--|-->|<--|--')
+    SIDE_TOKEN_RE = re.compile(r'"([^"]*)"|([^\s"]+)')
+
+    SKIP_PREFIXES = ("'", '@startuml', '@enduml')
+    VISIBILITY = ('+', '-')
+
+    def tokenize(self, lines: Iterable[str]) -> Iterator[Token]:
+        """Превращает строки диаграммы в поток токенов"""
+        for line_no, line in enumerate(lines, 1):
+            yield from self.lex_line(line, line_no)
+
+    def lex_line(self, line: str, line_no: int = 0) -> List[Token]:
+        line = line.strip()
+        if not line or line.startswith(self.SKIP_PREFIXES):
+            return []
+
+        if line.startswith('class '):
+            return self._lex_class(line, line_no)
+        if line == '{':
+            return [Token(TOKEN_OPEN, line_no, {})]
+        if line == '}':
+            return [Token(TOKEN_CLOSE, line_no, {})]
+
+        if line[0] not in self.VISIBILITY and line[0] != '{':
+            arrow = self.ARROW_RE.search(line)
+            if arrow:
+                relation = self._lex_relation(line, arrow)
+                return [Token(TOKEN_RELATION, line_no, relation)] if relation else []
+            return []
+
+        return self._lex_member(line, line_no)
+
+    def _lex_class(self, line: str, line_no: int) -> List[Token]:
+        match = self.CLASS_RE.match(line)
+        if not match:
+            return []
+        tokens = [Token(TOKEN_CLASS, line_no, {"name": match.group(1)})]
+        rest = line[match.end():]
+        brace = rest.find('{')
+        if brace != -1:
+            tokens.append(Token(TOKEN_OPEN, line_no, {}))
+            if '}' in rest[brace + 1:]:
+                tokens.append(Token(TOKEN_CLOSE, line_no, {}))
+        return tokens
+
+    def _lex_member(self, line: str, line_no: int) -> List[Token]:
+        # Модификатор вида {field}/{method} отбрасывается
+        if line[0] == '{':
+            end = line.find('}')
+            if end == -1:
+                return []
+            line = line[end + 1:].lstrip()
+
+        closes = line.endswith('}')
+        line = line.rstrip('}').rstrip()
+        tokens = []
+
+        if line and line[0] in self.VISIBILITY:
+            member = self._lex_member_body(line[0], line[1:].lstrip(), line_no)
+            if member:
+                tokens.append(member)
+
+        if closes:
+            tokens.append(Token(TOKEN_CLOSE, line_no, {}))
+        return tokens
+
+    def _lex_member_body(self, visibility: str, body: str, line_no: int) -> Optional[Token]:
+        name_match = self.NAME_RE.match(body)
+        if not name_match:
+            return None
+        name = name_match.group(0)
+        rest = body[name_match.end():].lstrip()
+
+        if rest.startswith(':'):
+            data_type = rest[1:].strip()
+            if not data_type or '(' in data_type or ')' in data_type:
+                return None
+            return Token(TOKEN_ATTRIBUTE, line_no, {
+                "visibility": visibility,
+                "name": name,
+                "type": data_type
+            })
+
+        if rest.startswith('('):
+            close = rest.rfind(')')
+            if close == -1:
+                return None
+            tail = rest[close + 1:].lstrip()
+            if not tail.startswith(':'):
+                return None
+            return_type = tail[1:].strip()
+            if not return_type or '(' in return_type:
+                return None
+            return Token(TOKEN_METHOD, line_no, {
+                "visibility": visibility,
+                "name": name,
+                "params": rest[1:close],
+                "return_type": return_type
+            })
+
+        return None
+
+    def _lex_relation(self, line: str, arrow: re.Match) -> Optional[Dict[str, Any]]:
+        right_part = line[arrow.end():].partition(':')[0]
+        left_name, left_mult = self._lex_side(line[:arrow.start()], first=True)
+        right_name, right_mult = self._lex_side(right_part, first=False)
+        if not left_name or not right_name:
+            return None
+        return {
+            "arrow": arrow.group(0),
+            "left": left_name,
+            "right": right_name,
+            "left_multiplicity": left_mult,
+            "right_multiplicity": right_mult
+        }
+
+    def _lex_side(self, part: str, first: bool):
+        """Разбирает сторону связи: имя класса и (необязательная) кратность в кавычках"""
+        words = []
+        quoted = []
+        for match in self.SIDE_TOKEN_RE.finditer(part):
+            if match.group(2) is not None:
+                words.append(match.group(2))
+            else:
+                quoted.append(match.group(1).strip())
+
+        if words:
+            name = words[0] if first else words[-1]
+        elif quoted:
+            name = quoted.pop(0) if first else quoted.pop()
+        else:
+            return None, ""
+        return name, " ".join(quoted)
 
 
 # ============================================================
 #   ПАРСЕР ДИАГРАММИ КЛАССОВ (старый функционал)
 # ============================================================
 class PlantUMLParser:
+    RELATION_TYPES = {
+        '..>': "dependency",
+        'o--': "aggregation",
+        '*--': "composition",
+    }
+
+    SECTIONS = ClassDiagram.SECTIONS
+    MODEL = ClassDiagram
+
     def __init__(self):
         self.classes = []
         self.relationships = []
+        self.unresolved = []
         self.current_class = None
+        self.pending_inherits = {}
+        self.lexer = PlantUMLLexer()
 
     def parse_file(self, filename: str) -> Dict[str, Any]:
         """Чтение и парсинг файла"""
         try:
             with open(filename, 'r', encoding='utf-8') as file:
-                content = file.read()
-            return self.parse_content(content)
+                return self.parse_lines(file)
         except FileNotFoundError:
             print(f"Ошибка: Файл '{filename}' не найден.")
             sys.exit(1)
@@ -28,132 +217,154 @@ class PlantUMLParser:
 
     def parse_content(self, content: str) -> Dict[str, Any]:
         """Парсинг классовой диаграммы PlantUML"""
-        lines = content.split('\n')
-
-        for line in lines:
-            line = line.strip()
-
-            if not line or line.startswith("'") or line.startswith('@startuml') or line.startswith('@enduml'):
-                continue
+        return self.parse_lines(content.split('\n'))
+
+    def parse_lines(self, lines: Iterable[str]) -> Dict[str, Any]:
+        """Собирает результат потокового разбора в единый JSON"""
+        return self.parse_model(lines).to_json()
+
+    def parse_model(self, lines: Iterable[str]) -> ClassDiagram:
+        """Собирает результат потокового разбора в IR (см. model_ir)"""
+        for section, item in self.parse_stream(lines):
+            getattr(self, section).append(item)
+        self.resolve_inheritance()
+        return self.to_model()
+
+    def resolve_inheritance(self) -> None:
+        """Отложенный проход: наследование через индекс имя -> классы.
+
+        Линейно по числу классов и связей и не зависит от того, объявлена ли
+        связь до или после класса; при нескольких связях побеждает последняя.
+        """
+        index = {}
+        for cls in self.classes:
+            index.setdefault(cls.name, []).append(cls)
+        for rel in self.relationships:
+            if rel.type == "inheritance":
+                for cls in index.get(rel.source, ()):
+                    cls.inherits = rel.target
+
+    def collect_inheritance(self, lines: Iterable[str]) -> Dict[str, str]:
+        """Предварительный проход для потокового режима: потомок -> родитель"""
+        inherits = {}
+        for token in self.lexer.tokenize(lines):
+            if token.kind == TOKEN_RELATION:
+                arrow = token.value["arrow"]
+                if arrow == '<|--':
+                    inherits[token.value["right"]] = token.value["left"]
+                elif arrow == '--|>':
+                    inherits[token.value["left"]] = token.value["right"]
+        return inherits
+
+    def parse_stream(self, lines: Iterable[str], inherits: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, Any]]:
+        """Потоковый разбор: выдаёт пары ("classes" | "relationships" | "unresolved", элемент).
+
+        Класс выдаётся, как только закрыт его блок, поэтому память не растёт
+        с размером диаграммы. Без карты `inherits` (см. collect_inheritance)
+        наследование, объявленное после закрытия класса, попадает только в
+        "relationships". В конце выдаются имена, на которые ссылаются связи,
+        но которые не объявлены как классы.
+        """
+        return self.parse_token_stream(self.lexer.tokenize(lines), inherits)
+
+    def parse_token_stream(self, tokens: Iterable[Token], inherits: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, Any]]:
+        """То же, что parse_stream, но поверх уже полученных токенов лексера"""
+        self.current_class = None
+        self.pending_inherits = {}
+        declared = set()
+        referenced = {}   # упорядоченное множество имён из связей
+        for token in tokens:
+            kind = token.kind
+            if kind == TOKEN_CLASS:
+                if self.current_class:
+                    yield "classes", self._finish_class(inherits)
+                self.parse_class(token.value["name"])
+                declared.add(token.value["name"])
+            elif kind == TOKEN_CLOSE:
+                if self.current_class:
+                    yield "classes", self._finish_class(inherits)
+            elif kind == TOKEN_ATTRIBUTE:
+                self.parse_attribute(token.value)
+            elif kind == TOKEN_METHOD:
+                self.parse_method(token.value)
+            elif kind == TOKEN_RELATION:
+                relationship = self.parse_relationship(token.value)
+                referenced[relationship.source] = None
+                referenced[relationship.target] = None
+                yield "relationships", relationship
+        if self.current_class:
+            yield "classes", self._finish_class(inherits)
+        for name in referenced:
+            if name not in declared:
+                yield "unresolved", name
+
+    def _finish_class(self, inherits: Optional[Dict[str, str]]) -> ClassModel:
+        cls = self.current_class
+        self.current_class = None
+        if inherits and cls.name in inherits:
+            cls.inherits = inherits[cls.name]
+        return cls
 
-            if line.startswith('class '):
-                self.parse_class(line)
-            elif any(symbol in line for symbol in ['<|--', '--', 'o--', '*--', '..>']):
-                self.parse_relationship(line)
-            elif line.startswith('{') or (self.current_class and ('}' not in line)):
-                self.parse_class_content(line)
-
-        return self.to_json()
-
-    # --- Остальной код твоего классового парсера (без изменений) ---
-    def parse_class(self, line: str):
-        class_match = re.match(r'class\s+(\w+)\s*\{?', line)
-        if class_match:
-            class_name = class_match.group(1)
-            self.current_class = {
-                "name": class_name,
-                "attributes": [],
-                "methods": [],
-                "inherits": None
-            }
-            self.classes.append(self.current_class)
-
-    def parse_class_content(self, line: str):
-        if not self.current_class:
-            return
+    def parse_class(self, class_name: str):
+        self.current_class = ClassModel(class_name, inherits=self.pending_inherits.pop(class_name, None))
 
-        clean_line = re.sub(r'^\s*\{[^}]*\}\s*', '', line.strip())
-        clean_line = clean_line.rstrip('}')
+    def parse_attribute(self, value: Dict[str, Any]):
+        if self.current_class and value["visibility"] == '-':
+            self.current_class.attributes.append(Attribute(value["name"], value["type"]))
 
-        if not clean_line or clean_line == '}':
-            return
+    def parse_method(self, value: Dict[str, Any]):
+        if self.current_class and value["visibility"] == '+':
+            self.current_class.methods.append(
+                Method(value["name"], value["return_type"], self.parse_method_params(value["params"]))
+            )
 
-        attribute_match = re.match(r'^(-|\+)\s*(\w+)\s*:\s*([^()]+)$', clean_line)
-        if attribute_match:
-            visibility, name, data_type = attribute_match.groups()
-            if visibility == '-':
-                self.current_class["attributes"].append({
-                    "name": name.strip(),
-                    "type": data_type.strip()
-                })
-            return
-
-        method_match = re.match(r'^(\+|\-)\s*(\w+)\s*\((.*)\)\s*:\s*([^()]+)$', clean_line)
-        if method_match:
-            visibility, name, params_str, return_type = method_match.groups()
-            if visibility == '+':
-                params = self.parse_method_params(params_str)
-                self.current_class["methods"].append({
-                    "name": name.strip(),
-                    "return_type": return_type.strip(),
-                    "params": params
-                })
-
-    def parse_method_params(self, params_str: str) -> List[Dict[str, str]]:
+    def parse_method_params(self, params_str: str) -> List[Attribute]:
         params = []
         if not params_str.strip():
             return params
 
-        for param in params_str.split(','):
+        for param in self._split_params(params_str):
             param = param.strip()
             if ':' in param:
                 name, param_type = param.split(':', 1)
-                params.append({"name": name.strip(), "type": param_type.strip()})
+                params.append(Attribute(name.strip(), param_type.strip()))
         return params
 
-    def parse_relationship(self, line: str):
-        relationship_type = None
-        multiplicity = "one-to-one"
-
-        if '<|--' in line:
-            relationship_type = "inheritance"
-            parts = line.split('<|--')
-            if len(parts) == 2:
-                parent = self.clean_class_name(parts[0].strip())
-                child = self.clean_class_name(parts[1].strip())
-                for cls in self.classes:
-                    if cls["name"] == child:
-                        cls["inherits"] = parent
-                self.relationships.append({
-                    "type": relationship_type,
-                    "from": child,
-                    "to": parent,
-                    "multiplicity": multiplicity
-                })
-            return
-
-        if '..>' in line:
-            relationship_type = "dependency"
-            line = line.replace('..>', '--')
-        elif 'o--' in line:
-            relationship_type = "aggregation"
-            line = line.replace('o--', '--')
-        elif '*--' in line:
-            relationship_type = "composition"
-            line = line.replace('*--', '--')
-        else:
-            relationship_type = "association"
-
-        pattern = r'\"([^\"]*)\"?\s*--\s*\"([^\"]*)\"?'
-        match = re.search(pattern, line)
-
-        if match:
-            left_part, right_part = match.groups()
-            left_class = self.extract_class_name(left_part)
-            right_class = self.extract_class_name(right_part)
-            multiplicity = self.determine_multiplicity(left_part, right_part)
-            self.relationships.append({
-                "type": relationship_type,
-                "from": left_class,
-                "to": right_class,
-                "multiplicity": multiplicity
-            })
-
-    def clean_class_name(self, class_name: str) -> str:
-        return re.sub(r'[\"0-9.*]', '', class_name).strip()
+    @staticmethod
+    def _split_params(params_str: str) -> List[str]:
+        """ Делит список параметров по запятым верхнего уровня (не внутри [] и <>) """
+        parts, depth, start = [], 0, 0
+        for i, ch in enumerate(params_str):
+            if ch in '[<':
+                depth += 1
+            elif ch in ']>':
+                depth -= 1
+            elif ch == ',' and depth == 0:
+                parts.append(params_str[start:i])
+                start = i + 1
+        parts.append(params_str[start:])
+        return parts
+
+    def parse_relationship(self, value: Dict[str, Any]) -> Relationship:
+        arrow = value["arrow"]
+
+        if arrow in ('<|--', '--|>'):
+            if arrow == '<|--':
+                parent, child = value["left"], value["right"]
+            else:
+                child, parent = value["left"], value["right"]
+            if self.current_class and self.current_class.name == child:
+                self.current_class.inherits = parent
+            else:
+                self.pending_inherits[child] = parent
+            return Relationship("inheritance", child, parent, "one-to-one")
 
-    def extract_class_name(self, part: str) -> str:
-        return re.sub(r'[\"0-9.*]', '', part).strip()
+        return Relationship(
+            self.RELATION_TYPES.get(arrow, "association"),
+            value["left"],
+            value["right"],
+            self.determine_multiplicity(value["left_multiplicity"], value["right_multiplicity"])
+        )
 
     def determine_multiplicity(self, left: str, right: str) -> str:
         left_mult = self.parse_multiplicity(left)
@@ -169,16 +380,16 @@ class PlantUMLParser:
             return "many-to-many"
 
     def parse_multiplicity(self, part: str) -> str:
-        if '0..*' in part or '1..*' in part or '*' in part:
+        if '*' in part:
             return "many"
         else:
             return "one"
 
+    def to_model(self) -> ClassDiagram:
+        return ClassDiagram(self.classes, self.relationships, self.unresolved)
+
     def to_json(self) -> Dict[str, Any]:
-        return {
-            "classes": self.classes,
-            "relationships": self.relationships
-        }
+        return self.to_model().to_json()
 
 
 # ============================================================
@@ -187,142 +398,182 @@ class PlantUMLParser:
 class DeploymentDiagramParser:
     """Парсер диаграммы развертывания."""
 
-    NODE_PATTERN = r'node\s+"([^"]+)"'
-    CONNECTION_PATTERN = r'"([^"]+)"\s*-->\s*"([^"]+)"\s*:\s*(.+)'
+    NODE_PATTERN = re.compile(r'node\s+"([^"]+)"')
+    CONNECTION_PATTERN = re.compile(r'"([^"]+)"\s*-->\s*"([^"]+)"\s*:\s*(.+)')
+    SECTIONS = DeploymentDiagram.SECTIONS
+    MODEL = DeploymentDiagram
 
     def parse(self, content: str) -> Dict[str, Any]:
-        nodes = []
+        return self.parse_lines(content.split('\n'))
+
+    def parse_lines(self, lines: Iterable[str]) -> Dict[str, Any]:
+        return self.parse_model(lines).to_json()
+
+    def parse_model(self, lines: Iterable[str]) -> DeploymentDiagram:
+        model = self.MODEL()
+        for section, item in self.parse_stream(lines):
+            getattr(model, section).append(item)
+        return model
+
+    def parse_stream(self, lines: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+        """Потоковый разбор: выдаёт пары ("nodes" | "connections", запись IR)"""
         node_set = set()
-        connections = []
-
-        for match in re.finditer(self.NODE_PATTERN, content):
-            name = match.group(1).strip()
-            if name not in node_set:
-                node_set.add(name)
-                nodes.append({"name": name})
-
-        for match in re.finditer(self.CONNECTION_PATTERN, content):
-            src = match.group(1).strip()
-            dst = match.group(2).strip()
-            label = match.group(3).strip()
-
-            connections.append({
-                "from": src,
-                "to": dst,
-                "label": label
-            })
 
-        return {
-            "nodes": nodes,
-            "connections": connections
-        }
+        for line in lines:
+            for match in self.NODE_PATTERN.finditer(line):
+                name = match.group(1).strip()
+                if name not in node_set:
+                    node_set.add(name)
+                    yield "nodes", Node(name)
+
+            for match in self.CONNECTION_PATTERN.finditer(line):
+                yield "connections", Connection(
+                    match.group(1).strip(),
+                    match.group(2).strip(),
+                    match.group(3).strip()
+                )
 
 
 # ============================================================
 #   НОВЫЙ ФУНКЦИОНАЛ: ПАРСЕР DATABASE DIAGRAM
 # ============================================================
 class DatabaseDiagramParser:
-    ENTITY_PATTERN = r'entity\s+"?(\w+)"?\s*\{([^}]*)\}'
-    COLUMN_PATTERN = r'\+(\w+)\s*:\s*([\w()0-9,]+)(.*?)$'
-    REL_PATTERN = r'"?([A-Za-z_][A-Za-z0-9_]*)"?\s*(\|\|--\|\||\|\|--o\{|\}o--\|\||\}o--o\{)\s*"?([A-Za-z_][A-Za-z0-9_]*)"?'
+    ENTITY_PATTERN = re.compile(r'entity\s+"?(\w+)"?\s*(\{)?')
+    COLUMN_PATTERN = re.compile(r'\+(\w+)\s*:\s*([\w()0-9,]+)(.*?)$')
+    FK_PATTERN = re.compile(r'<<FK=(\w+)\.(\w+)>>')
+    REL_PATTERN = re.compile(r'"?([A-Za-z_][A-Za-z0-9_]*)"?\s*(\|\|--\|\||\|\|--o\{|\}o--\|\||\}o--o\{)\s*"?([A-Za-z_][A-Za-z0-9_]*)"?')
+    REL_TYPES = {
+        "||--||": "one-to-one",
+        "||--o{": "one-to-many",
+        "}o--||": "many-to-one",
+        "}o--o{": "many-to-many",
+    }
+    SECTIONS = DatabaseDiagram.SECTIONS
+    MODEL = DatabaseDiagram
+
+    def __init__(self):
+        self.schema = SchemaIndex(store_columns=False)
 
     def parse(self, content: str) -> Dict[str, Any]:
-        tables = []
-        table_map = {}   # name -> table dict
-        relationships = []
-
-        # ===============================
-        # 1) Парсим таблицы и их колонки
-        # ===============================
-        for match in re.finditer(self.ENTITY_PATTERN, content, re.DOTALL):
-            table_name = match.group(1)
-            raw_columns = match.group(2).strip().split("\n")
-
-            table = {
-                "name": table_name,
-                "columns": []
-            }
-
-            for col in raw_columns:
-                col = col.strip()
-                if not col.startswith("+"):
-                    continue
+        return self.parse_lines(content.split('\n'))
 
-                col_match = re.match(self.COLUMN_PATTERN, col)
-                if not col_match:
-                    continue
+    def parse_lines(self, lines: Iterable[str]) -> Dict[str, Any]:
+        return self.parse_model(lines).to_json()
 
-                name = col_match.group(1)
-                dtype = col_match.group(2)
-                annotations = col_match.group(3)
-
-                pk = "<<PK>>" in annotations
-                nn = "<<NN>>" in annotations
-                ai = "<<AI>>" in annotations
-
-                fk = None
-                fk_match = re.search(r'<<FK=(\w+)\.(\w+)>>', annotations)
-                if fk_match:
-                    fk = {
-                        "references": fk_match.group(1),
-                        "column": fk_match.group(2)
-                    }
-
-                table["columns"].append({
-                    "name": name,
-                    "type": dtype,
-                    "primary_key": pk,
-                    "auto_increment": ai,
-                    "not_null": nn,
-                    "foreign_key": fk
-                })
-
-            tables.append(table)
-            table_map[table_name] = table
-
-        # ===============================
-        # 2) Парсим отношения (без колонок)
-        # ===============================
-        for match in re.finditer(self.REL_PATTERN, content):
-            left = match.group(1)
-            symbol = match.group(2)
-            right = match.group(3)
-
-            if symbol == "||--||":
-                rel_type = "one-to-one"
-            elif symbol == "||--o{":
-                rel_type = "one-to-many"
-            elif symbol == "}o--||":
-                rel_type = "many-to-one"
-            elif symbol == "}o--o{":
-                rel_type = "many-to-many"
-            else:
-                rel_type = "unknown"
-
-            # ===============================
-            # 3) Автоматический поиск "on"
-            # ===============================
-            on_column = None
-            target_table = table_map.get(right)
-
-            if target_table:
-                for col in target_table["columns"]:
-                    fk = col.get("foreign_key")
-                    if fk and fk["references"] == left:
-                        on_column = col["name"]
-                        break
-
-            relationships.append({
-                "type": rel_type,
-                "from": left,
-                "to": right,
-                "on": on_column
-            })
+    def parse_model(self, lines: Iterable[str]) -> DatabaseDiagram:
+        model = self.MODEL()
+        for section, item in self.parse_stream(lines):
+            getattr(model, section).append(item)
+        return model
 
-        return {
-            "tables": tables,
-            "relationships": relationships
-        }
+    def collect_entities(self, lines: Iterable[str]) -> Dict[str, int]:
+        """Предварительный проход для потокового режима: сущность -> число объявлений"""
+        entities = {}
+        for line in lines:
+            entity_match = self.ENTITY_PATTERN.match(line.strip())
+            if entity_match:
+                entities[entity_match.group(1)] = entities.get(entity_match.group(1), 0) + 1
+        return entities
+
+    def parse_stream(self, lines: Iterable[str], entities: Optional[Dict[str, int]] = None) -> Iterator[Tuple[str, Any]]:
+        """Потоковый разбор: выдаёт пары ("tables" | "relationships", запись IR).
+
+        Таблица выдаётся при закрытии блока entity. Между таблицами хранится
+        только облегчённый SchemaIndex (имена и рёбра внешних ключей), нужный
+        для поиска "on"; после разбора он доступен как self.schema. Как и при
+        полном разборе, "on" ищется по последнему объявлению целевой таблицы,
+        поэтому связь ждёт в очереди (с сохранением порядка связей), пока оно
+        не закрыто. Без карты `entities` (см. collect_entities) это известно
+        только в конце входа, и все связи выдаются после таблиц.
+        """
+        schema = self.schema = SchemaIndex(store_columns=False)
+        pending = deque()
+        declared = {}
+        table = None
+        awaiting_body = None
+
+        def ready(relationship: TableRelationship) -> bool:
+            target = relationship.target
+            return entities is not None and declared.get(target, 0) >= entities.get(target, 0)
+
+        for line in lines:
+            line = line.strip()
+
+            if table is None and awaiting_body is not None and line:
+                if line.startswith('{'):
+                    table = Table(awaiting_body)
+                    line = line[1:]
+                awaiting_body = None
+
+            if table is None:
+                entity_match = self.ENTITY_PATTERN.match(line)
+                if not entity_match:
+                    for match in self.REL_PATTERN.finditer(line):
+                        relationship = TableRelationship(
+                            self.REL_TYPES.get(match.group(2), "unknown"),
+                            match.group(1),
+                            match.group(3)
+                        )
+                        if pending or not ready(relationship):
+                            pending.append(relationship)
+                        else:
+                            yield "relationships", self.resolve_on(relationship, schema)
+                    continue
+                if not entity_match.group(2):
+                    awaiting_body = entity_match.group(1)
+                    continue
+                table = Table(entity_match.group(1))
+                line = line[entity_match.end():]
+
+            # Тело таблицы: строка до '}' может содержать колонку
+            body, closed, _ = line.partition('}')
+            column = self.parse_column(body.strip())
+            if column:
+                table.columns.append(column)
+            if closed:
+                schema.add_table(table)
+                declared[table.name] = declared.get(table.name, 0) + 1
+                yield "tables", table
+                table = None
+                while pending and ready(pending[0]):
+                    yield "relationships", self.resolve_on(pending.popleft(), schema)
+
+        while pending:
+            yield "relationships", self.resolve_on(pending.popleft(), schema)
+
+    def parse_column(self, col: str) -> Optional[Column]:
+        if not col.startswith("+"):
+            return None
+
+        col_match = self.COLUMN_PATTERN.match(col)
+        if not col_match:
+            return None
+
+        annotations = col_match.group(3)
+
+        fk = None
+        fk_match = self.FK_PATTERN.search(annotations)
+        if fk_match:
+            fk = ForeignKey(fk_match.group(1), fk_match.group(2))
+
+        return Column(
+            col_match.group(1),
+            col_match.group(2),
+            primary_key="<<PK>>" in annotations,
+            auto_increment="<<AI>>" in annotations,
+            not_null="<<NN>>" in annotations,
+            foreign_key=fk
+        )
+
+    @staticmethod
+    def resolve_on(relationship: TableRelationship, schema: SchemaIndex) -> TableRelationship:
+        """Автоматический поиск "on": колонка целевой таблицы, ссылающаяся на исходную.
+
+        `schema` должен содержать таблицы в порядке объявления: повторное
+        объявление заменяет предыдущее (SchemaIndex.add_table).
+        """
+        relationship.on = schema.on_column(relationship.source, relationship.target)
+        return relationship
 
 
 # ============================================================
@@ -337,19 +588,166 @@ def save_to_json(data: Dict[str, Any], filename: str):
         print(f"❌ Ошибка сохранения: {e}")
 
 
+class StreamingJSONWriter:
+    """Инкрементальная запись JSON вида {"секция": [...], ...}.
+
+    Элементы первой секции сразу пишутся в файл, остальные копятся во
+    временных файлах и дописываются при закрытии, так что память не зависит
+    от числа элементов. Результат совпадает с json.dump(..., indent=2).
+    """
+
+    def __init__(self, file, sections: Iterable[str]):
+        self.file = file
+        self.sections = list(sections)
+        self.counts = {section: 0 for section in self.sections}
+        self.spools = {section: tempfile.TemporaryFile('w+', encoding='utf-8') for section in self.sections[1:]}
+        self.file.write('{\n  ' + json.dumps(self.sections[0]) + ': [')
+
+    def write(self, section: str, item: Any) -> None:
+        out = self.spools.get(section, self.file)
+        out.write(',\n    ' if self.counts[section] else '\n    ')
+        out.write(json.dumps(to_json(item), indent=2, ensure_ascii=False).replace('\n', '\n    '))
+        self.counts[section] += 1
+
+    def write_stream(self, events: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        for section, item in events:
+            self.write(section, item)
+
+    def close(self) -> None:
+        for index, section in enumerate(self.sections):
+            if index:
+                self.file.write(',\n  ' + json.dumps(section) + ': [')
+                spool = self.spools.pop(section)
+                spool.seek(0)
+                shutil.copyfileobj(spool, self.file)
+                spool.close()
+            self.file.write('\n  ]' if self.counts[section] else ']')
+        self.file.write('\n}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        for spool in self.spools.values():
+            spool.close()
+
+
+class StreamingJSONReader:
+    """Инкрементальное чтение JSON вида {"секция": [...], ...} — пара к StreamingJSONWriter.
+
+    Файл читается блоками по chunk_size символов, элементы массивов
+    декодируются по одному через JSONDecoder.raw_decode, поэтому в памяти
+    держится только текущий элемент и недочитанный хвост блока.
+    """
+
+    def __init__(self, file, chunk_size: int = 64 * 1024):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Неожиданный конец JSON.")
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if char not in chars:
+            raise ValueError(f"Ошибка при разборе JSON: ожидается один из {chars!r}, получено {char!r}.")
+        self.pos += 1
+        return char
+
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # число на границе блока могло оборваться: дочитываем и пробуем снова
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        """Выдаёт пары (секция, элемент); значение-не-массив выдаётся целиком"""
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if self._peek() == '[':
+                self.pos += 1
+                if self._peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self._value()
+                        if self._expect(',]') == ']':
+                            break
+            else:
+                yield key, self._value()
+            if self._expect(',}') == '}':
+                return
+
+
+def save_stream_to_json(events: Iterable[Tuple[str, Dict[str, Any]]], sections: Iterable[str], filename: str):
+    try:
+        with open(filename, 'w', encoding='utf-8') as f, StreamingJSONWriter(f, sections) as writer:
+            writer.write_stream(events)
+        print(f"✅ Сохранено в {filename}")
+    except Exception as e:
+        print(f"❌ Ошибка сохранения: {e}")
+
+
 def detect_diagram_type(text: str) -> str:
     """Определяет тип диаграммы."""
+    return detect_diagram_type_lines((text,))
+
+
+def detect_diagram_type_lines(lines: Iterable[str]) -> str:
+    """Определяет тип диаграммы по потоку строк, не держа весь текст в памяти."""
+    has_entity = has_db_marker = has_deployment = has_class = False
+    for line in lines:
+        has_entity = has_entity or "entity " in line
+        has_db_marker = has_db_marker or "||--" in line or "<<PK>>" in line or "<<FK=" in line
+        has_deployment = has_deployment or "node " in line or "-->" in line
+        has_class = has_class or "class " in line
 
     # Database diagram
-    if "entity " in text and ("||--" in text or "<<PK>>" in text or "<<FK=" in text):
+    if has_entity and has_db_marker:
         return "database"
 
     # Deployment diagram
-    if "node " in text or "-->" in text:
+    if has_deployment:
         return "deployment"
 
     # Class diagram
-    if "class " in text:
+    if has_class:
         return "class"
 
     return "unknown"
@@ -368,33 +766,38 @@ def main():
 
     try:
         with open(filename, "r", encoding="utf-8") as f:
-            content = f.read()
+            diagram_type = detect_diagram_type_lines(f)
     except Exception as e:
         print(f"Ошибка чтения: {e}")
         return
 
-    diagram_type = detect_diagram_type(content)
     print(f"\nОбнаружен тип диаграммы: {diagram_type}")
 
     if diagram_type == "class":
-        parser = PlantUMLParser()
-        result = parser.parse_content(content)
-        save_to_json(result, "classes.json")
-
+        parser, output = PlantUMLParser(), "classes.json"
     elif diagram_type == "deployment":
-        parser = DeploymentDiagramParser()
-        result = parser.parse(content)
-        save_to_json(result, "deployment.json")
-
+        parser, output = DeploymentDiagramParser(), "deployment.json"
     elif diagram_type == "database":
-        parser = DatabaseDiagramParser()
-        result = parser.parse(content)
-        save_to_json(result, "database.json")
-
+        parser, output = DatabaseDiagramParser(), "database.json"
     else:
         print("❌ Не удалось определить тип диаграммы.")
         return
 
+    # Для классов отдельный проход собирает наследование, чтобы потоковая
+    # запись не теряла связи, объявленные после закрытия класса; для баз
+    # данных — число объявлений сущностей, чтобы связи не ждали конца файла
+    stream_options = {}
+    if diagram_type == "class":
+        with open(filename, "r", encoding="utf-8") as f:
+            stream_options["inherits"] = parser.collect_inheritance(f)
+    elif diagram_type == "database":
+        with open(filename, "r", encoding="utf-8") as f:
+            stream_options["entities"] = parser.collect_entities(f)
+
+    # Элементы пишутся в JSON по мере разбора
+    with open(filename, "r", encoding="utf-8") as f:
+        save_stream_to_json(parser.parse_stream(f, **stream_options), parser.SECTIONS, output)
+
     print("\nГотово!")
 
 
@@ -5,10 +5,11 @@ chrome.runtime.onMessage.addListener((msg, sender, sendResponse) => {
 
   // Log-only flow: send PlantUML to /receive which prints it on the server console.
   if (msg.action === 'log_puml') {
-    const { serverUrl, token, puml, diagramType, languages } = msg.payload;
+    const { serverUrl, token, puml, diagramType, languages, sessionId, baseVersion, edits } = msg.payload;
     (async () => {
       try {
-        const body = { puml };
+        // Incremental mode: send only changed line ranges for an open parse session
+        const body = sessionId ? { session_id: sessionId, base_version: baseVersion, edits } : { puml, session: true };
         if (diagramType) body['diagramType'] = diagramType;
         if (languages) body['languages'] = languages;
 
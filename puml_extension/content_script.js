@@ -68,6 +68,52 @@ function getPumlFromPage() {
   return null;
 }
 
+// Last diagram accepted by the server's parse session: { sessionId, version, diagramType, lines }
+let parseSession = null;
+
+// Single edit replacing lines [start, end) of `oldLines` so that they become `newLines`
+function diffLines(oldLines, newLines) {
+  let start = 0;
+  while (start < oldLines.length && start < newLines.length && oldLines[start] === newLines[start]) start++;
+  let oldEnd = oldLines.length;
+  let newEnd = newLines.length;
+  while (oldEnd > start && newEnd > start && oldLines[oldEnd - 1] === newLines[newEnd - 1]) {
+    oldEnd--;
+    newEnd--;
+  }
+  return { start, end: oldEnd, lines: newLines.slice(start, newEnd) };
+}
+
+async function sendPuml(config, puml, choice) {
+  const lines = puml.split('\n');
+  const base = {
+    serverUrl: config.serverUrl,
+    token: config.token,
+    diagramType: choice.diagramType,
+    languages: choice.languages // array, may be empty for deployment
+  };
+  const send = (extra) => new Promise((resolve) => chrome.runtime.sendMessage({ action: 'log_puml', payload: Object.assign({}, base, extra) }, (r) => resolve(r)));
+
+  let resp = null;
+  if (parseSession && parseSession.diagramType === choice.diagramType) {
+    resp = await send({
+      sessionId: parseSession.sessionId,
+      baseVersion: parseSession.version,
+      edits: [diffLines(parseSession.lines, lines)]
+    });
+    // Session expired on the server: fall back to a full send
+    if (resp && resp.status === 409) resp = null;
+  }
+  if (!resp) resp = await send({ puml });
+
+  if (resp && resp.status === 200 && resp.data && resp.data.session_id) {
+    parseSession = { sessionId: resp.data.session_id, version: resp.data.version, diagramType: choice.diagramType, lines };
+  } else {
+    parseSession = null;
+  }
+  return resp;
+}
+
 function injectButton() {
   if (document.getElementById('puml-send-btn')) return;
 
@@ -102,18 +148,7 @@ function injectButton() {
       const choice = await showDiagramDialog();
       if (!choice) return; // cancelled
 
-      const payload = {
-        action: 'log_puml',
-        payload: {
-          serverUrl: config.serverUrl,
-          token: config.token,
-          puml,
-          diagramType: choice.diagramType,
-          languages: choice.languages // array, may be empty for deployment
-        }
-      };
-
-      const resp = await new Promise((resolve) => chrome.runtime.sendMessage(payload, (r) => resolve(r)));
+      const resp = await sendPuml(config, puml, choice);
       if (!resp) throw new Error(resp && resp.error ? resp.error : 'no response');
       console.log('Server response (raw):', resp);
       if (resp.data && resp.data.result) console.log('Parsed JSON result from server:', resp.data.result);
@@ -0,0 +1,168 @@
+"""Entry points of the server's process pool.
+
+The pool uses the spawn start method, so each worker imports the module that
+defines the function it runs. This module has no import-time side effects:
+it creates no storage directories, stores, threads or FastAPI app, and
+workers never import `server`.
+"""
+import importlib
+import json
+import subprocess
+import sys
+import tempfile
+import traceback
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+from main import CodeValidator, detect_generator_from_data, warm_templates
+
+from fastapi import HTTPException
+
+
+def call_in_worker(func, args):
+    """Pool entry point. Exceptions come back as plain data: not all of them
+    (HTTPException, DiagramValidationError) survive pickling."""
+    try:
+        return "ok", func(*args)
+    except HTTPException as e:
+        return "http", e.status_code, e.detail
+    except Exception as e:
+        return "error", str(e), traceback.format_exc()
+
+
+def init_worker():
+    # compile the templates once per worker instead of on its first job
+    warm_templates()
+
+
+def render_target(data: Any, kwargs: Dict[str, Any]):
+    """Pool job: render one generator target; returns (file name, bytes)."""
+    gen = detect_generator_from_data(data, validate_code=False, **kwargs)
+    return gen.output_file.name, gen.render()
+
+
+def build_artifacts(puml: str, method: str, options: Optional[dict]) -> Dict[str, bytes]:
+    """Generate artifacts in memory by integrating with the generators in main.py.
+
+    If `puml` looks like PlantUML, parse it with puml_service (as /receive does)
+    and render the appropriate generator straight from the parsed data. Otherwise,
+    return a simple text artifact fallback. Only the optional code validation
+    ("validate" option) touches the disk.
+    """
+    import puml_service
+    artifacts: Dict[str, bytes] = {}
+
+    # If looks like PlantUML, parse it
+    if "@startuml" in puml or "class" in puml:
+        data = puml_service.parse_puml_to_json(puml)
+        if "error" in data:
+            raise ValueError(data["error"])
+        # allow overriding language via options
+        prefer_lang = None
+        if options and isinstance(options, dict):
+            prefer_lang = options.get("language") or options.get("lang")
+        artifacts["input.json"] = json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+        # detect generator non-interactively; it renders the model it has just checked
+        gen = detect_generator_from_data(data, prefer_language=(prefer_lang or method), validate_code=bool(options and options.get("validate")))
+        name = Path(gen.output_file).name
+        artifacts[name] = gen.render()
+
+        if gen.validate_code and gen.language:
+            # compilers need a file: validation is the only disk round trip
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / name
+                path.write_bytes(artifacts[name])
+                CodeValidator(gen.language).validate(str(path))
+    else:
+        # fallback: raw puml as a placeholder file
+        artifacts["puml.txt"] = puml.encode("utf-8")
+
+    artifacts["README.md"] = b"Generated artifacts\n"
+    return artifacts
+
+
+def parse_received(puml: str, diagram_type_hint: Optional[str]) -> dict:
+    """Pool job of /receive: parse the PUML, trying the forced parser for the
+    plugin-provided diagram type, puml_service, in-process puml2json and the
+    puml2json subprocess in turn.
+
+    Returns {"result": parsed} ("generate": False for the subprocess result),
+    {"output": raw stdout} when the subprocess output is not JSON, or
+    {"warning": ...} when nothing could parse it.
+    """
+    if diagram_type_hint:
+        try:
+            # cached by PUML and diagram type, like the general parse below
+            import puml_service
+            parsed = puml_service.parse_puml_as(puml, diagram_type_hint)
+            if parsed is not None:
+                return {"result": parsed}
+        except HTTPException:
+            raise
+        except Exception:
+            # ignore and continue to general parsing
+            traceback.print_exc()
+    # First try to parse in-process using the local puml2json module (faster, reliable)
+    # prefer the new puml_service wrapper (clean function interface)
+    try:
+        import puml_service
+        result = puml_service.parse_puml_to_json(puml)
+        return {"result": result}
+    except HTTPException:
+        raise
+    except Exception:
+        print("\n--- puml_service import failed, falling back ---\n")
+        traceback.print_exc()
+        # fallback: try old in-process puml2json import
+        try:
+            puml2json = importlib.import_module('puml2json')
+            diagram_type = puml2json.detect_diagram_type(puml)
+            if diagram_type == 'class':
+                parser = puml2json.PlantUMLParser()
+                result = parser.parse_content(puml)
+            elif diagram_type == 'deployment':
+                parser = puml2json.DeploymentDiagramParser()
+                result = parser.parse(puml)
+            elif diagram_type == 'database':
+                parser = puml2json.DatabaseDiagramParser()
+                result = parser.parse(puml)
+            else:
+                result = {"error": "unknown diagram type"}
+            return {"result": result}
+        except HTTPException:
+            raise
+        except Exception as e:
+            print("\n--- puml2json in-process failed ---\n")
+            print(str(e))
+            traceback.print_exc()
+            # fallback to subprocess invocation (unbuffered)
+            puml2json_path = Path(__file__).resolve().parent.parent / 'puml2json.py'
+            if not puml2json_path.exists():
+                return {"warning": "puml2json.py not found and in-process import failed"}
+
+            try:
+                proc = subprocess.run([sys.executable, '-u', str(puml2json_path)], input=puml.encode('utf-8'), capture_output=True, timeout=30)
+            except subprocess.TimeoutExpired:
+                raise HTTPException(status_code=500, detail="puml2json timed out")
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+            stdout = proc.stdout.decode('utf-8', errors='replace') if proc.stdout else ''
+            stderr = proc.stderr.decode('utf-8', errors='replace') if proc.stderr else ''
+
+            if stderr:
+                print("\n--- puml2json stderr (subprocess) ---\n")
+                print(stderr)
+
+            if proc.returncode != 0:
+                raise HTTPException(status_code=500, detail=f"puml2json failed: {stderr[:200]}")
+
+            try:
+                # parsed, but not generated from: the subprocess path only persists the result
+                return {"result": json.loads(stdout), "generate": False}
+            except Exception:
+                return {"output": stdout}
@@ -1,199 +1,397 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
 import os
 import uuid
 import json
 import base64
-import shutil
+import threading
+import time
 import zipfile
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-import re
 
 # import generator API
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
-from main import detect_generator_from_data
+from main import templates_version, warm_templates
+from model_ir import as_model
+import model_binary
+import puml_session
+from artifact_store import ArtifactStore
+from job_store import open_job_store
+from pool_jobs import build_artifacts, call_in_worker, init_worker, parse_received, render_target
 from datetime import datetime
-from typing import Optional, Dict, Any, List
-import subprocess
-import importlib
+from typing import Optional, Dict, Any, List, Tuple
 import traceback
 
-from fastapi import FastAPI, HTTPException, Header, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
 
 BASE_DIR = Path(__file__).resolve().parent
 STORAGE_DIR = BASE_DIR / "storage"
 STORAGE_DIR.mkdir(exist_ok=True)
 TOKEN_FILE = BASE_DIR / "token.txt"
+# parsed.json is only a debug export; generators read the binary model file
+DEBUG_JSON = os.getenv("PUML_DEBUG_JSON", "").lower() in ("1", "true", "yes")
+# Requests render artifacts in memory; job files are stored by a background thread
+# in the content-addressed ARTIFACT_STORE, or not at all with PUML_PERSIST=0
+# (downloads are then served from memory only)
+PERSIST_TO_DISK = os.getenv("PUML_PERSIST", "1").lower() not in ("0", "false", "no")
+PERSIST_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persist")
+ARTIFACT_STORE = ArtifactStore(STORAGE_DIR)
+# Job files that are inputs rather than generated code (skipped by /download)
+INPUT_FILES = {"input.puml", "parsed.json", model_binary.MODEL_FILENAME, "README.md", "input.json", "output.txt"}
+# Artifacts of the most recent jobs: job_id -> {file name: bytes}
+RECENT_ARTIFACTS: "OrderedDict[str, Dict[str, bytes]]" = OrderedDict()
+RECENT_ARTIFACTS_LIMIT = int(os.getenv("PUML_RECENT_ARTIFACTS", "64"))
+_RECENT_LOCK = threading.Lock()
+# Process pool for parsing and generation: PUML_WORKERS processes (default: one per core)
+# plus PUML_QUEUE_SIZE waiting requests; beyond that requests get 429 + Retry-After
+PUML_WORKERS = int(os.getenv("PUML_WORKERS") or os.cpu_count() or 1)
+PUML_QUEUE_SIZE = int(os.getenv("PUML_QUEUE_SIZE") or PUML_WORKERS * 4)
+PUML_RETRY_AFTER = int(os.getenv("PUML_RETRY_AFTER", "2"))
+# /generate jobs and pairing codes: SQLite file shared by all workers, or "memory"
+PUML_JOB_STORE = os.getenv("PUML_JOB_STORE") or str(STORAGE_DIR / "jobs.sqlite3")
+# Identical requests (same PUML, diagram type/method, languages/options and templates)
+# share one computation while it runs and reuse its result for PUML_REUSE_TTL seconds
+PUML_REUSE_TTL = int(os.getenv("PUML_REUSE_TTL", "300"))
+
+
+class WorkerError(RuntimeError):
+    """An exception raised inside a pool worker; `trace` is its formatted traceback."""
+
+    def __init__(self, message: str, trace: str):
+        super().__init__(message)
+        self.trace = trace
+
+
+class JobExecutor:
+    """CPU-bound parse and generate work in a process pool with bounded admission.
+
+    A request holds one admission slot (`admission()` / `admit()`) for all the
+    pool jobs it submits, including its per-language fan-out. At most
+    `workers + queue_size` requests are admitted at a time; the next one gets
+    HTTPException 429 with Retry-After instead of queueing behind large
+    diagrams. The event loop only awaits futures, so lightweight endpoints stay
+    responsive while the workers are busy.
+    """
+
+    def __init__(self, workers: int, queue_size: int, retry_after: int):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.retry_after = retry_after
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._admitted = 0
+
+    def start(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that already runs the event loop and the persistence thread is unsafe
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def admit(self) -> None:
+        with self._lock:
+            if self._admitted >= self.capacity:
+                raise HTTPException(status_code=429, detail="server is busy, retry later",
+                                    headers={"Retry-After": str(self.retry_after)})
+            self._admitted += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._admitted -= 1
+
+    @contextmanager
+    def admission(self):
+        self.admit()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def submit(self, func, *args) -> Future:
+        """Run func(*args) in a worker; the future holds the `call_in_worker` outcome."""
+        return self.start().submit(call_in_worker, func, args)
+
+    @staticmethod
+    def outcome(result):
+        """Return value of a worker call, or its exception raised again in this process"""
+        if result[0] == "ok":
+            return result[1]
+        if result[0] == "http":
+            raise HTTPException(status_code=result[1], detail=result[2])
+        raise WorkerError(result[1], result[2])
+
+    async def run(self, func, *args):
+        return self.outcome(await asyncio.wrap_future(self.submit(func, *args)))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"workers": self.workers, "capacity": self.capacity, "admitted": self._admitted}
+
+
+JOB_EXECUTOR = JobExecutor(PUML_WORKERS, PUML_QUEUE_SIZE, PUML_RETRY_AFTER)
+
+
+def request_key(kind: str, puml: str, *params: Any) -> str:
+    """Content address of a request: hash of the normalized PUML, the request
+    parameters and the current template version."""
+    import puml_service
+    digest = hashlib.sha256()
+    digest.update(json.dumps([kind, params, templates_version()], sort_keys=True, default=str).encode("utf-8"))
+    digest.update(b"\n")
+    digest.update(puml_service.normalize_puml(puml).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RequestCoalescer:
+    """Per-process coalescing of identical /receive requests.
+
+    The first request with a key runs as an asyncio task; requests with the
+    same key arriving meanwhile await that task instead of computing again.
+    A successful result is reused for `ttl` seconds after it completes, a
+    failure is dropped at once. At most `limit` completed results are kept.
+    """
+
+    def __init__(self, ttl: float, limit: int = 256):
+        self.ttl = ttl
+        self.limit = limit
+        # key -> [task, completion time (None while running or after a failure)]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self.computed = 0
+        self.shared = 0
+
+    def _lookup(self, key: str) -> Optional[asyncio.Task]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        task, completed = entry
+        if not task.done() or (completed is not None and time.monotonic() - completed < self.ttl):
+            return task
+        del self._entries[key]
+        return None
+
+    def _completed(self, key: str, task: asyncio.Task) -> None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] is not task:
+            return
+        if task.cancelled() or task.exception() is not None:
+            del self._entries[key]
+        else:
+            entry[1] = time.monotonic()
+
+    def _trim(self) -> None:
+        finished = [key for key, (task, _) in self._entries.items() if task.done()]
+        for key in finished[:max(0, len(self._entries) - self.limit)]:
+            del self._entries[key]
 
+    async def run(self, key: str, factory) -> Tuple[Any, bool]:
+        """Result of `await factory()` for `key`, and whether it was shared with another request."""
+        task = self._lookup(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task), True
+        self.computed += 1
+        task = asyncio.ensure_future(factory())
+        self._entries[key] = [task, None]
+        task.add_done_callback(lambda t: self._completed(key, t))
+        self._trim()
+        # shield: a client that disconnects does not cancel the work other requests wait for
+        return await asyncio.shield(task), False
 
-def persist_parsed_result(result: dict, puml: str):
-    """Persist parsed JSON and input PUML to a new job folder and return job_id and parsed_file path."""
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "computed": self.computed, "shared": self.shared}
+
+
+RECEIVE_COALESCER = RequestCoalescer(PUML_REUSE_TTL)
+
+
+def persist_parsed_result(result: dict, puml: str, job_id: Optional[str] = None,
+                          artifacts: Optional[Dict[str, bytes]] = None) -> Optional[str]:
+    """Store the input PUML, the parsed model and the generated artifacts of a job; returns job_id.
+
+    The model is stored in the compact binary format (model_binary). parsed.json
+    is stored only with PUML_DEBUG_JSON=1, or when the result is not a diagram
+    (e.g. a parser error payload).
+    """
     try:
-        job_id = uuid.uuid4().hex
-        job_dir = STORAGE_DIR / job_id
-        job_dir.mkdir(parents=True, exist_ok=True)
-        parsed_file = job_dir / "parsed.json"
-        parsed_file.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
-        (job_dir / "input.puml").write_text(puml, encoding="utf-8")
-        print(f"Saved parsed JSON to {parsed_file}")
-        return job_id, parsed_file
+        job_id = job_id or uuid.uuid4().hex
+        files = {"input.puml": puml.encode("utf-8")}
+        try:
+            model = as_model(result)
+        except (ValueError, KeyError, TypeError):
+            model = None
+        if model is not None:
+            files[model_binary.MODEL_FILENAME] = model_binary.dumps(model)
+        if model is None or DEBUG_JSON:
+            files["parsed.json"] = json.dumps(result, ensure_ascii=False, indent=2).encode("utf-8")
+        files.update(artifacts or {})
+        ARTIFACT_STORE.put(job_id, files)
+        print(f"Stored job {job_id}: {', '.join(files)}")
+        return job_id
     except Exception as e:
         print("Failed to persist parsed JSON:", e)
-        return None, None
+        return None
+
+
+def remember_artifacts(job_id: str, artifacts: Dict[str, bytes]) -> None:
+    """Keep the artifacts of a recent job in memory so downloads do not wait for the disk."""
+    with _RECENT_LOCK:
+        RECENT_ARTIFACTS[job_id] = artifacts
+        RECENT_ARTIFACTS.move_to_end(job_id)
+        while len(RECENT_ARTIFACTS) > RECENT_ARTIFACTS_LIMIT:
+            RECENT_ARTIFACTS.popitem(last=False)
+
+
+def recent_artifacts(job_id: str) -> Optional[Dict[str, bytes]]:
+    with _RECENT_LOCK:
+        return RECENT_ARTIFACTS.get(job_id)
+
+
+def generated_files(artifacts: Dict[str, bytes]) -> Dict[str, bytes]:
+    return {name: content for name, content in artifacts.items()
+            if name not in INPUT_FILES and not name.startswith("error_")}
+
+
+def zip_artifacts(artifacts: Dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for name, content in artifacts.items():
+            z.writestr(name, content)
+    return buffer.getvalue()
+
+
+def schedule_persist(func, *args) -> None:
+    """Run a disk write off the request path; a no-op when PUML_PERSIST=0."""
+    if not PERSIST_TO_DISK:
+        return
+
+    def run():
+        try:
+            func(*args)
+        except Exception:
+            traceback.print_exc()
+
+    PERSIST_EXECUTOR.submit(run)
 
 
-def run_plugin_runner(parsed_json_path: Path, diagram_type: Optional[str], languages: Optional[list]):
-    """Invoke plugin_runner.py as a subprocess and return its stdout/stderr and saved path if found."""
+def _generator_targets(diagram_type: str, languages: Optional[list]) -> list:
+    """(result label, detect_generator_from_data keywords, error file suffix) per requested target."""
+    if diagram_type == 'classes':
+        return [({'language': lang}, {'prefer_language': lang}, lang) for lang in languages or ['python']]
+    if diagram_type == 'database':
+        return [({'db': db}, {'db_type': db}, db) for db in languages or ['postgresql']]
+    return [({}, {}, 'deployment')]
+
+
+async def run_plugin_runner(data: Any, diagram_type: Optional[str], languages: Optional[list]):
+    """Render the requested generators for a parsed model in memory.
+
+    `data` is the parser result (JSON dict) or a model_ir diagram; it is handed
+    to the generators as is, nothing is read from disk. Targets are rendered
+    concurrently in the JOB_EXECUTOR pool. Returns the JSON-safe plugin result
+    and the artifacts as {file name: bytes}; failed targets add an
+    error_<target>.txt traceback.
+    """
     if not diagram_type:
-        return {"status": "skipped", "reason": "no diagram_type provided"}
+        return {"status": "skipped", "reason": "no diagram_type provided"}, {}
 
-    # Try in-process generation using detect_generator_from_data to ensure files are written
-    try:
-        data = json.loads(parsed_json_path.read_text(encoding='utf-8'))
-    except Exception as e:
-        return {"status": "error", "reason": f"failed to read parsed json: {e}"}
+    sections = data if isinstance(data, dict) else {name: getattr(data, name) for name in data.SECTIONS}
 
     # Validate there's meaningful content for requested diagram type
     has_content = False
-    if diagram_type == 'classes' and data.get('classes'):
+    if diagram_type == 'classes' and sections.get('classes'):
         has_content = True
-    if diagram_type == 'database' and data.get('tables'):
+    if diagram_type == 'database' and sections.get('tables'):
         has_content = True
-    if diagram_type == 'deployment' and data.get('nodes'):
+    if diagram_type == 'deployment' and sections.get('nodes'):
         has_content = True
 
     if not has_content:
-        return {"status": "skipped", "reason": "parsed JSON does not contain required keys for diagram type", "parsed_keys": list(data.keys())}
-
-    outputs = []
-    plugin_out_dir = parsed_json_path.parent / 'plugin_outputs'
-    plugin_out_dir.mkdir(parents=True, exist_ok=True)
+        return {"status": "skipped", "reason": "parsed JSON does not contain required keys for diagram type", "parsed_keys": list(sections.keys())}, {}
 
     # languages may be comma-separated string or list
     if isinstance(languages, str):
         languages = [x.strip() for x in languages.split(',') if x.strip()]
 
-    # decide job-level id
-    run_id = uuid.uuid4().hex
-    run_dir = plugin_out_dir / run_id
-    run_dir.mkdir(parents=True, exist_ok=True)
+    artifacts: Dict[str, bytes] = {}
+    outputs = []
 
     try:
-        # For classes: run per language
-        if diagram_type == 'classes':
-            langs = languages or ['python']
-            for lang in langs:
-                try:
-                    gen = detect_generator_from_data(data, prefer_language=lang, validate_code=False)
-                    gen.file_path = parsed_json_path
-                    out_name = Path(gen.output_file).name if hasattr(gen, 'output_file') else f'output_{lang}.txt'
-                    gen.output_file = run_dir / out_name
-                    gen.generate()
-                    # if generator wrote file, copy/check it
-                    if gen.output_file and Path(gen.output_file).exists():
-                        outputs.append(str(gen.output_file))
-                    else:
-                        # try to find files in common generated dirs
-                        copied = []
-                        for d in [Path('generated_code'), Path('generated_sql')]:
-                            if d.exists():
-                                for f in d.rglob('*'):
-                                    if f.is_file():
-                                        dest = run_dir / f.name
-                                        try:
-                                            shutil.copyfile(f, dest)
-                                            copied.append(str(dest))
-                                        except Exception:
-                                            pass
-                        if copied:
-                            outputs.extend(copied)
-                        else:
-                            outputs.append({'language': lang, 'warning': 'no output file produced'})
-                except Exception as e:
-                    err_path = run_dir / f'error_{lang}.txt'
-                    try:
-                        err_path.write_text(traceback.format_exc(), encoding='utf-8')
-                    except Exception:
-                        pass
-                    outputs.append({'language': lang, 'error': str(e), 'trace': str(err_path)})
-
-        # For database: run per DB type
-        elif diagram_type == 'database':
-            dbs = languages or ['postgresql']
-            for db in dbs:
-                try:
-                    gen = detect_generator_from_data(data, prefer_language=None, validate_code=False, db_type=db)
-                    gen.file_path = parsed_json_path
-                    out_name = Path(gen.output_file).name if hasattr(gen, 'output_file') else f'output_{db}.sql'
-                    gen.output_file = run_dir / out_name
-                    gen.generate()
-                    if gen.output_file and Path(gen.output_file).exists():
-                        outputs.append(str(gen.output_file))
-                    else:
-                        # scan generated_sql
-                        copied = []
-                        d = Path('generated_sql')
-                        if d.exists():
-                            for f in d.rglob('*'):
-                                if f.is_file():
-                                    dest = run_dir / f.name
-                                    try:
-                                        shutil.copyfile(f, dest)
-                                        copied.append(str(dest))
-                                    except Exception:
-                                        pass
-                        if copied:
-                            outputs.extend(copied)
-                        else:
-                            outputs.append({'db': db, 'warning': 'no output file produced'})
-                except Exception as e:
-                    err_path = run_dir / f'error_{db}.txt'
-                    try:
-                        err_path.write_text(traceback.format_exc(), encoding='utf-8')
-                    except Exception:
-                        pass
-                    outputs.append({'db': db, 'error': str(e), 'trace': str(err_path)})
-
-        # For deployment: single generator
-        elif diagram_type == 'deployment':
-            try:
-                gen = detect_generator_from_data(data, prefer_language=None, validate_code=False)
-                gen.file_path = parsed_json_path
-                out_name = Path(gen.output_file).name if hasattr(gen, 'output_file') else 'docker-compose.yaml'
-                gen.output_file = run_dir / out_name
-                gen.generate()
-                if gen.output_file and Path(gen.output_file).exists():
-                    outputs.append(str(gen.output_file))
-                else:
-                    # try to find written file in generated_code
-                    copied = []
-                    d = Path('generated_code')
-                    if d.exists():
-                        for f in d.rglob('*'):
-                            if f.is_file():
-                                dest = run_dir / f.name
-                                try:
-                                    shutil.copyfile(f, dest)
-                                    copied.append(str(dest))
-                                except Exception:
-                                    pass
-                    if copied:
-                        outputs.extend(copied)
-                    else:
-                        outputs.append({'warning': 'no output file produced'})
-            except Exception as e:
-                err_path = run_dir / 'error_deployment.txt'
-                try:
-                    err_path.write_text(traceback.format_exc(), encoding='utf-8')
-                except Exception:
-                    pass
-                outputs.append({'error': str(e), 'trace': str(err_path)})
-
-        return {"status": "ok", "run_dir": str(run_dir), "outputs": outputs}
+        targets = _generator_targets(diagram_type, languages)
+        rendered = await asyncio.gather(*(JOB_EXECUTOR.run(render_target, data, kwargs) for _, kwargs, _ in targets),
+                                        return_exceptions=True)
+        for (label, _, suffix), outcome in zip(targets, rendered):
+            if isinstance(outcome, BaseException):
+                err_name = f'error_{suffix}.txt'
+                trace = getattr(outcome, 'trace', None) or ''.join(traceback.format_exception(outcome))
+                artifacts[err_name] = trace.encode('utf-8')
+                outputs.append({**label, 'error': str(outcome), 'trace': err_name})
+            else:
+                name, content = outcome
+                artifacts[name] = content
+                outputs.append(name)
+        return {"status": "ok", "outputs": outputs}, artifacts
     except Exception as e:
-        return {"status": "error", "reason": str(e), "trace": traceback.format_exc()}
+        return {"status": "error", "reason": str(e), "trace": traceback.format_exc()}, {}
+
+
+async def receive_with_session(payload: dict) -> dict:
+    """Incremental variant of /receive backed by a puml_session.ParseSession.
+
+    Open a session: {"puml": "...", "session": true}
+    Update it:      {"session_id": "...", "base_version": n, "edits": [{"start", "end", "lines"}]}
+    Only the blocks touched by the edits are re-parsed. A missing or stale
+    session yields 409 so the client can resend the full diagram.
+    """
+    diagram_type = payload.get('diagramType') or payload.get('diagram_type')
+    languages = payload.get('languages') or payload.get('langs')
+    session_id = payload.get('session_id')
+
+    def update_session():
+        # sessions live in this process, so parsing runs in a thread rather than in the pool
+        if session_id:
+            session = puml_session.get_session(session_id)
+            if session is None or session.version != payload.get('base_version'):
+                raise HTTPException(status_code=409, detail="session expired or out of date, resend full puml")
+            try:
+                session.apply_edits(payload.get('edits') or [])
+            except (KeyError, TypeError, ValueError) as e:
+                # a partially applied batch leaves the session unusable
+                puml_session.close_session(session_id)
+                raise HTTPException(status_code=400, detail=f"invalid edits: {e}")
+        else:
+            puml = payload.get('puml')
+            if not puml:
+                raise HTTPException(status_code=400, detail="missing puml in payload")
+            try:
+                session = puml_session.open_session(puml, diagram_type)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        model = session.to_model()
+        return session, model, model.to_json(), session.text()
+
+    session, model, result, text = await run_in_threadpool(update_session)
+    # generators take the session model directly; the JSON copy is for the response and the job folder
+    response = await process_parsed_result(result, text, diagram_type, languages, model=model)
+    response["session_id"] = session.session_id
+    response["version"] = session.version
+    return response
 
 
 def infer_diagram_type_from_keys(parsed_keys: Optional[list]) -> str:
@@ -207,11 +405,12 @@ def infer_diagram_type_from_keys(parsed_keys: Optional[list]) -> str:
     return "unknown"
 
 
-def run_plugin_runner_checked(parsed_json_path: Path, diagram_type: Optional[str], languages: Optional[list]):
-    """Run generator and convert mismatch/failure into explicit HTTP errors."""
-    plugin_result = run_plugin_runner(parsed_json_path, diagram_type, languages)
-    if not isinstance(plugin_result, dict):
-        return plugin_result
+async def run_plugin_runner_checked(data: Any, diagram_type: Optional[str], languages: Optional[list]):
+    """Run generators in memory and convert mismatch/failure into explicit HTTP errors.
+
+    Returns the plugin result and the artifacts, see `run_plugin_runner`.
+    """
+    plugin_result, artifacts = await run_plugin_runner(data, diagram_type, languages)
 
     status = plugin_result.get("status")
     if status == "skipped":
@@ -229,11 +428,30 @@ def run_plugin_runner_checked(parsed_json_path: Path, diagram_type: Optional[str
     elif status == "error":
         raise HTTPException(status_code=500, detail=f"Generation failed: {plugin_result.get('reason', 'unknown error')}")
 
-    return plugin_result
+    return plugin_result, artifacts
+
+
+async def process_parsed_result(result: Any, puml: str, diagram_type: Optional[str], languages: Optional[list],
+                          model: Any = None) -> dict:
+    """Hot path of /receive: generate from the parsed model in memory.
+
+    `model` is an already built model_ir diagram for `result`, if the caller has
+    one. Artifacts are kept in RECENT_ARTIFACTS for /download; the model, the
+    input PUML and the artifacts are stored in ARTIFACT_STORE in the background.
+    """
+    job_id = uuid.uuid4().hex
+    plugin_result, artifacts = None, {}
+    if diagram_type:
+        plugin_result, artifacts = await run_plugin_runner_checked(result if model is None else model,
+                                                                   diagram_type, languages)
+        print("plugin_runner result:", plugin_result)
+    remember_artifacts(job_id, artifacts)
+    schedule_persist(persist_parsed_result, result, puml, job_id, artifacts)
+    return {"status": "ok", "result": result, "job_id": job_id, "plugin": plugin_result}
 
 
 def collect_generated_files(job_id: str) -> List[Path]:
-    """Collect generated artifacts for a job.
+    """Collect generated artifacts from a job folder written before the artifact store.
 
     Prefer files from the latest plugin run directory. If that is unavailable,
     fallback to files written directly into the job directory.
@@ -252,8 +470,7 @@ def collect_generated_files(job_id: str) -> List[Path]:
             if files:
                 return files
 
-    ignored = {"input.puml", "parsed.json", "README.md", "input.json"}
-    return [f for f in job_dir.rglob("*") if f.is_file() and f.name not in ignored]
+    return [f for f in job_dir.rglob("*") if f.is_file() and f.name not in INPUT_FILES]
 
 
 def ensure_token() -> str:
@@ -268,6 +485,22 @@ SERVER_TOKEN = ensure_token()
 
 app = FastAPI(title="PlantUML Local Generator")
 
+
+@app.on_event("startup")
+def warm_template_cache():
+    """Compile all generator templates once so the first request only renders."""
+    names = warm_templates()
+    print(f"Warmed {len(names)} templates")
+    JOB_EXECUTOR.start()
+    ARTIFACT_STORE.start_collector()
+
+
+@app.on_event("shutdown")
+def stop_job_executor():
+    JOB_EXECUTOR.shutdown()
+    JOB_STORE.close()
+    ARTIFACT_STORE.close()
+
 # Configure allowed origins. Default to editor.plantuml.com for safety.
 _origins = os.getenv("PUML_ALLOW_ORIGINS")
 if _origins:
@@ -294,30 +527,18 @@ class GenerateRequest(BaseModel):
     request_id: Optional[str] = None
 
 
-# Pairing codes for one-time pairing flow: code -> expiry_ts
-PAIR_CODES: Dict[str, float] = {}
+# Job store for /generate jobs and one-time pairing codes (see job_store.py)
+JOB_STORE = open_job_store(PUML_JOB_STORE)
 PAIR_CODE_TTL = int(os.getenv("PUML_PAIR_TTL", "300"))  # seconds
 
 
 def generate_pair_code() -> str:
     code = str(uuid.uuid4().hex[:6]).upper()
-    PAIR_CODES[code] = datetime.utcnow().timestamp() + PAIR_CODE_TTL
+    JOB_STORE.add_pair_code(code, datetime.utcnow().timestamp() + PAIR_CODE_TTL)
     print(f"Pair code generated: {code} (valid {PAIR_CODE_TTL}s)")
     return code
 
 
-def cleanup_pair_codes():
-    now = datetime.utcnow().timestamp()
-    expired = [c for c, ts in PAIR_CODES.items() if ts < now]
-    for c in expired:
-        del PAIR_CODES[c]
-
-
-
-# Simple in-memory job store (replace with DB for production)
-JOBS: Dict[str, Dict[str, Any]] = {}
-
-
 def check_auth(authorization: Optional[str]):
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
@@ -328,165 +549,145 @@ def check_auth(authorization: Optional[str]):
         raise HTTPException(status_code=403, detail="Invalid token")
 
 
-def parse_plantuml_classes(puml_text: str) -> dict:
-    """Very small PlantUML class parser -> JSON structure expected by generators.
+def persist_artifacts(job_id: str, artifacts: Dict[str, bytes]) -> Dict[str, str]:
+    """Store the job files and return the manifest; run in the background by `finish_generation`.
 
-    Supports basic blocks like:
-      class A {
-        +attr: int
-        +method(x: int): void
-      }
+    The zip served by /files is built from the stored files on demand.
     """
-    classes = []
-    # find class blocks
-    for m in re.finditer(r"class\s+(\w+)\s*\{([^}]*)\}", puml_text, re.S):
-        name = m.group(1)
-        body = m.group(2)
-        attrs = []
-        methods = []
-        for line in body.splitlines():
-            line = line.strip()
-            if not line:
-                try:
-                    job_id = uuid.uuid4().hex
-                    job_dir = STORAGE_DIR / job_id
-                    job_dir.mkdir(parents=True, exist_ok=True)
-                    parsed_file = job_dir / "parsed.json"
-                    parsed_file.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
-                    (job_dir / "input.puml").write_text(puml, encoding="utf-8")
-                    print(f"Saved parsed JSON to {parsed_file}")
-                except Exception as _e:
-                    print("Failed to persist parsed JSON:", _e)
-                diagram_type = None
-                languages = None
-                try:
-                    diagram_type = payload.get('diagramType') or payload.get('diagram_type')
-                    languages = payload.get('languages') or payload.get('langs')
-                except Exception:
-                    pass
-                plugin_result = None
-                if diagram_type:
-                    plugin_result = run_plugin_runner_checked(parsed_file, diagram_type, languages)
-                    print("plugin_runner result:", plugin_result)
-                return {"status": "ok", "result": result, "job_id": job_id, "plugin": plugin_result}
-            # fallback: ignore
-        classes.append({"name": name, "attributes": attrs, "methods": methods})
-    return {"classes": classes}
-
-
-def make_artifacts(job_id: str, puml: str, method: str, options: Optional[dict]) -> Path:
-    """Generate artifacts by integrating with existing generator in main.py.
-
-    If `puml` contains PlantUML class blocks, attempt to parse to JSON and run appropriate generator.
-    Otherwise, create a simple text artifact fallback.
+    return ARTIFACT_STORE.put(job_id, artifacts)
+
+
+def make_artifacts(job_id: str, puml: str, method: str, options: Optional[dict]) -> Dict[str, str]:
+    """Generate artifacts and store them synchronously."""
+    return persist_artifacts(job_id, build_artifacts(puml, method, options))
+
+
+def finish_generation(job_id: str, artifacts: Optional[Dict[str, bytes]] = None, error: Optional[str] = None) -> None:
+    """Record the outcome of a /generate job.
+
+    The artifacts stay in RECENT_ARTIFACTS for /files and /download; the job
+    folder and zip are written in the background.
     """
-    job_dir = STORAGE_DIR / job_id
-    if job_dir.exists():
-        shutil.rmtree(job_dir)
-    job_dir.mkdir(parents=True)
-
-    # If looks like PlantUML, parse classes
-    if "@startuml" in puml or "class" in puml:
-        data = parse_plantuml_classes(puml)
-        # allow overriding language via options
-        prefer_lang = None
-        if options and isinstance(options, dict):
-            prefer_lang = options.get("language") or options.get("lang")
-        # Build a temp json file for generator
-        tmp_json = job_dir / "input.json"
-        tmp_json.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
-
-        # detect generator non-interactively
-        gen = detect_generator_from_data(data, prefer_language=(prefer_lang or method), validate_code=bool(options and options.get("validate")))
-
-        # override generator file paths to write into job_dir
-        gen.file_path = tmp_json
-        # choose sensible output filenames based on language
-        if hasattr(gen, 'output_file'):
-            out_name = Path(gen.output_file).name
-            gen.output_file = job_dir / out_name
-
-        # run generation
-        gen.generate()
-
-        # collect generated files from job_dir
-        # if generator wrote to other dirs, also try to copy common generated locations
-        possible_dirs = [Path("generated_code"), Path("generated_sql"), job_dir]
-        for src in possible_dirs:
-            if src.exists():
-                for f in src.rglob("*"):
-                    if f.is_file():
-                        dest = job_dir / f.name
-                        try:
-                            shutil.copyfile(f, dest)
-                        except Exception:
-                            pass
-
-    else:
-        # fallback: write raw puml and a placeholder file
-        py_file = job_dir / "puml.txt"
-        py_file.write_text(puml, encoding="utf-8")
-
-    readme = job_dir / "README.md"
-    readme.write_text("Generated artifacts\n", encoding="utf-8")
+    completed_at = datetime.utcnow().isoformat() + "Z"
+    if error is not None:
+        JOB_STORE.update(job_id, status="error", error=error, completed_at=completed_at)
+        return
+    remember_artifacts(job_id, artifacts)
+    schedule_persist(persist_artifacts, job_id, artifacts)
+    JOB_STORE.update(job_id, status="done", completed_at=completed_at, result={
+        "download_url": f"http://localhost:{os.getenv('PUML_PORT','8000')}/files/{job_id}.zip"
+    })
 
-    zip_path = STORAGE_DIR / f"{job_id}.zip"
-    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
-        for f in job_dir.rglob("*"):
-            z.write(f, arcname=f.relative_to(job_dir))
 
-    return zip_path
+# /generate jobs running in this process: job_id -> pool future
+GENERATIONS: Dict[str, Future] = {}
 
 
-def run_generation_sync(job_id: str, puml: str, method: str, options: Optional[dict]):
+def _generation_done(job_id: str, future: Future) -> None:
+    """Completion callback of a /generate job (runs in the pool's result thread)."""
+    JOB_EXECUTOR.release()
     try:
-        JOBS[job_id]["status"] = "running"
-        JOBS[job_id]["started_at"] = datetime.utcnow().isoformat() + "Z"
-        zip_path = make_artifacts(job_id, puml, method, options)
-        JOBS[job_id]["status"] = "done"
-        JOBS[job_id]["completed_at"] = datetime.utcnow().isoformat() + "Z"
-        JOBS[job_id]["result"] = {
-            "download_url": f"http://localhost:{os.getenv('PUML_PORT','8000')}/files/{job_id}.zip"
-        }
+        finish_generation(job_id, JobExecutor.outcome(future.result()))
     except Exception as e:
-        JOBS[job_id]["status"] = "error"
-        JOBS[job_id]["error"] = str(e)
+        finish_generation(job_id, error=str(e))
+    GENERATIONS.pop(job_id, None)
 
 
-def run_generation_background(job_id: str, puml: str, method: str, options: Optional[dict]):
-    run_generation_sync(job_id, puml, method, options)
+def _files_response(job_id: str, artifacts: Dict[str, bytes]) -> dict:
+    files = [{"name": name, "content_base64": base64.b64encode(content).decode('ascii')}
+             for name, content in artifacts.items()]
+    return {"status": "done", "job_id": job_id, "result": {"files": files}}
+
+
+def _accepted_response(job_id: str) -> dict:
+    return {"status": "accepted", "job_id": job_id, "status_url": f"/status/{job_id}"}
+
+
+async def reuse_generation(job_id: str, sync: bool) -> Optional[dict]:
+    """Response of /generate for a job started by an earlier identical request.
+
+    Async requests get the existing job's status URL. Sync requests wait for
+    the job if it runs in this process and get its files inline; None when the
+    files are not available here (the job ran in another worker).
+    """
+    if not sync:
+        return {**_accepted_response(job_id), "reused": True}
+    future = GENERATIONS.get(job_id)
+    if future is not None:
+        # _generation_done runs before this await resumes, so the outcome is recorded by then
+        await asyncio.shield(asyncio.wrap_future(future))
+    job = await run_in_threadpool(JOB_STORE.get, job_id)
+    if job is not None and job["status"] == "error":
+        raise HTTPException(status_code=500, detail=job.get("error"))
+    artifacts = recent_artifacts(job_id)
+    if job is None or job["status"] != "done" or artifacts is None:
+        return None
+    return {**_files_response(job_id, artifacts), "reused": True}
 
 
 @app.post("/generate")
-async def generate(req: GenerateRequest, background: BackgroundTasks, authorization: Optional[str] = Header(None)):
+async def generate(req: GenerateRequest, authorization: Optional[str] = Header(None)):
+    """Generate code from PUML, inline (sync) or as a job polled via /status.
+
+    `request_id` is an idempotency key: repeating it returns the job it started.
+    Requests identical in content (PUML, method, options, templates) reuse a
+    running or recent job for PUML_REUSE_TTL seconds; failed jobs are not reused.
+    """
     check_auth(authorization)
     job_id = uuid.uuid4().hex
-    JOBS[job_id] = {
+    created_at = datetime.utcnow().isoformat() + "Z"
+    job = {
         "job_id": job_id,
-        "status": "pending",
+        "status": "running" if req.sync else "pending",
         "request_id": req.request_id,
         "method": req.method,
+        "created_at": created_at,
     }
-
     if req.sync:
-        # run and return inline (small workloads)
-        run_generation_sync(job_id, req.puml, req.method, req.options)
-        job = JOBS[job_id]
-        if job.get("status") == "done":
-            # read zip and include files inline (base64) for convenience
-            zip_path = STORAGE_DIR / f"{job_id}.zip"
-            files = []
-            with zipfile.ZipFile(zip_path, "r") as z:
-                for name in z.namelist():
-                    data = z.read(name)
-                    files.append({"name": name, "content_base64": base64.b64encode(data).decode('ascii')})
-            return {"status": "done", "job_id": job_id, "result": {"files": files}}
-        else:
-            raise HTTPException(status_code=500, detail=job.get("error", "unknown"))
+        job["started_at"] = created_at
+    # the job exists before its keys are claimed, so other workers never see a key without its job.
+    # Job-store calls may wait for the SQLite write lock, so they run in the thread pool, off the event loop
+    await run_in_threadpool(JOB_STORE.create, job)
+
+    request_key_name = f"request:{req.request_id}" if req.request_id else None
+    if request_key_name:
+        owner = await run_in_threadpool(JOB_STORE.claim, request_key_name, job_id)
+        if owner != job_id:
+            await run_in_threadpool(JOB_STORE.delete, job_id)
+            return await reuse_generation(owner, req.sync) or {**_accepted_response(owner), "reused": True}
+    content_key = "content:" + request_key("generate", req.puml, req.method, req.options)
+    owner = await run_in_threadpool(JOB_STORE.claim, content_key, job_id, max_age=PUML_REUSE_TTL, replace_errors=True)
+    if owner != job_id:
+        response = await reuse_generation(owner, req.sync)
+        if response is not None:
+            if request_key_name:
+                await run_in_threadpool(JOB_STORE.bind, request_key_name, owner)
+            await run_in_threadpool(JOB_STORE.delete, job_id)
+            return response
+
+    # queue the job in the pool; a full queue answers 429
+    try:
+        JOB_EXECUTOR.admit()
+    except HTTPException:
+        await run_in_threadpool(JOB_STORE.delete, job_id)
+        raise
+    try:
+        future = JOB_EXECUTOR.submit(build_artifacts, req.puml, req.method, req.options)
+    except Exception:
+        JOB_EXECUTOR.release()
+        await run_in_threadpool(JOB_STORE.delete, job_id)
+        raise
+    GENERATIONS[job_id] = future
+    future.add_done_callback(lambda f: _generation_done(job_id, f))
+    if not req.sync:
+        return _accepted_response(job_id)
 
-    # async: schedule background task and return 202
-    background.add_task(run_generation_background, job_id, req.puml, req.method, req.options)
-    return {"status": "accepted", "job_id": job_id, "status_url": f"/status/{job_id}"}
+    # sync: wait and return inline (small workloads); files come straight from the in-memory buffers
+    try:
+        artifacts = JobExecutor.outcome(await asyncio.shield(asyncio.wrap_future(future)))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return _files_response(job_id, artifacts)
 
 
 @app.get("/pair-code")
@@ -498,7 +699,7 @@ async def pair_code(request: Request, authorization: Optional[str] = Header(None
     client_host = request.client.host if request.client else None
     if client_host not in ("127.0.0.1", "::1", "localhost"):
         raise HTTPException(status_code=403, detail="pair-code generation allowed from localhost only")
-    code = generate_pair_code()
+    code = await run_in_threadpool(generate_pair_code)
     return {"pair_code": code, "ttl": PAIR_CODE_TTL}
 
 
@@ -508,237 +709,119 @@ async def pair(payload: dict, request: Request):
 
     Client (extension) should POST {"code":"..."} to this endpoint. Server checks Origin header is allowed and code validity.
     """
-    cleanup_pair_codes()
     origin = request.headers.get("origin")
     if origin not in ALLOW_ORIGINS:
         raise HTTPException(status_code=403, detail="Origin not allowed")
     code = payload.get("code") if isinstance(payload, dict) else None
-    if not code or code not in PAIR_CODES:
+    # consuming is atomic: a code is accepted once even with several workers
+    if not code or not await run_in_threadpool(JOB_STORE.consume_pair_code, code):
         raise HTTPException(status_code=400, detail="Invalid or expired pair code")
-    # consume code
-    del PAIR_CODES[code]
     return {"token": SERVER_TOKEN}
 
 
+def persist_raw_output(job_id: str, stdout: str, puml: str) -> None:
+    ARTIFACT_STORE.put(job_id, {"output.txt": stdout.encode("utf-8"), "input.puml": puml.encode("utf-8")})
+    print(f"Stored raw output of job {job_id}")
+
+
 @app.post("/receive")
 async def receive(payload: dict, authorization: Optional[str] = Header(None)):
-    """Receive raw PlantUML text and print it to server console (for debugging/inspection).
+    """Receive raw PlantUML text, parse it and generate code for the requested diagram type.
 
-    Payload: { "puml": "..." }
+    Payload: { "puml": "...", "diagramType": "...", "languages": [...] }
+    Payloads with "session" / "session_id" are handled incrementally, see `receive_with_session`.
+    Parsing and generation run in the JOB_EXECUTOR process pool; a full queue answers 429.
+    Identical requests in flight or within PUML_REUSE_TTL seconds share one result ("reused": true).
     Requires Authorization header same as other endpoints.
     """
     check_auth(authorization)
+    if isinstance(payload, dict) and (payload.get("session_id") or payload.get("session")):
+        with JOB_EXECUTOR.admission():
+            return await receive_with_session(payload)
     puml = None
     if isinstance(payload, dict):
         puml = payload.get("puml")
     if not puml:
         raise HTTPException(status_code=400, detail="missing puml in payload")
-    # Print raw PUML to stdout for inspection
-    print("\n--- Received PlantUML ---\n")
-    try:
-        print('Incoming payload keys:', list(payload.keys()) if isinstance(payload, dict) else type(payload))
-    except Exception:
-        pass
-    print(puml)
-    print("\n--- End PlantUML ---\n")
-    # Debug: show sys.path so we can diagnose import issues
-    try:
-        print("sys.path:")
-        for p in sys.path:
-            print("  ", p)
-    except Exception:
-        pass
+    print('Incoming payload keys:', list(payload.keys()))
     # Prefer plugin-provided diagram type if available
-    diagram_type_hint = None
-    languages_hint = None
-    try:
-        if isinstance(payload, dict):
-            diagram_type_hint = payload.get('diagramType') or payload.get('diagram_type')
-            languages_hint = payload.get('languages') or payload.get('langs')
-    except Exception:
-        diagram_type_hint = None
-
-    if diagram_type_hint:
-        try:
-            puml2json = importlib.import_module('puml2json')
-            parsed = None
-            if diagram_type_hint == 'classes':
-                parser = puml2json.PlantUMLParser()
-                parsed = parser.parse_content(puml)
-                if parsed and parsed.get('classes'):
-                    print('\n--- forced puml2json class parser output ---\n')
-                    print(json.dumps(parsed, ensure_ascii=False, indent=2))
-                    job_id, parsed_file = persist_parsed_result(parsed, puml)
-                    plugin_result = None
-                    if diagram_type_hint and parsed_file:
-                        plugin_result = run_plugin_runner_checked(parsed_file, diagram_type_hint, languages_hint)
-                        print('plugin_runner result:', plugin_result)
-                    return {"status": "ok", "result": parsed, "job_id": job_id, "plugin": plugin_result}
-            elif diagram_type_hint == 'database':
-                parser = puml2json.DatabaseDiagramParser()
-                parsed = parser.parse(puml)
-                if parsed and parsed.get('tables'):
-                    print('\n--- forced puml2json database parser output ---\n')
-                    print(json.dumps(parsed, ensure_ascii=False, indent=2))
-                    job_id, parsed_file = persist_parsed_result(parsed, puml)
-                    plugin_result = None
-                    if diagram_type_hint and parsed_file:
-                        plugin_result = run_plugin_runner_checked(parsed_file, diagram_type_hint, languages_hint)
-                        print('plugin_runner result:', plugin_result)
-                    return {"status": "ok", "result": parsed, "job_id": job_id, "plugin": plugin_result}
-            elif diagram_type_hint == 'deployment':
-                parser = puml2json.DeploymentDiagramParser()
-                parsed = parser.parse(puml)
-                if parsed and (parsed.get('nodes') or parsed.get('connections')):
-                    print('\n--- forced puml2json deployment parser output ---\n')
-                    print(json.dumps(parsed, ensure_ascii=False, indent=2))
-                    job_id, parsed_file = persist_parsed_result(parsed, puml)
-                    plugin_result = None
-                    if diagram_type_hint and parsed_file:
-                        plugin_result = run_plugin_runner_checked(parsed_file, diagram_type_hint, languages_hint)
-                        print('plugin_runner result:', plugin_result)
-                    return {"status": "ok", "result": parsed, "job_id": job_id, "plugin": plugin_result}
-        except HTTPException:
-            raise
-        except Exception:
-            # ignore and continue to general parsing
-            traceback.print_exc()
-    # First try to parse in-process using the local puml2json module (faster, reliable)
-    # prefer the new puml_service wrapper (clean function interface)
-    try:
-        import puml_service
-        result = puml_service.parse_puml_to_json(puml)
-        print("\n--- puml_service output ---\n")
-        try:
-            print(json.dumps(result, ensure_ascii=False, indent=2))
-        except Exception:
-            print(result)
-        # Additional debug: show result type
-        try:
-            print("puml_service result type:", type(result))
-        except Exception:
-            pass
-        # Persist parsed JSON and raw PUML for inspection
-        job_id, parsed_file = persist_parsed_result(result, puml)
-        # Optionally run plugin_runner if diagram type / languages provided in payload
-        diagram_type = None
-        languages = None
-        try:
-            # payload variable is available in this scope
-            diagram_type = payload.get('diagramType') or payload.get('diagram_type')
-            languages = payload.get('languages') or payload.get('langs')
-        except Exception:
-            pass
-        plugin_result = None
-        if diagram_type and parsed_file:
-            plugin_result = run_plugin_runner_checked(parsed_file, diagram_type, languages)
-            print("plugin_runner result:", plugin_result)
-        elif diagram_type and not parsed_file:
-            plugin_result = {"status":"skipped","reason":"parsed file not available"}
-        return {"status": "ok", "result": result, "job_id": job_id, "plugin": plugin_result}
-    except HTTPException:
-        raise
-    except Exception:
-        print("\n--- puml_service import failed, falling back ---\n")
-        traceback.print_exc()
-        # fallback: try old in-process puml2json import
-        try:
-            puml2json = importlib.import_module('puml2json')
-            diagram_type = puml2json.detect_diagram_type(puml)
-            if diagram_type == 'class':
-                parser = puml2json.PlantUMLParser()
-                result = parser.parse_content(puml)
-            elif diagram_type == 'deployment':
-                parser = puml2json.DeploymentDiagramParser()
-                result = parser.parse(puml)
-            elif diagram_type == 'database':
-                parser = puml2json.DatabaseDiagramParser()
-                result = parser.parse(puml)
-            else:
-                result = {"error": "unknown diagram type"}
-
-            out = json.dumps(result, ensure_ascii=False, indent=2)
-            print("\n--- puml2json (in-process) output ---\n")
-            print(out)
-            # Persist parsed JSON and raw PUML
-            job_id, parsed_file = persist_parsed_result(result, puml)
-            diagram_type = None
-            languages = None
-            try:
-                diagram_type = payload.get('diagramType') or payload.get('diagram_type')
-                languages = payload.get('languages') or payload.get('langs')
-            except Exception:
-                pass
-            plugin_result = None
-            if diagram_type and parsed_file:
-                plugin_result = run_plugin_runner_checked(parsed_file, diagram_type, languages)
-                print("plugin_runner result:", plugin_result)
-            elif diagram_type and not parsed_file:
-                plugin_result = {"status":"skipped","reason":"parsed file not available"}
-            return {"status": "ok", "result": result, "job_id": job_id, "plugin": plugin_result}
-        except HTTPException:
-            raise
-        except Exception as e:
-            print("\n--- puml2json in-process failed ---\n")
-            print(str(e))
-            traceback.print_exc()
-            # fallback to subprocess invocation (unbuffered)
-            puml2json_path = Path(__file__).resolve().parent.parent / 'puml2json.py'
-            if not puml2json_path.exists():
-                return {"status": "ok", "warning": "puml2json.py not found and in-process import failed"}
+    diagram_type_hint = payload.get('diagramType') or payload.get('diagram_type')
+    languages_hint = payload.get('languages') or payload.get('langs')
+
+    async def compute() -> dict:
+        with JOB_EXECUTOR.admission():
+            parsed = await JOB_EXECUTOR.run(parse_received, puml, diagram_type_hint)
+            if "result" in parsed:
+                # Generate in memory if diagram type / languages are provided; the job folder is written in the background
+                generate = parsed.get("generate", True)
+                return await process_parsed_result(parsed["result"], puml, diagram_type_hint if generate else None,
+                                                   languages_hint)
+        if "output" in parsed:
+            # still persist raw stdout for inspection
+            job_id = uuid.uuid4().hex
+            schedule_persist(persist_raw_output, job_id, parsed["output"], puml)
+            return {"status": "ok", "output": parsed["output"], "note": "output not valid JSON", "job_id": job_id}
+        return {"status": "ok", "warning": parsed["warning"]}
+
+    # identical requests share one parse/generate run and its job_id
+    key = request_key("receive", puml, diagram_type_hint, languages_hint)
+    response, shared = await RECEIVE_COALESCER.run(key, compute)
+    return {**response, "reused": True} if shared else response
+
+
+@app.get("/executor/stats")
+async def executor_stats(authorization: Optional[str] = Header(None)):
+    """Pool size, admission capacity and currently admitted requests."""
+    check_auth(authorization)
+    return {**JOB_EXECUTOR.stats(), "job_store": await run_in_threadpool(JOB_STORE.stats),
+            "receive_coalescer": RECEIVE_COALESCER.stats()}
 
-            try:
-                proc = subprocess.run([sys.executable, '-u', str(puml2json_path)], input=puml.encode('utf-8'), capture_output=True, timeout=30)
-            except subprocess.TimeoutExpired:
-                raise HTTPException(status_code=500, detail="puml2json timed out")
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
 
-            stdout = proc.stdout.decode('utf-8', errors='replace') if proc.stdout else ''
-            stderr = proc.stderr.decode('utf-8', errors='replace') if proc.stderr else ''
+@app.get("/cache/stats")
+async def parse_cache_stats(authorization: Optional[str] = Header(None)):
+    """The puml_service parse cache.
 
-            print("\n--- puml2json stdout (subprocess) ---\n")
-            print(stdout)
-            if stderr:
-                print("\n--- puml2json stderr (subprocess) ---\n")
-                print(stderr)
+    Parsing runs in the pool workers, so the server process's own cache is
+    unused. "disk" is the tier shared by all workers. "worker" holds the hit/miss
+    counters and LRU size of one pool worker; they are per-process (see "pid").
+    """
+    check_auth(authorization)
+    import puml_service
+    disk = await run_in_threadpool(puml_service.disk_cache_stats)
+    worker = await JOB_EXECUTOR.run(puml_service.cache_stats)
+    return {"disk": disk, "worker": worker}
 
-            if proc.returncode != 0:
-                raise HTTPException(status_code=500, detail=f"puml2json failed: {stderr[:200]}")
 
-            try:
-                result = json.loads(stdout)
-                # Persist parsed JSON and raw PUML
-                job_id, parsed_file = persist_parsed_result(result, puml)
-                return {"status": "ok", "result": result, "job_id": job_id}
-            except Exception:
-                # still persist raw stdout for inspection
-                try:
-                    job_id = uuid.uuid4().hex
-                    job_dir = STORAGE_DIR / job_id
-                    job_dir.mkdir(parents=True, exist_ok=True)
-                    (job_dir / "output.txt").write_text(stdout, encoding="utf-8")
-                    (job_dir / "input.puml").write_text(puml, encoding="utf-8")
-                    print(f"Saved raw output to {job_dir / 'output.txt'}")
-                except Exception as _e:
-                    print("Failed to persist subprocess output:", _e)
-                return {"status": "ok", "output": stdout, "note": "output not valid JSON", "job_id": job_id}
+@app.get("/storage/stats")
+async def storage_stats(authorization: Optional[str] = Header(None)):
+    """Stored jobs, blobs and their size against the quota."""
+    check_auth(authorization)
+    return await run_in_threadpool(ARTIFACT_STORE.stats)
 
 
 @app.get("/status/{job_id}")
 async def status(job_id: str, authorization: Optional[str] = Header(None)):
     # require auth
     check_auth(authorization)
-    job = JOBS.get(job_id)
+    job = await run_in_threadpool(JOB_STORE.get, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="job not found")
     return job
 
 
+def _attachment(content: bytes, filename: str) -> Response:
+    return Response(content=content, media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
 @app.get("/files/{job_id}.zip")
 async def get_zip(job_id: str, request: Request, authorization: Optional[str] = Header(None)):
     # require token
     check_auth(authorization)
+    artifacts = recent_artifacts(job_id) or await run_in_threadpool(ARTIFACT_STORE.read, job_id)
+    if artifacts is not None:
+        return _attachment(zip_artifacts(artifacts), f"{job_id}.zip")
+    # zip written before the artifact store
     zip_path = STORAGE_DIR / f"{job_id}.zip"
     if not zip_path.exists():
         raise HTTPException(status_code=404, detail="file not found")
@@ -753,6 +836,16 @@ async def download_generated(job_id: str, authorization: Optional[str] = Header(
     - If multiple files exist, return a zip archive.
     """
     check_auth(authorization)
+    # memory first (the job may still be being stored), then the artifact store
+    artifacts = recent_artifacts(job_id) or await run_in_threadpool(ARTIFACT_STORE.read, job_id)
+    if artifacts is not None:
+        generated = generated_files(artifacts)
+        if len(generated) == 1:
+            name, content = next(iter(generated.items()))
+            return _attachment(content, name)
+        if generated:
+            return _attachment(zip_artifacts(generated), f"{job_id}_generated.zip")
+
     files = collect_generated_files(job_id)
     if not files:
         raise HTTPException(status_code=404, detail="generated files not found")
@@ -2,8 +2,25 @@
 
 This module re-uses parsers defined in `puml2json.py` and exposes a simple
 function `parse_puml_to_json(puml: str) -> dict` suitable for server integration.
+
+`parse_puml_batch` handles documents holding several `@startuml ... @enduml`
+blocks: every block is classified and parsed separately on a process pool.
+
+Results of `parse_puml_to_json` and `parse_puml_as` are cached by a hash of
+the normalized PUML, the parser version and, for `parse_puml_as`, the diagram
+type: an in-process LRU bounded by bytes in front of an on-disk store that
+survives restarts and is bounded by PUML_PARSE_CACHE_DISK_BYTES (see
+`ParseCache`, `cache_stats`, `disk_cache_stats`).
 """
-from typing import Dict, Any
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
 
 try:
     from puml2json import (
@@ -11,6 +28,7 @@ try:
         PlantUMLParser,
         DeploymentDiagramParser,
         DatabaseDiagramParser,
+        PARSER_VERSION,
     )
 except Exception as e:
     # If import fails, raise on usage time
@@ -18,6 +36,193 @@ except Exception as e:
     PlantUMLParser = None
     DeploymentDiagramParser = None
     DatabaseDiagramParser = None
+    PARSER_VERSION = None
+
+CACHE_DIR = Path(os.getenv("PUML_PARSE_CACHE_DIR", str(Path(__file__).resolve().parent / "puml_server" / "storage" / "parse_cache")))
+CACHE_MAX_BYTES = int(os.getenv("PUML_PARSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+CACHE_DISK_MAX_BYTES = int(os.getenv("PUML_PARSE_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+# the disk tier is rescanned after this many writes, to account for other processes sharing it
+DISK_RESCAN_WRITES = 256
+
+
+def normalize_puml(puml: str) -> str:
+    """Normalize line endings (CRLF and lone CR become LF) and drop trailing blank lines.
+
+    The parsers get the normalized text, so a cached result always matches
+    what parsing the text would give.
+    """
+    return puml.replace('\r\n', '\n').replace('\r', '\n').rstrip('\n')
+
+
+def cache_key(puml: str, diagram_type: Optional[str] = None) -> str:
+    """Key of a parse result; `diagram_type` is set for a parse forced to that type."""
+    digest = hashlib.sha256()
+    digest.update(f"puml2json/{PARSER_VERSION}\n".encode("utf-8"))
+    if diagram_type:
+        digest.update(f"forced/{diagram_type}\n".encode("utf-8"))
+    digest.update(normalize_puml(puml).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Two-tier cache of serialized parse results.
+
+    Tier 1 is an LRU of JSON bytes bounded by `max_bytes`, private to the
+    process; tier 2 is one file per key under `disk_dir` (sharded by the first
+    two hex digits), written atomically and shared by all processes. Entries
+    are stored serialized, so callers always get a fresh copy they may mutate.
+
+    The disk tier is bounded by `disk_max_bytes`: disk hits refresh the file
+    mtime, and when the tier grows past the limit the least recently used
+    files are deleted down to 90% of it.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, disk_dir: Optional[Path] = CACHE_DIR,
+                 disk_max_bytes: int = CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        # estimate of the disk tier size; None until the first scan
+        self._disk_bytes: Optional[int] = None
+        self._disk_writes = 0
+        self._disk_lock = threading.Lock()
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(payload)
+
+        payload = self._read_disk(key)
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, payload)
+        return json.loads(payload)
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        payload = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            self._remember(key, payload)
+        self._write_disk(key, payload)
+
+    def stats(self) -> Dict[str, Any]:
+        """Lookup counters and LRU size of this process."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remember(self, key: str, payload: bytes) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = payload
+        self._bytes += len(payload)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            payload = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return payload
+
+    def _scan_disk(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        for path in self.disk_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def disk_stats(self) -> Dict[str, Any]:
+        """Size of the disk tier (shared by all processes using `disk_dir`)."""
+        if self.disk_dir is None:
+            return {"entries": 0, "bytes": 0, "max_bytes": self.disk_max_bytes}
+        entries = self._scan_disk()
+        return {"entries": len(entries), "bytes": sum(size for _, size, _ in entries), "max_bytes": self.disk_max_bytes}
+
+    def _trim_disk(self) -> None:
+        entries = self._scan_disk()
+        total = sum(size for _, size, _ in entries)
+        if total > self.disk_max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.disk_max_bytes * 0.9:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                total -= size
+        self._disk_bytes = total
+
+    def _write_disk(self, key: str, payload: bytes) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(payload)
+            os.replace(tmp, path)
+        except OSError as e:
+            print("Failed to write parse cache entry:", e)
+            return
+        with self._disk_lock:
+            self._disk_writes += 1
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(payload)
+            if (self._disk_bytes is None or self._disk_bytes > self.disk_max_bytes
+                    or self._disk_writes % DISK_RESCAN_WRITES == 0):
+                self._trim_disk()
+
+
+PARSE_CACHE = ParseCache()
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters and LRU size of this process's parse cache."""
+    return {"pid": os.getpid(), **PARSE_CACHE.stats()}
+
+
+def disk_cache_stats() -> Dict[str, Any]:
+    """Size of the on-disk parse cache shared by all processes."""
+    return PARSE_CACHE.disk_stats()
 
 
 def parse_puml_to_json(puml: str) -> Dict[str, Any]:
@@ -31,19 +236,141 @@ def parse_puml_to_json(puml: str) -> Dict[str, Any]:
     if detect_diagram_type is None:
         return {"error": "puml2json module not importable"}
 
+    key = cache_key(puml)
+    cached = PARSE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
     try:
-        diagram_type = detect_diagram_type(puml)
-        if diagram_type == "class":
-            parser = PlantUMLParser()
-            result = parser.parse_content(puml)
-        elif diagram_type == "deployment":
-            parser = DeploymentDiagramParser()
-            result = parser.parse(puml)
-        elif diagram_type == "database":
-            parser = DatabaseDiagramParser()
-            result = parser.parse(puml)
-        else:
-            result = {"error": "unknown diagram type"}
-        return result
+        result = _parse_typed(normalize_puml(puml))[1]
     except Exception as e:
         return {"error": f"parsing failed: {e}"}
+    if "error" not in result:
+        PARSE_CACHE.put(key, result)
+    return result
+
+
+# Parser class and content check for a diagram type named as the plugin names it
+# (the class is None when puml2json could not be imported)
+FORCED_PARSERS = {
+    "classes": (PlantUMLParser, lambda model: bool(model.classes)),
+    "database": (DatabaseDiagramParser, lambda model: bool(model.tables)),
+    "deployment": (DeploymentDiagramParser, lambda model: bool(model.nodes or model.connections)),
+}
+
+
+def parse_puml_as(puml: str, diagram_type: str) -> Optional[Dict[str, Any]]:
+    """Parse PlantUML with the parser of `diagram_type` ("classes", "database",
+    "deployment"), skipping type detection.
+
+    Returns None when the text has no elements of that type (or the type is
+    unknown, or puml2json is not importable). Results are cached like
+    `parse_puml_to_json`, keyed by the type too.
+    """
+    parser_class, has_content = FORCED_PARSERS.get(diagram_type, (None, None))
+    if parser_class is None:
+        return None
+    key = cache_key(puml, diagram_type)
+    cached = PARSE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    model = parser_class().parse_model(normalize_puml(puml).split("\n"))
+    if not has_content(model):
+        return None
+    result = model.to_json()
+    PARSE_CACHE.put(key, result)
+    return result
+
+
+def _parse_typed(puml: str) -> Tuple[str, Dict[str, Any]]:
+    diagram_type = detect_diagram_type(puml)
+    if diagram_type == "class":
+        parser = PlantUMLParser()
+        result = parser.parse_content(puml)
+    elif diagram_type == "deployment":
+        parser = DeploymentDiagramParser()
+        result = parser.parse(puml)
+    elif diagram_type == "database":
+        parser = DatabaseDiagramParser()
+        result = parser.parse(puml)
+    else:
+        result = {"error": "unknown diagram type"}
+    return diagram_type, result
+
+
+def split_diagrams(text: str) -> List[str]:
+    """Split a document into its `@startuml ... @enduml` blocks.
+
+    Text without any `@startuml` is returned as a single block; an unclosed
+    last block runs to the end of the text.
+    """
+    blocks = []
+    current = None
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped.startswith('@startuml'):
+            current = [line]
+        elif current is not None:
+            current.append(line)
+            if stripped.startswith('@enduml'):
+                blocks.append(''.join(current))
+                current = None
+    if current is not None:
+        blocks.append(''.join(current))
+    if not blocks and '@startuml' not in text:
+        blocks.append(text)
+    return blocks
+
+
+def _parse_block_task(task: Tuple[str, int, str]) -> Dict[str, Any]:
+    """Process-pool worker: classify and parse one diagram block."""
+    source, index, puml = task
+    started = time.perf_counter()
+    try:
+        diagram_type, result = _parse_typed(puml)
+    except Exception as e:
+        diagram_type, result = "unknown", {"error": f"parsing failed: {e}"}
+    return {
+        "source": source,
+        "index": index,
+        "diagram_type": diagram_type,
+        "result": result,
+        "lines": len(puml.splitlines()),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def parse_puml_batch(documents: Dict[str, str], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Parse every diagram block of every document.
+
+    `documents` maps a source name (e.g. a file path) to its text. Returns one
+    entry per block, ordered by source and block position, with its
+    `diagram_type`, parsed `result` and `elapsed_ms`. Blocks are parsed on a
+    ProcessPoolExecutor sized to the CPU count; `max_workers=1` parses
+    in-process.
+    """
+    if detect_diagram_type is None:
+        return [{"error": "puml2json module not importable"}]
+
+    tasks = [
+        (source, index, block)
+        for source, text in documents.items()
+        for index, block in enumerate(split_diagrams(text))
+    ]
+    workers = min(max_workers or os.cpu_count() or 1, len(tasks) or 1)
+    if workers <= 1:
+        return [_parse_block_task(task) for task in tasks]
+
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_parse_block_task, tasks, chunksize=chunksize))
+
+
+def parse_puml_files(paths: List[str], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """`parse_puml_batch` over files on disk, keyed by path."""
+    documents = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            documents[str(path)] = f.read()
+    return parse_puml_batch(documents, max_workers=max_workers)
@@ -0,0 +1,330 @@
+"""Incremental parse sessions for live editor traffic.
+
+A `ParseSession` keeps the lines, per-line lexer tokens and parsed blocks of
+one document. The client sends only the changed line ranges; the session
+re-parses the class / entity / node blocks touched by the edit, splices them
+into the block list and patches cross-block references (inheritance, the
+`on` column of database relationships) instead of rebuilding the model.
+
+Sessions are kept in a small in-process LRU registry (`open_session`,
+`get_session`).
+"""
+import os
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from puml2json import (
+    detect_diagram_type,
+    PlantUMLParser,
+    DeploymentDiagramParser,
+    DatabaseDiagramParser,
+    TOKEN_CLASS,
+    TOKEN_CLOSE,
+)
+from schema_index import SchemaIndex
+from model_ir import ClassModel, Table, TableRelationship
+
+MAX_SESSIONS = int(os.getenv("PUML_MAX_SESSIONS", "64"))
+
+PARSERS = {
+    "class": PlantUMLParser,
+    "database": DatabaseDiagramParser,
+    "deployment": DeploymentDiagramParser,
+}
+
+# diagram type names used by the extension -> puml2json names
+DIAGRAM_TYPE_ALIASES = {"classes": "class", "database": "database", "deployment": "deployment"}
+
+
+def _remove_item(items: list, item: Any) -> None:
+    """Remove `item` by identity (equal records from other blocks must stay)."""
+    for index, candidate in enumerate(items):
+        if candidate is item:
+            del items[index]
+            return
+
+
+class _Block:
+    """Contiguous line range parsed as one unit (a class/entity body or a single top-level line)."""
+
+    __slots__ = ("start", "end", "events")
+
+    def __init__(self, start: int, end: int, events: List[Tuple[str, Any]]):
+        self.start = start
+        self.end = end
+        self.events = events
+
+
+class ParseSession:
+    """Parsed model of one document that can be updated by line-range edits."""
+
+    def __init__(self, text: str, diagram_type: Optional[str] = None):
+        diagram_type = DIAGRAM_TYPE_ALIASES.get(diagram_type, diagram_type) or detect_diagram_type(text)
+        if diagram_type not in PARSERS:
+            raise ValueError(f"unsupported diagram type: {diagram_type}")
+        self.session_id = uuid.uuid4().hex
+        self.diagram_type = diagram_type
+        self.version = 0
+        self.lines: List[str] = []
+        self.tokens: List[list] = []
+        self.blocks: List[_Block] = []
+        self.lexer = PlantUMLParser().lexer
+
+        # cross-block indexes used to patch references
+        self.class_index: Dict[str, List[ClassModel]] = {}
+        self.inherit_edges: Dict[str, List[Tuple[_Block, int, str]]] = {}
+        self.table_index: Dict[str, List[Tuple[_Block, Table]]] = {}
+        self.rels_by_target: Dict[str, List[TableRelationship]] = {}
+
+        self.apply_edit(0, 0, text.split('\n'))
+
+    # ------------------------------------------------------------
+    #   Public API
+    # ------------------------------------------------------------
+    def text(self) -> str:
+        return '\n'.join(self.lines)
+
+    def apply_edits(self, edits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply edits [{"start", "end", "lines"}] in order and return the updated model."""
+        for edit in edits:
+            self.apply_edit(int(edit["start"]), int(edit["end"]), list(edit.get("lines") or []))
+        self.version += 1
+        return self.to_json()
+
+    def apply_edit(self, start: int, end: int, new_lines: List[str]) -> None:
+        """Replace lines [start, end) with `new_lines` and re-parse the affected blocks."""
+        if not 0 <= start <= end <= len(self.lines):
+            raise ValueError(f"edit range {start}:{end} is out of bounds for {len(self.lines)} lines")
+
+        delta = len(new_lines) - (end - start)
+        self.lines[start:end] = new_lines
+        if self.diagram_type == "class":
+            self.tokens[start:end] = [self.lexer.lex_line(line) for line in new_lines]
+
+        # A block that was not closed before the edit may absorb the new lines,
+        # so re-parsing starts at the block holding the line before the edit.
+        first = self._find_block(max(start - 1, 0))
+        pos = self.blocks[first].start if first < len(self.blocks) else 0
+        edit_end = start + len(new_lines)
+
+        keep = first
+        while keep < len(self.blocks) and self.blocks[keep].start < end:
+            keep += 1
+
+        new_blocks = []
+        total = len(self.lines)
+        while pos < total:
+            # Resynchronise with the old segmentation once past the edit
+            while keep < len(self.blocks) and self.blocks[keep].start + delta < pos:
+                keep += 1
+            if pos >= edit_end and keep < len(self.blocks) and self.blocks[keep].start + delta == pos:
+                break
+            block_end = self._block_end(pos)
+            new_blocks.append(self._parse_block(pos, block_end))
+            pos = block_end
+        else:
+            keep = len(self.blocks)
+
+        removed = self.blocks[first:keep]
+        self.blocks[first:keep] = new_blocks
+        if delta:
+            for block in self.blocks[first + len(new_blocks):]:
+                block.start += delta
+                block.end += delta
+
+        self._patch_references(removed, new_blocks)
+
+    def to_json(self) -> Dict[str, Any]:
+        return self.to_model().to_json()
+
+    def to_model(self):
+        """Current document as a model_ir diagram (records are shared with the session)."""
+        model = PARSERS[self.diagram_type].MODEL()
+        seen_nodes = set()
+        for block in self.blocks:
+            for section, item in block.events:
+                if section == "nodes":
+                    if item.name in seen_nodes:
+                        continue
+                    seen_nodes.add(item.name)
+                getattr(model, section).append(item)
+        if self.diagram_type == "class":
+            referenced = {}
+            for rel in model.relationships:
+                referenced[rel.source] = None
+                referenced[rel.target] = None
+            model.unresolved = [name for name in referenced if not self.class_index.get(name)]
+        return model
+
+    # ------------------------------------------------------------
+    #   Segmentation
+    # ------------------------------------------------------------
+    def _find_block(self, line: int) -> int:
+        lo, hi = 0, len(self.blocks)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.blocks[mid].end <= line:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _block_end(self, pos: int) -> int:
+        """Exclusive end of the block starting at `pos`, mirroring the parsers' state machines."""
+        if self.diagram_type == "class":
+            return self._class_block_end(pos)
+        if self.diagram_type == "database":
+            return self._entity_block_end(pos)
+        return pos + 1
+
+    def _class_block_end(self, pos: int) -> int:
+        kinds = [token.kind for token in self.tokens[pos]]
+        if TOKEN_CLASS not in kinds:
+            return pos + 1
+        if TOKEN_CLOSE in kinds:
+            return pos + 1
+        for i in range(pos + 1, len(self.lines)):
+            kinds = [token.kind for token in self.tokens[i]]
+            if TOKEN_CLASS in kinds:
+                return i
+            if TOKEN_CLOSE in kinds:
+                return i + 1
+        return len(self.lines)
+
+    def _entity_block_end(self, pos: int) -> int:
+        line = self.lines[pos].strip()
+        match = DatabaseDiagramParser.ENTITY_PATTERN.match(line)
+        if not match:
+            return pos + 1
+
+        i = pos
+        if not match.group(2):
+            # "entity X" without "{": the body must start on the next non-empty line
+            i = pos + 1
+            while i < len(self.lines) and not self.lines[i].strip():
+                i += 1
+            if i >= len(self.lines) or not self.lines[i].strip().startswith('{'):
+                return i
+            rest = self.lines[i].strip()[1:]
+        else:
+            rest = line[match.end():]
+
+        if '}' in rest:
+            return i + 1
+        for j in range(i + 1, len(self.lines)):
+            if '}' in self.lines[j]:
+                return j + 1
+        return len(self.lines)
+
+    def _parse_block(self, start: int, end: int) -> _Block:
+        parser = PARSERS[self.diagram_type]()
+        if self.diagram_type == "class":
+            tokens = [token for line_tokens in self.tokens[start:end] for token in line_tokens]
+            # unresolved names are computed for the whole document in to_json
+            events = [event for event in parser.parse_token_stream(tokens) if event[0] != "unresolved"]
+        else:
+            events = list(parser.parse_stream(self.lines[start:end]))
+        return _Block(start, end, events)
+
+    # ------------------------------------------------------------
+    #   Reference patching
+    # ------------------------------------------------------------
+    def _patch_references(self, removed: List[_Block], added: List[_Block]) -> None:
+        if self.diagram_type == "class":
+            self._patch_inheritance(removed, added)
+        elif self.diagram_type == "database":
+            self._patch_foreign_keys(removed, added)
+
+    def _patch_inheritance(self, removed: List[_Block], added: List[_Block]) -> None:
+        affected = set()
+        for block in removed:
+            for section, item in block.events:
+                if section == "classes":
+                    _remove_item(self.class_index[item.name], item)
+                elif item.type == "inheritance":
+                    edges = self.inherit_edges[item.source]
+                    edges[:] = [edge for edge in edges if edge[0] is not block]
+                    affected.add(item.source)
+
+        for block in added:
+            for seq, (section, item) in enumerate(block.events):
+                if section == "classes":
+                    self.class_index.setdefault(item.name, []).append(item)
+                    affected.add(item.name)
+                elif item.type == "inheritance":
+                    self.inherit_edges.setdefault(item.source, []).append((block, seq, item.target))
+                    affected.add(item.source)
+
+        for name in affected:
+            edges = self.inherit_edges.get(name)
+            # the last inheritance line in document order wins, as in a full parse
+            parent = max(edges, key=lambda edge: (edge[0].start, edge[1]))[2] if edges else None
+            for cls in self.class_index.get(name, ()):
+                cls.inherits = parent
+
+    def _patch_foreign_keys(self, removed: List[_Block], added: List[_Block]) -> None:
+        affected = set()
+        for block in removed:
+            for section, item in block.events:
+                if section == "tables":
+                    tables = self.table_index[item.name]
+                    tables.remove(next(entry for entry in tables if entry[1] is item))
+                    affected.add(item.name)
+                else:
+                    _remove_item(self.rels_by_target[item.target], item)
+
+        new_rels = []
+        for block in added:
+            for section, item in block.events:
+                if section == "tables":
+                    self.table_index.setdefault(item.name, []).append((block, item))
+                    affected.add(item.name)
+                else:
+                    self.rels_by_target.setdefault(item.target, []).append(item)
+                    new_rels.append(item)
+
+        schemas = {}
+        for name in affected:
+            schemas[name] = self._table_schema(name)
+            for rel in self.rels_by_target.get(name, ()):
+                DatabaseDiagramParser.resolve_on(rel, schemas[name])
+        for rel in new_rels:
+            if rel.target not in schemas:
+                schemas[rel.target] = self._table_schema(rel.target)
+            DatabaseDiagramParser.resolve_on(rel, schemas[rel.target])
+
+    def _table_schema(self, table_name: str) -> SchemaIndex:
+        """Schema index of the tables declared under `table_name`, in document order.
+
+        A later declaration replaces an earlier one, so `resolve_on` applies
+        the same rule as the full parse.
+        """
+        tables = sorted(self.table_index.get(table_name, ()), key=lambda entry: entry[0].start)
+        return SchemaIndex([table for _, table in tables], store_columns=False)
+
+
+# ============================================================
+#   Session registry
+# ============================================================
+_SESSIONS: "OrderedDict[str, ParseSession]" = OrderedDict()
+
+
+def open_session(text: str, diagram_type: Optional[str] = None) -> ParseSession:
+    """Parse `text` fully and register a new session for it."""
+    session = ParseSession(text, diagram_type)
+    _SESSIONS[session.session_id] = session
+    while len(_SESSIONS) > MAX_SESSIONS:
+        _SESSIONS.popitem(last=False)
+    return session
+
+
+def get_session(session_id: str) -> Optional[ParseSession]:
+    session = _SESSIONS.get(session_id)
+    if session is not None:
+        _SESSIONS.move_to_end(session_id)
+    return session
+
+
+def close_session(session_id: str) -> None:
+    _SESSIONS.pop(session_id, None)
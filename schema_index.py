@@ -0,0 +1,94 @@
+"""Индекс схемы базы данных.
+
+`SchemaIndex` строится один раз на модель и используется парсером (поиск
+колонки "on" для связей), валидатором (ссылочная целостность внешних ключей)
+и SQL-генераторами (список внешних ключей таблицы). Все выборки — O(1).
+"""
+from typing import Dict, Any, List, Optional, Iterable, Tuple, NamedTuple
+
+from model_ir import Table, Column, as_model
+
+
+class ForeignKeyRef(NamedTuple):
+    """Внешний ключ таблицы: колонка name ссылается на references.column"""
+    name: str
+    references: str
+    column: str
+
+
+class SchemaIndex:
+    """Таблица -> колонки, первичные ключи и прямые/обратные рёбра внешних ключей.
+
+    С store_columns=False хранятся только имена и рёбра, без ссылок на сами
+    записи колонок: так потоковый парсер не удерживает всю схему в памяти.
+    """
+
+    def __init__(self, tables: Iterable[Table] = (), store_columns: bool = True):
+        self.store_columns = store_columns
+        self.tables: Dict[str, Table] = {}
+        self.columns: Dict[str, Dict[str, Column]] = {}
+        self.primary_keys: Dict[str, List[str]] = {}
+        self.foreign_keys: Dict[str, List[ForeignKeyRef]] = {}
+        self.referenced_by: Dict[str, List[Tuple[str, str]]] = {}
+        self._fk_by_target: Dict[Tuple[str, str], str] = {}
+        for table in tables:
+            self.add_table(table)
+
+    @classmethod
+    def from_model(cls, data: Any) -> "SchemaIndex":
+        """Индекс по DatabaseDiagram (или её JSON-представлению)"""
+        return cls(as_model(data).tables)
+
+    def add_table(self, table: Table) -> None:
+        """Добавляет (или заменяет) таблицу в индексе"""
+        name = table.name
+        if name in self.primary_keys:
+            self._drop_table(name)
+
+        primary_keys = []
+        foreign_keys = []
+        columns = {}
+        for column in table.columns:
+            columns[column.name] = column
+            if column.primary_key:
+                primary_keys.append(column.name)
+            fk = column.foreign_key
+            if fk is not None:
+                foreign_keys.append(ForeignKeyRef(column.name, fk.references, fk.column))
+                self.referenced_by.setdefault(fk.references, []).append((name, column.name))
+                self._fk_by_target.setdefault((name, fk.references), column.name)
+
+        if self.store_columns:
+            self.tables[name] = table
+            self.columns[name] = columns
+        self.primary_keys[name] = primary_keys
+        self.foreign_keys[name] = foreign_keys
+
+    def _drop_table(self, name: str) -> None:
+        for fk in self.foreign_keys.pop(name, ()):
+            edges = self.referenced_by[fk.references]
+            edges.remove((name, fk.name))
+            self._fk_by_target.pop((name, fk.references), None)
+        self.primary_keys.pop(name, None)
+        self.tables.pop(name, None)
+        self.columns.pop(name, None)
+
+    def has_table(self, name: str) -> bool:
+        return name in self.primary_keys
+
+    def column(self, table: str, column: str) -> Optional[Column]:
+        return self.columns.get(table, {}).get(column)
+
+    def on_column(self, source: str, target: str) -> Optional[str]:
+        """Колонка таблицы target, ссылающаяся внешним ключом на таблицу source"""
+        return self._fk_by_target.get((target, source))
+
+    def dangling_foreign_keys(self) -> List[Tuple[str, ForeignKeyRef]]:
+        """Внешние ключи, ссылающиеся на несуществующую таблицу или колонку"""
+        dangling = []
+        for table, foreign_keys in self.foreign_keys.items():
+            for fk in foreign_keys:
+                target_columns = self.columns.get(fk.references)
+                if target_columns is None or fk.column not in target_columns:
+                    dangling.append((table, fk))
+        return dangling
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+import zipfile
+
+from artifact_store import ArtifactStore, digest_of
+
+
+def blob_refs(store, content):
+    row = store._connection().execute("SELECT refs FROM blobs WHERE digest = ?", (digest_of(content),)).fetchone()
+    return row[0] if row is not None else None
+
+
+def test_shared_blob_is_kept_until_its_last_job_goes(tmp_path):
+    store = ArtifactStore(tmp_path, quota=0)
+    store.put("a", {"input.puml": b"shared", "a.py": b"only a"})
+    store.put("b", {"input.puml": b"shared", "b.py": b"only b"})
+    assert blob_refs(store, b"shared") == 2
+
+    store.delete("a")
+    assert store.collect() == {"jobs": 0, "blobs": 1, "bytes": len(b"only a")}
+    assert blob_refs(store, b"shared") == 1
+    assert store.read("b") == {"input.puml": b"shared", "b.py": b"only b"}
+
+    store.delete("b")
+    store.collect()
+    assert store.stats()["blobs"] == 0
+    assert not store.blob_path(digest_of(b"shared")).exists()
+
+
+def test_same_content_twice_in_one_job_counts_once(tmp_path):
+    store = ArtifactStore(tmp_path, quota=0)
+    store.put("a", {"x": b"same", "y": b"same"})
+    assert blob_refs(store, b"same") == 1
+    store.delete("a")
+    store.collect()
+    assert blob_refs(store, b"same") is None
+
+
+def test_put_replaces_the_manifest(tmp_path):
+    store = ArtifactStore(tmp_path, quota=0)
+    store.put("a", {"input.puml": b"kept", "out.py": b"old"})
+    store.put("a", {"input.puml": b"kept", "out.py": b"new"})
+    assert blob_refs(store, b"kept") == 1
+    assert blob_refs(store, b"old") == 0
+
+    assert store.collect()["blobs"] == 1
+    assert store.read("a") == {"input.puml": b"kept", "out.py": b"new"}
+    assert store.stats()["jobs"] == 1
+
+
+def test_collect_expires_jobs_by_ttl(tmp_path):
+    store = ArtifactStore(tmp_path, ttl=100, quota=0)
+    now = time.time()
+    store.put("old", {"f": b"old"}, created_at=now - 200)
+    store.put("new", {"f": b"new"}, created_at=now)
+    assert store.collect(now=now) == {"jobs": 1, "blobs": 1, "bytes": 3}
+    assert store.manifest("old") is None
+    assert store.read("new") == {"f": b"new"}
+
+
+def test_collect_evicts_oldest_jobs_over_quota(tmp_path):
+    store = ArtifactStore(tmp_path, quota=250)
+    now = time.time()
+    for i in range(5):
+        store.put(f"j{i}", {"shared": b"s" * 100, "own": bytes([i]) * 100}, created_at=now + i)
+
+    # 600 bytes: evicting j0..j2 frees only their own blobs, j3 brings it to 200
+    assert store.collect(now=now) == {"jobs": 4, "blobs": 4, "bytes": 400}
+    assert [store.manifest(f"j{i}") is not None for i in range(5)] == [False] * 4 + [True]
+    assert store.stats()["bytes"] == 200
+    assert store.read("j4") == {"shared": b"s" * 100, "own": bytes([4]) * 100}
+
+
+def make_legacy_jobs(root, count):
+    job_ids = [f"{i:032x}" for i in range(count)]
+    for job_id in job_ids:
+        run = root / job_id / "plugin_outputs" / "run1"
+        run.mkdir(parents=True)
+        (root / job_id / "input.puml").write_bytes(b"@startuml\n@enduml")
+        (root / job_id / f"{job_id}_generated.zip").write_bytes(b"bundle")
+        (run / "classes.py").write_bytes(job_id.encode())
+        with zipfile.ZipFile(root / f"{job_id}.zip", "w") as z:
+            z.writestr("classes.py", job_id)
+    return job_ids
+
+
+def test_migrate_legacy_imports_and_removes_folders(tmp_path):
+    job_id, = make_legacy_jobs(tmp_path, 1)
+    with zipfile.ZipFile(tmp_path / f"{'f' * 32}.zip", "w") as z:
+        z.writestr("out.sql", "CREATE TABLE t;")
+    old = time.time() - 3600
+    os.utime(tmp_path / job_id, (old, old))
+
+    store = ArtifactStore(tmp_path, quota=0)
+    assert store.migrate_legacy() == 2
+    assert store.read(job_id) == {"input.puml": b"@startuml\n@enduml", "classes.py": job_id.encode()}
+    assert store.read("f" * 32) == {"out.sql": b"CREATE TABLE t;"}
+    assert sorted(path.name for path in tmp_path.iterdir() if not path.name.startswith("artifacts.")) == ["blobs"]
+    created_at = store._connection().execute("SELECT created_at FROM manifests WHERE job_id = ?", (job_id,)).fetchone()[0]
+    assert created_at == old
+
+
+def test_concurrent_migrations_do_not_fail(tmp_path):
+    job_ids = make_legacy_jobs(tmp_path, 40)
+    stores = [ArtifactStore(tmp_path, quota=0) for _ in range(4)]
+    errors = []
+
+    def migrate(store):
+        try:
+            store.migrate_legacy()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=migrate, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert all(stores[0].read(job_id)["classes.py"] == job_id.encode() for job_id in job_ids)
+    assert not any((tmp_path / job_id).exists() or (tmp_path / f"{job_id}.zip").exists() for job_id in job_ids)
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+import model_binary
+from conftest import ROOT
+from model_ir import (
+    Attribute, Method, ClassModel, Relationship, ClassDiagram,
+    Column, ForeignKey, Table, TableRelationship, DatabaseDiagram,
+    Node, Connection, DeploymentDiagram, as_model,
+)
+from puml2json import DatabaseDiagramParser, DeploymentDiagramParser, PlantUMLParser
+
+
+def class_diagram():
+    return ClassDiagram(
+        [
+            ClassModel("Base", [Attribute("id", "int")], [Method("save", "None", [])]),
+            ClassModel("Книга", [Attribute("title", "str"), Attribute("tags", "List[str]")],
+                       [Method("rename", "bool", [Attribute("title", "str"), Attribute("force", "bool")])],
+                       inherits="Base"),
+            ClassModel("Empty"),
+        ],
+        [Relationship("inheritance", "Книга", "Base"), Relationship("association", "Empty", "Base", "one-to-many")],
+        ["Missing"],
+    )
+
+
+def database_diagram():
+    columns = [
+        Column(f"c{flags}", "INT", primary_key=bool(flags & 1), auto_increment=bool(flags & 2),
+               not_null=bool(flags & 4), foreign_key=ForeignKey("Users", "id") if flags & 8 else None)
+        for flags in range(16)
+    ]
+    return DatabaseDiagram(
+        [Table("Users", [Column("id", "SERIAL", primary_key=True)]), Table("Flags", columns), Table("Empty")],
+        [TableRelationship("one-to-many", "Users", "Flags", "c8"), TableRelationship("many-to-many", "Users", "Empty")],
+    )
+
+
+def deployment_diagram():
+    return DeploymentDiagram(
+        [Node("web"), Node("db")],
+        [Connection("web", "db", "tcp:5432"), Connection("db", "web", None), Connection("web", "web", "")],
+    )
+
+
+MODELS = [class_diagram, database_diagram, deployment_diagram]
+SAMPLES = [("classes.puml", PlantUMLParser), ("db.puml", DatabaseDiagramParser), ("docker.puml", DeploymentDiagramParser)]
+
+
+@pytest.mark.parametrize("build", MODELS)
+def test_round_trip(build):
+    model = build()
+    restored = model_binary.loads(model_binary.dumps(model))
+    assert type(restored) is type(model)
+    assert restored == model
+
+
+@pytest.mark.parametrize("filename, parser", SAMPLES)
+def test_round_trip_of_parsed_samples(filename, parser):
+    model = parser().parse_model((ROOT / filename).read_text(encoding="utf-8").split('\n'))
+    data = model_binary.dumps(model)
+    assert model_binary.loads(data) == model
+    # the JSON form of the model encodes to the same bytes
+    assert model_binary.dumps(model.to_json()) == data
+    assert as_model(model.to_json()) == model
+
+
+def test_none_fields_and_foreign_key_flags():
+    database = model_binary.loads(model_binary.dumps(database_diagram()))
+    columns = database.tables[1].columns
+    assert [(c.primary_key, c.auto_increment, c.not_null, c.foreign_key) for c in columns] == [
+        (bool(f & 1), bool(f & 2), bool(f & 4), ForeignKey("Users", "id") if f & 8 else None) for f in range(16)]
+    assert [rel.on for rel in database.relationships] == ["c8", None]
+
+    classes = model_binary.loads(model_binary.dumps(class_diagram())).classes
+    assert [cls.inherits for cls in classes] == [None, "Base", None]
+    connections = model_binary.loads(model_binary.dumps(deployment_diagram())).connections
+    assert [conn.label for conn in connections] == ["tcp:5432", None, ""]
+
+
+@pytest.mark.parametrize("build", MODELS)
+def test_open_model_indexes_sections_lazily(tmp_path, build):
+    model = build()
+    path = model_binary.dump(model, tmp_path / model_binary.MODEL_FILENAME)
+    with model_binary.open_model(path) as lazy:
+        assert lazy.model_type is type(model)
+        for name in model.SECTIONS:
+            expected = getattr(model, name)
+            section = getattr(lazy, name)
+            assert len(section) == len(expected)
+            for index in range(-len(expected), len(expected)):
+                assert section[index] == expected[index]
+            for window in (slice(None), slice(1, None), slice(None, -1), slice(-2, None), slice(None, None, -1),
+                           slice(None, None, 2), slice(5, 1), slice(-100, 100)):
+                assert section[window] == expected[window]
+            assert list(section) == expected
+            for outside in (len(expected), -len(expected) - 1):
+                with pytest.raises(IndexError):
+                    section[outside]
+        assert lazy.to_model() == model
+        assert list(lazy.iter_records()) == [(name, item) for name in model.SECTIONS for item in getattr(model, name)]
+
+
+def test_load_any_reads_binary_and_json(tmp_path):
+    model = class_diagram()
+    path = model_binary.dump(model, tmp_path / model_binary.MODEL_FILENAME)
+    assert model_binary.is_binary_model(path)
+    assert model_binary.load_any(path) == model
+
+    json_path = tmp_path / "parsed.json"
+    json_path.write_text(json.dumps(model.to_json()), encoding="utf-8")
+    assert not model_binary.is_binary_model(json_path)
+    assert model_binary.load_any(json_path) == model.to_json()
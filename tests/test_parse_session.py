@@ -0,0 +1,47 @@
+"""ParseSession after random edits must match a full parse of the same text."""
+import random
+
+import pytest
+
+from conftest import ROOT
+from puml_session import PARSERS, ParseSession
+
+DIAGRAMS = [("classes.puml", "class"), ("db.puml", "database"), ("docker.puml", "deployment")]
+TRIALS = 200
+EDITS_PER_TRIAL = 6
+
+
+def full_parse(diagram_type, text):
+    return PARSERS[diagram_type]().parse_lines(text.split('\n'))
+
+
+@pytest.mark.parametrize("filename, diagram_type", DIAGRAMS)
+def test_random_edits_match_full_parse(filename, diagram_type):
+    source = (ROOT / filename).read_text(encoding="utf-8")
+    # the edits reuse lines of the document, so blocks get split, merged and redeclared
+    pool = source.split('\n')
+    for trial in range(TRIALS):
+        rnd = random.Random(trial)
+        session = ParseSession(source, diagram_type)
+        for _ in range(EDITS_PER_TRIAL):
+            start = rnd.randint(0, len(session.lines))
+            end = min(len(session.lines), start + rnd.randint(0, 3))
+            model = session.apply_edits([{"start": start, "end": end, "lines": rnd.sample(pool, rnd.randint(0, 3))}])
+            assert model == full_parse(diagram_type, session.text()), f"trial {trial}"
+
+
+def test_redeclared_entity_uses_last_declaration():
+    lines = [
+        "entity A {", "+id : INT <<PK>>", "}",
+        "entity B {", "+a_id : INT <<FK=A.id>>", "}",
+        "A ||--o{ B",
+        "entity B {", "+id : INT", "}",
+    ]
+    session = ParseSession('\n'.join(lines), "database")
+    assert session.to_json()["relationships"][0]["on"] is None
+    assert session.to_json() == full_parse("database", session.text())
+
+    # removing the second declaration brings the foreign key back
+    session.apply_edits([{"start": 7, "end": 10, "lines": []}])
+    assert session.to_json()["relationships"][0]["on"] == "a_id"
+    assert session.to_json() == full_parse("database", session.text())
@@ -0,0 +1,109 @@
+"""Разбор и сопоставление выражений типов из диаграмм классов.
+
+`parse_type` строит AST (`TypeExpr`) для записей вида `Dict[str, List[int]]`
+или `List<Book>` и кеширует результат по строке. `TypeMapper` — таблица
+сопоставления для одного языка: скаляры, обобщённые типы (List, Dict,
+Optional, Set, Tuple) и запоминание готовых строк, так что повторный тип
+в большой модели стоит одного обращения к словарю.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Имена обобщённых типов, приводимые к каноническим
+GENERIC_ALIASES = {
+    "List": "List", "list": "List",
+    "Dict": "Dict", "dict": "Dict", "Map": "Dict",
+    "Set": "Set", "set": "Set",
+    "Tuple": "Tuple", "tuple": "Tuple",
+    "Optional": "Optional",
+}
+
+_TOKEN = re.compile(r"[\[\]<>,]|[^\[\]<>,]+")
+_CLOSING = {"[": "]", "<": ">"}
+
+
+class TypeExpr(NamedTuple):
+    """Узел AST типа: имя и аргументы обобщённого типа"""
+    name: str
+    args: Tuple["TypeExpr", ...] = ()
+
+
+def _tokenize(text: str) -> List[str]:
+    return [token for token in (raw.strip() for raw in _TOKEN.findall(text)) if token]
+
+
+@lru_cache(maxsize=4096)
+def parse_type(text: str) -> TypeExpr:
+    """Разбирает запись типа в AST; скобки [] и <> равноправны.
+
+    Некорректная запись приводит к ValueError.
+    """
+    tokens = _tokenize(text)
+    if not tokens:
+        raise ValueError(f"Пустой тип: {text!r}")
+    expr, pos = _parse_expr(tokens, 0, text)
+    if pos != len(tokens):
+        raise ValueError(f"Некорректный тип: {text!r}")
+    return expr
+
+
+def _parse_expr(tokens: List[str], pos: int, text: str) -> Tuple[TypeExpr, int]:
+    name = tokens[pos] if pos < len(tokens) else None
+    if name is None or name in "[]<>,":
+        raise ValueError(f"Некорректный тип: {text!r}")
+    pos += 1
+    if pos == len(tokens) or tokens[pos] not in _CLOSING:
+        return TypeExpr(name), pos
+
+    closing = _CLOSING[tokens[pos]]
+    args = []
+    while True:
+        arg, pos = _parse_expr(tokens, pos + 1, text)
+        args.append(arg)
+        if pos == len(tokens):
+            raise ValueError(f"Незакрытая скобка в типе: {text!r}")
+        if tokens[pos] == closing:
+            break
+        if tokens[pos] != ",":
+            raise ValueError(f"Некорректный тип: {text!r}")
+    return TypeExpr(GENERIC_ALIASES.get(name, name), tuple(args)), pos + 1
+
+
+class TypeMapper:
+    """Сопоставление типов для одного языка.
+
+    scalars — простые типы; nested_scalars — их замена внутри обобщённых
+    типов (например, упаковка примитивов Java); generics — шаблоны
+    str.format для канонических обобщённых типов: позиционные аргументы
+    и {args} со всеми аргументами через запятую. Неизвестные обобщённые
+    типы выводятся скобками open/close.
+    """
+
+    def __init__(self, scalars: Dict[str, str], generics: Dict[str, str], open: str = "[", close: str = "]",
+                 nested_scalars: Optional[Dict[str, str]] = None):
+        self.scalars = scalars
+        self.nested_scalars = {**scalars, **(nested_scalars or {})}
+        self.generics = generics
+        self.open, self.close = open, close
+        self._cache: Dict[str, str] = {}
+
+    def __call__(self, type_name: str) -> str:
+        result = self._cache.get(type_name)
+        if result is None:
+            try:
+                result = self._map(parse_type(type_name), self.scalars)
+            except (ValueError, IndexError):
+                # запись не разобрана или не та арность — тип выводится как есть
+                result = type_name
+            self._cache[type_name] = result
+        return result
+
+    def _map(self, expr: TypeExpr, scalars: Dict[str, str]) -> str:
+        if not expr.args:
+            return scalars.get(expr.name, expr.name)
+        args = [self._map(arg, self.nested_scalars) for arg in expr.args]
+        template = self.generics.get(expr.name)
+        if template is None:
+            return f"{expr.name}{self.open}{', '.join(args)}{self.close}"
+        return template.format(*args, args=", ".join(args))
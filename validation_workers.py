@@ -0,0 +1,178 @@
+"""Резидентные помощники проверки кода для code_validation.
+
+`JavacWorker` держит запущенную JVM (java_worker/JavacWorker.java), которая
+компилирует в памяти через javax.tools: запуск JVM оплачивается один раз
+на процесс, а не на каждую проверку. Обмен — построчно по stdin/stdout.
+
+`CppPrelude` собирает предкомпилированный заголовок со стандартными
+include из classes_cpp.jinja2; g++ подключает его через -include, и
+<string>/<vector>/... не разбираются заново для каждого файла.
+
+Оба помощника возвращают None, если недоступны; тогда code_validation
+использует обычный запуск javac / g++.
+"""
+import atexit
+import hashlib
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent
+JAVA_WORKER_SOURCE = ROOT / "java_worker" / "JavacWorker.java"
+CPP_TEMPLATE = ROOT / "jinja_templates" / "classes_cpp.jinja2"
+# Скомпилированный воркер и PCH; по умолчанию — во временном каталоге
+CACHE_DIR = Path(os.getenv("PUML_VALIDATION_CACHE_DIR") or Path(tempfile.gettempdir()) / "puml_validation")
+
+_INCLUDE = re.compile(r"^\s*#\s*include\s*<([^>]+)>", re.MULTILINE)
+_ESCAPE = re.compile(r"\\(.)")
+_SEVERITIES = {"ERROR": "error", "WARNING": "warning", "MANDATORY_WARNING": "warning"}
+
+# Запись диагностики воркера: (путь, строка, столбец, вид, сообщение)
+WorkerDiagnostic = Tuple[str, Optional[int], Optional[int], str, str]
+
+
+def _unescape(text: str) -> str:
+    return _ESCAPE.sub(lambda m: {"n": "\n", "t": "\t"}.get(m.group(1), m.group(1)), text)
+
+
+class JavacWorker:
+    """Резидентная JVM для проверки Java.
+
+    Запускается при первом вызове; при сбое процесс перезапускается на
+    следующем вызове, а если воркер не удалось собрать или запустить —
+    больше не пробуется.
+    """
+
+    def __init__(self):
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._disabled = False
+
+    def compile(self, paths: List[str]) -> Optional[Tuple[bool, List[WorkerDiagnostic]]]:
+        """(успех, диагностика) или None, если воркер недоступен"""
+        with self._lock:
+            if not self._ensure_started():
+                return None
+            try:
+                self._process.stdin.write("\t".join(os.path.abspath(path) for path in paths) + "\n")
+                self._process.stdin.flush()
+                return self._read_response()
+            except (OSError, ValueError):
+                self._stop()
+                return None
+
+    def _read_response(self) -> Tuple[bool, List[WorkerDiagnostic]]:
+        diagnostics = []
+        while True:
+            line = self._process.stdout.readline()
+            if not line:
+                raise OSError("JavacWorker завершился")
+            fields = line.rstrip("\n").split("\t")
+            if fields[0] == "E":
+                return fields[1] == "1", diagnostics
+            if fields[0] == "D" and len(fields) == 6:
+                source, line_no, column, kind, message = fields[1:]
+                diagnostics.append((
+                    source,
+                    int(line_no) if int(line_no) > 0 else None,
+                    int(column) if int(column) > 0 else None,
+                    _SEVERITIES.get(kind, "note"),
+                    _unescape(message),
+                ))
+
+    def _ensure_started(self) -> bool:
+        if self._process is not None and self._process.poll() is None:
+            return True
+        if self._disabled:
+            return False
+        try:
+            classes_dir = self._build()
+            self._process = subprocess.Popen(
+                ["java", "-cp", str(classes_dir), "JavacWorker"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, encoding="utf-8", bufsize=1,
+            )
+            if self._process.stdout.readline().strip() != "READY":
+                raise OSError("JavacWorker не запустился")
+        except (OSError, subprocess.CalledProcessError):
+            self._stop()
+            self._disabled = True
+            return False
+        return True
+
+    @staticmethod
+    def _build() -> Path:
+        """Компилирует воркер один раз на версию исходника"""
+        source = JAVA_WORKER_SOURCE.read_bytes()
+        classes_dir = CACHE_DIR / f"javac-worker-{hashlib.sha256(source).hexdigest()[:16]}"
+        if not (classes_dir / "JavacWorker.class").exists():
+            classes_dir.mkdir(parents=True, exist_ok=True)
+            subprocess.run(["javac", "-d", str(classes_dir), str(JAVA_WORKER_SOURCE)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        return classes_dir
+
+    def _stop(self) -> None:
+        if self._process is not None:
+            try:
+                self._process.kill()
+                self._process.wait()
+            except OSError:
+                pass
+            self._process = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._stop()
+
+
+class CppPrelude:
+    """Предкомпилированный заголовок со стандартными include шаблона C++"""
+
+    def __init__(self, template: Path = CPP_TEMPLATE):
+        self.template = template
+        self._lock = threading.Lock()
+        self._header: Optional[str] = None
+        self._built_for: Optional[Tuple[float, str]] = None
+
+    def header(self, compiler_version: str) -> Optional[str]:
+        """Путь заголовка для g++ -include (рядом лежит .gch) или None"""
+        with self._lock:
+            try:
+                key = (self.template.stat().st_mtime, compiler_version)
+            except OSError:
+                return None
+            if self._built_for != key:
+                self._header = self._build(compiler_version)
+                self._built_for = key
+            return self._header
+
+    def _build(self, compiler_version: str) -> Optional[str]:
+        includes = sorted(set(_INCLUDE.findall(self.template.read_text(encoding="utf-8"))))
+        if not includes:
+            return None
+        text = "".join(f"#include <{name}>\n" for name in includes)
+        digest = hashlib.sha256((compiler_version + "\n" + text).encode()).hexdigest()[:16]
+        header = CACHE_DIR / f"cpp-prelude-{digest}.hpp"
+        pch = header.with_name(header.name + ".gch")
+        if pch.exists():
+            return str(header)
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            header.write_text(text, encoding="utf-8")
+            # собирается во временный файл: параллельный процесс не увидит недописанный PCH
+            partial = pch.with_name(f"{pch.name}.{os.getpid()}.tmp")
+            subprocess.run(["g++", "-x", "c++-header", str(header), "-o", str(partial)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            os.replace(partial, pch)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return str(header)
+
+
+JAVAC_WORKER = JavacWorker()
+CPP_PRELUDE = CppPrelude()
+atexit.register(JAVAC_WORKER.close)